@@ -1,7 +1,12 @@
 from datetime import datetime, timedelta
 from airflow import DAG
 from airflow.operators.python_operator import PythonOperator
-from automacao-etl-imdb-ciclo-5-operadores import ExportFilesOperator, ProcessFilesOperator, SaveToDatabaseOperator, CreateAnalyticalTablesOperator
+from automacao-etl-imdb-ciclo-5-operadores import (ExportFilesOperator, ProcessFilesOperator, SaveToDatabaseOperator,
+                                                   CreateAnalyticalTablesOperator, CreateRollupTablesOperator,
+                                                   CreateIndexesOperator, PrepareShadowDatabaseOperator,
+                                                   PublishDatabaseOperator)
+from imdb_analitico import TABELAS_ANALITICAS
+from imdb_carga import caminho_sombra
 
 # DAG
 dag = DAG(
@@ -16,6 +21,8 @@ base_url = "https://datasets.imdbws.com/"
 diretorio_dados = "/caminho/para/dados"
 diretorio_tratados = "/caminho/para/tratados"
 caminho_banco_de_dados = "/caminho/para/imdb_data.db"
+# Carga, índices, tabelas analíticas e rollups são feitos no banco em sombra, publicado só no fim
+caminho_banco_sombra = caminho_sombra(caminho_banco_de_dados)
 
 # Define as tarefas da DAG
 tarefa_exportar_arquivos = PythonOperator(
@@ -50,12 +57,33 @@ tarefa_processar_arquivos = PythonOperator(
     dag=dag,
 )
 
+tarefa_preparar_sombra = PythonOperator(
+    task_id='preparar_sombra',
+    python_callable=PrepareShadowDatabaseOperator(
+        task_id='preparar_sombra',
+        database_path=caminho_banco_de_dados,
+        dag=dag,
+    ).execute,
+    dag=dag,
+)
+
 tarefa_salvar_no_banco_de_dados = PythonOperator(
     task_id='salvar_no_banco_de_dados',
     python_callable=SaveToDatabaseOperator(
         task_id='salvar_no_banco_de_dados',
         source_directory=diretorio_tratados,
-        database_path=caminho_banco_de_dados,
+        database_path=caminho_banco_sombra,
+        dag=dag,
+    ).execute,
+    dag=dag,
+)
+
+# Índices declarados das tabelas base e ANALYZE, antes dos joins das tabelas analíticas
+tarefa_criar_indices = PythonOperator(
+    task_id='criar_indices',
+    python_callable=CreateIndexesOperator(
+        task_id='criar_indices',
+        database_path=caminho_banco_sombra,
         dag=dag,
     ).execute,
     dag=dag,
@@ -65,61 +93,45 @@ tarefa_criar_tabelas_analiticas = PythonOperator(
     task_id='criar_tabelas_analiticas',
     python_callable=CreateAnalyticalTablesOperator(
         task_id='criar_tabelas_analiticas',
-        queries=[
-            """
-            CREATE TABLE IF NOT EXISTS analitico_titulos AS
-
-            WITH 
-            participantes AS (
-                SELECT
-                    tconst,
-                    COUNT(DISTINCT nconst) as qtParticipantes
-                
-                FROM title_principals
-                
-                GROUP BY 1
-            )
-
-            SELECT
-                tb.tconst,
-                tb.titleType,
-                tb.originalTitle,
-                tb.startYear,
-                tb.endYear,
-                tb.genres,
-                tr.averageRating,
-                tr.numVotes,
-                tp.qtParticipantes
-
-            FROM title_basics tb 
-
-            LEFT JOIN title_ratings tr
-                ON tr.tconst = tb.tconst
-
-            LEFT JOIN participantes tp
-                ON tp.tconst = tb.tconst
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS analitico_participantes AS
+        database_path=caminho_banco_sombra,
+        dag=dag,
+    ).execute,
+    dag=dag,
+)
 
-            SELECT
-                tp.nconst,
-                tp.tconst,
-                tp.ordering,
-                tp.category,
-                tb.genres
+tarefa_criar_indices_analiticos = PythonOperator(
+    task_id='criar_indices_analiticos',
+    python_callable=CreateIndexesOperator(
+        task_id='criar_indices_analiticos',
+        database_path=caminho_banco_sombra,
+        tables=list(TABELAS_ANALITICAS),
+        dag=dag,
+    ).execute,
+    dag=dag,
+)
 
-            FROM title_principals tp
+tarefa_criar_rollups = PythonOperator(
+    task_id='criar_rollups',
+    python_callable=CreateRollupTablesOperator(
+        task_id='criar_rollups',
+        database_path=caminho_banco_sombra,
+        dag=dag,
+    ).execute,
+    dag=dag,
+)
 
-            LEFT JOIN title_basics tb
-                ON tb.tconst = tp.tconst
-            """
-        ],
+tarefa_publicar_banco = PythonOperator(
+    task_id='publicar_banco',
+    python_callable=PublishDatabaseOperator(
+        task_id='publicar_banco',
         database_path=caminho_banco_de_dados,
+        required_tables=list(TABELAS_ANALITICAS),
         dag=dag,
     ).execute,
     dag=dag,
 )
 
 # Define a ordem de execução das tarefas
-tarefa_exportar_arquivos >> tarefa_processar_arquivos >> tarefa_salvar_no_banco_de_dados >> tarefa_criar_tabelas_analiticas
+(tarefa_exportar_arquivos >> tarefa_processar_arquivos >> tarefa_preparar_sombra >> tarefa_salvar_no_banco_de_dados
+ >> tarefa_criar_indices >> tarefa_criar_tabelas_analiticas >> tarefa_criar_indices_analiticos
+ >> tarefa_criar_rollups >> tarefa_publicar_banco)
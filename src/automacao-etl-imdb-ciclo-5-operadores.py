@@ -1,115 +1,247 @@
 import os
-import requests
-import shutil
-import pandas as pd
 import sqlite3
 from airflow.models import BaseOperator
 from airflow.utils.decorators import apply_defaults
+from imdb_extracao import baixar_arquivos
+from imdb_transformacao import tratar_arquivos, caminho_tratado
+from imdb_analitico import TABELAS_ANALITICAS, materializar_analiticas
+from imdb_busca import TABELA_BUSCA
+from imdb_vetorizado import MOTOR_SQL
+from imdb_rollup import criar_rollups
+from imdb_duckdb import BACKEND_SQLITE, conectar
+from imdb_carga import (nome_tabela, carregar_arquivos, criar_indices, criar_visoes_texto, preparar_sombra,
+                        publicar_sombra)
 
 class ExportFilesOperator(BaseOperator):
     template_fields = ['destination_directory', 'file_list']
 
     @apply_defaults
-    def __init__(self, base_url, file_list, destination_directory, *args, **kwargs):
+    def __init__(self, base_url, file_list, destination_directory, max_parallel_downloads=4, *args, **kwargs):
         super(ExportFilesOperator, self).__init__(*args, **kwargs)
         self.base_url = base_url
         self.file_list = file_list
         self.destination_directory = destination_directory
+        self.max_parallel_downloads = max_parallel_downloads
 
     def execute(self, context):
-        os.makedirs(self.destination_directory, exist_ok=True)
-
-        for filename in self.file_list:
-            url = f"{self.base_url}{filename}"
-            destination_path = os.path.join(self.destination_directory, filename)
-
-            if not os.path.exists(destination_path):
-                self.log.info(f"Baixando {filename}...")
-                response = requests.get(url, stream=True)
-
-                if response.status_code == 200:
-                    with open(destination_path, 'wb') as f:
-                        shutil.copyfileobj(response.raw, f)
-                    self.log.info(f"{filename} baixado com sucesso!")
-                else:
-                    self.log.error(f"Falha ao baixar {filename}. Código de status: {response.status_code}")
-
-                del response  # Libera os recursos da resposta
-            else:
-                self.log.info(f"{filename} já existe. Pulando o download.")
+        baixar_arquivos(
+            self.base_url,
+            self.file_list,
+            self.destination_directory,
+            max_downloads=self.max_parallel_downloads,
+            log=self.log,
+        )
 
 class ProcessFilesOperator(BaseOperator): 
     template_fields = ['source_directory', 'destination_directory', 'file_extension']
 
     @apply_defaults
-    def __init__(self, source_directory, destination_directory, file_extension, *args, **kwargs):
+    def __init__(self, source_directory, destination_directory, file_extension, rows_per_chunk=None,
+                 memory_budget_mb=None, output_format="tsv", partition_cols=None, parse_engine="pandas",
+                 max_workers=1, integer_keys=False, bridge_tables=False, *args, **kwargs):
         super(ProcessFilesOperator, self).__init__(*args, **kwargs)
         self.source_directory = source_directory
         self.destination_directory = destination_directory
         self.file_extension = file_extension
+        # Com rows_per_chunk ou memory_budget_mb o arquivo é processado em blocos, com memória limitada
+        self.rows_per_chunk = rows_per_chunk
+        self.memory_budget_mb = memory_budget_mb
+        # "tsv" ou "parquet"; partition_cols (ex.: ["titleType", "startYear"]) só vale para Parquet
+        self.output_format = output_format
+        self.partition_cols = partition_cols
+        # "pandas" ou "pyarrow" (leitor multi-thread do pyarrow.csv)
+        self.parse_engine = parse_engine
+        # Com max_workers > 1 os arquivos são tratados em paralelo, um por processo
+        self.max_workers = max_workers
+        # Guarda só a parte numérica de tconst/nconst (ver criar_visoes_texto)
+        self.integer_keys = integer_keys
+        # Gera as pontes (title_genre, title_director, person_known_for, ...) ao lado dos arquivos tratados
+        self.bridge_tables = bridge_tables
 
     def execute(self, context):
         os.makedirs(self.destination_directory, exist_ok=True)
 
+        tarefas = []
         for filename in os.listdir(self.source_directory):
             source_path = os.path.join(self.source_directory, filename)
 
             if os.path.isfile(source_path) and filename.endswith(self.file_extension):
-                self.log.info(f"Lendo e processando o arquivo {filename}...")
-
-                df = pd.read_csv(source_path, sep='\t', compression='gzip', low_memory=False)
-                df.replace({"\\N": None}, inplace=True)
-
-                destination_path = os.path.join(self.destination_directory, filename[:-3])
-                df.to_csv(destination_path, sep='\t', index=False)
-
-                self.log.info(f"Processamento concluído para {filename}. Arquivo processado salvo em {destination_path}")
-
-                # Remove o arquivo de origem após o processamento
-                os.remove(source_path)
+                destination_path = caminho_tratado(self.destination_directory, filename, self.output_format)
+                tarefas.append((source_path, destination_path))
+
+        tratar_arquivos(
+            tarefas,
+            processos=self.max_workers,
+            log=self.log,
+            linhas_por_bloco=self.rows_per_chunk,
+            memoria_mb=self.memory_budget_mb,
+            formato=self.output_format,
+            particoes=self.partition_cols,
+            motor=self.parse_engine,
+            chaves_inteiras=self.integer_keys,
+            gerar_pontes=self.bridge_tables,
+        )
 
 class SaveToDatabaseOperator(BaseOperator):
     template_fields = ['source_directory', 'database_path']
 
     @apply_defaults
-    def __init__(self, source_directory, database_path, *args, **kwargs):
+    def __init__(self, source_directory, database_path, parse_engine="pandas", integer_keys=False, bulk_load=False,
+                 delta_load=False, max_workers=1, backend="sqlite", *args, **kwargs):
         super(SaveToDatabaseOperator, self).__init__(*args, **kwargs)
         self.source_directory = source_directory
         self.database_path = database_path
+        self.parse_engine = parse_engine
+        self.integer_keys = integer_keys
+        # executemany em uma transação por tabela, com pragmas de carga, em vez do to_sql do pandas
+        self.bulk_load = bulk_load
+        # Aplica só as linhas inseridas, atualizadas e removidas desde a carga anterior (ver carregar_delta)
+        self.delta_load = delta_load
+        # Processos de carga, cada um gravando uma tabela em um arquivo próprio (a carga delta é sempre sequencial)
+        self.max_workers = max_workers
+        # "sqlite" ou "duckdb" (o DuckDB lê os arquivos tratados diretamente; ignora as opções acima)
+        self.backend = backend
 
     def execute(self, context):
-        conexao = sqlite3.connect(self.database_path)
-
-        for filename in os.listdir(self.source_directory):
-            source_path = os.path.join(self.source_directory, filename)
-
-            if os.path.isfile(source_path) and filename.endswith(".tsv"):
-                df = pd.read_csv(source_path, sep='\t', low_memory=False)
+        tarefas = [(os.path.join(self.source_directory, filename), nome_tabela(filename))
+                   for filename in os.listdir(self.source_directory) if filename.endswith((".tsv", ".parquet"))]
+        carregar_arquivos(tarefas, self.database_path, self.backend, self.max_workers, self.delta_load,
+                          context.get("ts"), log=self.log, motor=self.parse_engine,
+                          chaves_inteiras=self.integer_keys, em_massa=self.bulk_load)
 
-                nome_tabela = os.path.splitext(filename)[0].replace(".", "_").replace("-", "_")
+class StreamToDatabaseOperator(BaseOperator):
+    # Alternativa a ProcessFilesOperator + SaveToDatabaseOperator: lê o .gz e carrega no banco em uma única passada
+    template_fields = ['source_directory', 'database_path', 'file_extension']
 
-                df.to_sql(nome_tabela, conexao, index=False, if_exists='replace')
-
-                self.log.info(f"{filename} salvo como tabela {nome_tabela} no banco de dados.")
-
-                # Remove o arquivo processado após salvar no banco de dados
-                os.remove(source_path)
+    @apply_defaults
+    def __init__(self, source_directory, database_path, file_extension=".gz", rows_per_chunk=500_000,
+                 parse_engine="pandas", integer_keys=False, bulk_load=False, delta_load=False, max_workers=1,
+                 backend="sqlite", *args, **kwargs):
+        super(StreamToDatabaseOperator, self).__init__(*args, **kwargs)
+        self.source_directory = source_directory
+        self.database_path = database_path
+        self.file_extension = file_extension
+        self.rows_per_chunk = rows_per_chunk
+        self.parse_engine = parse_engine
+        self.integer_keys = integer_keys
+        self.bulk_load = bulk_load
+        self.delta_load = delta_load
+        self.max_workers = max_workers
+        self.backend = backend
 
-        conexao.close()
+    def execute(self, context):
+        tarefas = [(os.path.join(self.source_directory, filename), nome_tabela(filename))
+                   for filename in os.listdir(self.source_directory)
+                   if os.path.isfile(os.path.join(self.source_directory, filename))
+                   and filename.endswith(self.file_extension)]
+        carregar_arquivos(tarefas, self.database_path, self.backend, self.max_workers, self.delta_load,
+                          context.get("ts"), log=self.log, linhas_por_bloco=self.rows_per_chunk,
+                          motor=self.parse_engine, chaves_inteiras=self.integer_keys, em_massa=self.bulk_load)
 
 class CreateAnalyticalTablesOperator(BaseOperator):
+    # Atualiza as tabelas analíticas (imdb_analitico), só nos tconsts alterados desde a última execução quando
+    # a carga foi delta, ou reconstruindo-as com full_refresh=True; queries são consultas extras, rodadas depois.
+    # Com search_index (só no SQLite), atualiza também o índice FTS5 de busca de títulos (imdb_busca).
+    # engine="vetorizado" reconstrói as tabelas com os joins em NumPy do imdb_vetorizado em vez do SQL.
+    # queries e database_path mantêm a ordem original; as opções novas só podem ser passadas por nome.
     @apply_defaults
-    def __init__(self, queries, database_path, *args, **kwargs):
+    def __init__(self, queries=(), database_path=None, *args, tables=TABELAS_ANALITICAS, full_refresh=False,
+                 backend="sqlite", search_index=True, engine=MOTOR_SQL, **kwargs):
         super(CreateAnalyticalTablesOperator, self).__init__(*args, **kwargs)
         self.queries = queries
         self.database_path = database_path
+        self.tables = tables
+        self.full_refresh = full_refresh
+        self.backend = backend
+        self.search_index = search_index
+        self.engine = engine
 
     def execute(self, context):
-        conexao = sqlite3.connect(self.database_path)
+        tabelas = list(self.tables)
+        if self.search_index and self.backend == BACKEND_SQLITE:
+            tabelas.append(TABELA_BUSCA)
+
+        conexao = conectar(self.database_path, self.backend)
+        resultados = materializar_analiticas(conexao, tabelas, self.full_refresh, motor=self.engine, log=self.log)
+
         cursor = conexao.cursor()
 
         for query in self.queries:
             cursor.execute(query)
 
         conexao.commit()
+
+        # Views com as chaves no formato original, quando as tabelas usam chaves inteiras
+        if self.backend == BACKEND_SQLITE:
+            criar_visoes_texto(conexao)
+        conexao.close()
+
+        # Modo, duração e linhas alteradas de cada tabela ficam no XCom (e na tabela log_materializacao)
+        return resultados
+
+class CreateRollupTablesOperator(BaseOperator):
+    # Rollups de analitico_titulos (imdb_rollup) para os painéis; deve rodar depois de CreateAnalyticalTablesOperator
+    template_fields = ['database_path']
+
+    @apply_defaults
+    def __init__(self, database_path, rollups=None, backend="sqlite", *args, **kwargs):
+        super(CreateRollupTablesOperator, self).__init__(*args, **kwargs)
+        self.database_path = database_path
+        self.rollups = rollups
+        self.backend = backend
+
+    def execute(self, context):
+        conexao = conectar(self.database_path, self.backend)
+        linhas = criar_rollups(conexao, self.rollups, log=self.log)
+        conexao.close()
+
+        return linhas
+
+class CreateIndexesOperator(BaseOperator):
+    # Cria os índices declarados em imdb_carga (chaves naturais e secundários) e atualiza as estatísticas;
+    # deve rodar depois da carga e, com tables=["analitico_titulos", ...], depois das tabelas analíticas
+    template_fields = ['database_path']
+
+    @apply_defaults
+    def __init__(self, database_path, tables=None, *args, **kwargs):
+        super(CreateIndexesOperator, self).__init__(*args, **kwargs)
+        self.database_path = database_path
+        self.tables = tables
+
+    def execute(self, context):
+        conexao = sqlite3.connect(self.database_path)
+        tempos = criar_indices(conexao, self.tables, log=self.log)
         conexao.close()
+
+        self.log.info(f"{len(tempos)} índices criados em {sum(tempos.values()):.2f}s.")
+
+class PrepareShadowDatabaseOperator(BaseOperator):
+    # Cria <database_path>.novo a partir do banco publicado; as tarefas de carga e das tabelas analíticas
+    # devem usar esse caminho (caminho_sombra) e PublishDatabaseOperator faz a troca no fim
+    template_fields = ['database_path']
+
+    @apply_defaults
+    def __init__(self, database_path, *args, **kwargs):
+        super(PrepareShadowDatabaseOperator, self).__init__(*args, **kwargs)
+        self.database_path = database_path
+
+    def execute(self, context):
+        sombra = preparar_sombra(self.database_path)
+        self.log.info(f"Banco em sombra {sombra} preparado a partir de {self.database_path}.")
+        return sombra
+
+class PublishDatabaseOperator(BaseOperator):
+    # Verifica o banco em sombra e o troca pelo banco publicado com um rename atômico,
+    # guardando as últimas `generations` versões anteriores
+    template_fields = ['database_path']
+
+    @apply_defaults
+    def __init__(self, database_path, required_tables=(), generations=3, *args, **kwargs):
+        super(PublishDatabaseOperator, self).__init__(*args, **kwargs)
+        self.database_path = database_path
+        self.required_tables = required_tables
+        self.generations = generations
+
+    def execute(self, context):
+        geracao = publicar_sombra(self.database_path, tabelas=self.required_tables, manter=self.generations)
+        self.log.info(f"Banco {self.database_path} publicado (versão anterior guardada em {geracao}).")
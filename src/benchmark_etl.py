@@ -0,0 +1,423 @@
+# IMPORTS
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import tempfile
+import random
+import threading
+import pandas as pd
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+from imdb_esquema import ESQUEMAS
+from imdb_transformacao import (FORMATO_TSV, FORMATO_PARQUET, MOTOR_PANDAS, MOTOR_PYARROW, ler_arquivo,
+                                 tratar_arquivo, tratar_arquivos, caminho_tratado, remover_tratado,
+                                 AgregadorParticipantes)
+from imdb_carga import nome_tabela, carregar_tratado, carregar_gz, criar_indices
+from imdb_consulta import ServicoConsultas
+from imdb_analitico import CONSULTAS_ANALITICAS, materializar, materializar_analiticas
+from imdb_duckdb import BACKEND_SQLITE, BACKEND_DUCKDB, conectar, carregar_duckdb
+from imdb_vetorizado import MOTOR_SQL, MOTOR_VETORIZADO
+from imdb_extracao import baixar_arquivos
+from imdb_pipeline import executar_pipeline
+from imdb_busca import TABELA_BUSCA, buscar_titulos
+
+# Uso: python src/benchmark_etl.py <cenario> <diretorio com os .gz do IMDb>
+# Cada fluxo roda sobre uma cópia dos .gz em um diretório temporário, porque as etapas apagam os arquivos.
+# Um fluxo pode devolver um dicionário etapa -> valor (segundos, ms ou MB), impresso abaixo do tempo total.
+
+
+class MedidorDisco(threading.Thread):
+    # Amostra periodicamente o tamanho do diretório de trabalho e guarda o maior valor observado
+    def __init__(self, diretorio, intervalo=0.05):
+        super().__init__(daemon=True)
+        self.diretorio = diretorio
+        self.intervalo = intervalo
+        self.pico = 0
+        self.parar = threading.Event()
+
+    def tamanho_atual(self):
+        total = 0
+        for raiz, _, arquivos in os.walk(self.diretorio):
+            for arquivo in arquivos:
+                try:
+                    total += os.path.getsize(os.path.join(raiz, arquivo))
+                except FileNotFoundError:
+                    pass
+        return total
+
+    def run(self):
+        while not self.parar.is_set():
+            self.pico = max(self.pico, self.tamanho_atual())
+            time.sleep(self.intervalo)
+
+    def finalizar(self):
+        self.parar.set()
+        self.join()
+        self.pico = max(self.pico, self.tamanho_atual())
+        return self.pico
+
+
+def arquivos_gz(diretorio):
+    return sorted(arquivo for arquivo in os.listdir(diretorio) if arquivo.endswith(".gz"))
+
+
+# FLUXOS
+
+
+def fluxo_tres_etapas(diretorio, formato=FORMATO_TSV, particoes=None, em_massa=False):
+    # Fluxo atual: .gz -> data/tratados/*.tsv (ou *.parquet) -> SQLite
+    diretorio_tratados = os.path.join(diretorio, "tratados")
+    os.makedirs(diretorio_tratados, exist_ok=True)
+
+    for arquivo in arquivos_gz(diretorio):
+        caminho_arquivo = os.path.join(diretorio, arquivo)
+        tratar_arquivo(caminho_arquivo, caminho_tratado(diretorio_tratados, arquivo, formato), formato, particoes)
+        os.remove(caminho_arquivo)
+
+    conexao = sqlite3.connect(os.path.join(diretorio, "imdb_data.db"))
+    for arquivo in sorted(os.listdir(diretorio_tratados)):
+        caminho_arquivo = os.path.join(diretorio_tratados, arquivo)
+        carregar_tratado(caminho_arquivo, conexao, nome_tabela(arquivo), em_massa=em_massa)
+        remover_tratado(caminho_arquivo)
+    conexao.close()
+
+
+def fluxo_streaming(diretorio, em_massa=False):
+    # .gz -> SQLite em uma única passada
+    conexao = sqlite3.connect(os.path.join(diretorio, "imdb_data.db"))
+    for arquivo in arquivos_gz(diretorio):
+        caminho_arquivo = os.path.join(diretorio, arquivo)
+        carregar_gz(caminho_arquivo, conexao, nome_tabela(arquivo), em_massa=em_massa)
+        os.remove(caminho_arquivo)
+    conexao.close()
+
+
+def fluxo_leitura(diretorio, arquivo, motor):
+    # Só a leitura de um arquivo, com os tipos do esquema
+    caminho_arquivo = os.path.join(diretorio, arquivo)
+    if os.path.exists(caminho_arquivo):
+        ler_arquivo(caminho_arquivo, motor)
+
+
+def fluxo_backend(diretorio, backend):
+    # .gz -> tratados/*.tsv -> banco do backend -> tabelas analíticas, com o tempo de cada etapa
+    diretorio_tratados = os.path.join(diretorio, "tratados")
+    os.makedirs(diretorio_tratados, exist_ok=True)
+
+    for arquivo in arquivos_gz(diretorio):
+        caminho_arquivo = os.path.join(diretorio, arquivo)
+        tratar_arquivo(caminho_arquivo, caminho_tratado(diretorio_tratados, arquivo, FORMATO_TSV))
+        os.remove(caminho_arquivo)
+
+    conexao = conectar(os.path.join(diretorio, f"imdb_data.{backend}"), backend)
+    inicio = time.perf_counter()
+    for arquivo in sorted(os.listdir(diretorio_tratados)):
+        caminho_arquivo = os.path.join(diretorio_tratados, arquivo)
+        if backend == BACKEND_DUCKDB:
+            carregar_duckdb(caminho_arquivo, conexao, nome_tabela(arquivo))
+        else:
+            carregar_tratado(caminho_arquivo, conexao, nome_tabela(arquivo))
+        remover_tratado(caminho_arquivo)
+    carga = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for consulta in CONSULTAS_ANALITICAS:
+        conexao.execute(consulta)
+    conexao.commit()
+    analiticas = time.perf_counter() - inicio
+    conexao.close()
+
+    return {"carga": carga, "tabelas analíticas": analiticas}
+
+
+def fluxo_ddl(diretorio, em_massa, consultas=1000):
+    # Tabelas criadas pelo to_sql (rowid + índice único) ou STRICT / WITHOUT ROWID na chave natural:
+    # mede o tamanho do banco, buscas pela chave e a criação das tabelas analíticas
+    banco = os.path.join(diretorio, "imdb_data.db")
+    conexao = sqlite3.connect(banco)
+    inicio = time.perf_counter()
+    for arquivo in arquivos_gz(diretorio):
+        caminho_arquivo = os.path.join(diretorio, arquivo)
+        carregar_gz(caminho_arquivo, conexao, nome_tabela(arquivo), em_massa=em_massa)
+        os.remove(caminho_arquivo)
+    criar_indices(conexao)
+    carga = time.perf_counter() - inicio
+
+    chaves = [chave for chave, in conexao.execute(f"SELECT tconst FROM title_basics LIMIT {consultas}")]
+    inicio = time.perf_counter()
+    for chave in chaves:
+        conexao.execute("SELECT * FROM title_basics WHERE tconst = ?", (chave,)).fetchall()
+    buscas = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for consulta in CONSULTAS_ANALITICAS:
+        conexao.execute(consulta)
+    conexao.commit()
+    analiticas = time.perf_counter() - inicio
+    conexao.execute("VACUUM")
+    conexao.close()
+
+    return {
+        "carga + índices": carga,
+        f"{len(chaves)} buscas por tconst": buscas,
+        "tabelas analíticas": analiticas,
+        "tamanho do banco (MB)": os.path.getsize(banco) / 1024 ** 2,
+    }
+
+
+# Buscas por nome usadas no cenário "busca": palavra inteira, prefixo e título com acento
+TERMOS_BUSCA = ["love", "star war", "amelie", "the godfather", "matr"]
+
+
+def fluxo_busca(diretorio, fts, repeticoes=20):
+    # Busca de títulos por nome: LIKE sobre title_basics + title_akas ou o índice FTS5 (imdb_busca)
+    conexao = sqlite3.connect(os.path.join(diretorio, "imdb_data.db"))
+    for arquivo in ("title.basics.tsv.gz", "title.akas.tsv.gz"):
+        caminho_arquivo = os.path.join(diretorio, arquivo)
+        if os.path.exists(caminho_arquivo):
+            carregar_gz(caminho_arquivo, conexao, nome_tabela(arquivo), em_massa=True)
+            os.remove(caminho_arquivo)
+
+    etapas = {}
+    if fts:
+        inicio = time.perf_counter()
+        materializar(conexao, TABELA_BUSCA)
+        etapas["criação do índice"] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        for termo in TERMOS_BUSCA:
+            if fts:
+                buscar_titulos(conexao, termo)
+            else:
+                padrao = f"%{termo}%"
+                conexao.execute("SELECT tconst FROM title_basics WHERE primaryTitle LIKE ? OR originalTitle LIKE ? "
+                                "UNION SELECT titleId FROM title_akas WHERE title LIKE ? LIMIT 20",
+                                (padrao, padrao, padrao)).fetchall()
+    buscas = repeticoes * len(TERMOS_BUSCA)
+    etapas["ms por busca"] = (time.perf_counter() - inicio) * 1000 / buscas
+    conexao.close()
+
+    return etapas
+
+
+# Consultas do cenário "consultas", no estilo das validações do ciclo 2: busca por tconst e um resumo por tipo
+CONSULTAS_LEITURA = [
+    "SELECT * FROM analitico_titulos WHERE tconst = ?",
+    "SELECT titleType, COUNT(*), AVG(averageRating) FROM analitico_titulos WHERE startYear >= ? GROUP BY 1",
+]
+
+
+def fluxo_consultas(diretorio, modo, threads=8, consultas=4000):
+    # Leitura concorrente (threads consumidores) do banco: uma conexão + pd.read_sql_query por consulta
+    # ("ad hoc"), o pool do ServicoConsultas sem cache ("pool") ou com o cache de resultados ("cache")
+    banco = os.path.join(diretorio, "imdb_data.db")
+    conexao = sqlite3.connect(banco)
+    for arquivo in ("title.basics.tsv.gz", "title.ratings.tsv.gz", "title.principals.tsv.gz"):
+        caminho_arquivo = os.path.join(diretorio, arquivo)
+        if os.path.exists(caminho_arquivo):
+            carregar_gz(caminho_arquivo, conexao, nome_tabela(arquivo), em_massa=True)
+            os.remove(caminho_arquivo)
+    materializar_analiticas(conexao)
+    criar_indices(conexao)
+    tconsts = [tconst for tconst, in conexao.execute("SELECT tconst FROM analitico_titulos LIMIT 200")]
+    conexao.close()
+
+    # A mesma sequência de consultas em todos os modos; parâmetros repetidos, como em um painel
+    sorteio = random.Random(0)
+    carga = [(CONSULTAS_LEITURA[0], (sorteio.choice(tconsts),)) if sorteio.random() < 0.9
+             else (CONSULTAS_LEITURA[1], (sorteio.choice(range(1900, 2020, 10)),)) for _ in range(consultas)]
+
+    servico = ServicoConsultas(banco, conexoes=threads)
+
+    def executar(consulta):
+        sql, parametros = consulta
+        inicio = time.perf_counter()
+        if modo == "ad hoc":
+            conexao_consulta = sqlite3.connect(banco)
+            pd.read_sql_query(sql, conexao_consulta, params=parametros)
+            conexao_consulta.close()
+        else:
+            servico.consultar_df(sql, parametros, usar_cache=modo == "cache")
+        return time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencias = sorted(executor.map(executar, carga))
+    segundos = time.perf_counter() - inicio
+    servico.fechar()
+
+    return {
+        "consultas/s": len(carga) / segundos,
+        "latência p50 (ms)": latencias[len(latencias) // 2] * 1000,
+        "latência p95 (ms)": latencias[int(len(latencias) * 0.95)] * 1000,
+    }
+
+
+def fluxo_analiticas(diretorio, motor, agregado=True):
+    # Reconstrução completa das duas tabelas analíticas pelo CREATE TABLE ... AS ou pelos joins em NumPy,
+    # com a contagem de participantes do agregado da carga ou calculada sobre title_principals
+    conexao = sqlite3.connect(os.path.join(diretorio, "imdb_data.db"))
+    for arquivo in ("title.basics.tsv.gz", "title.ratings.tsv.gz", "title.principals.tsv.gz"):
+        caminho_arquivo = os.path.join(diretorio, arquivo)
+        if os.path.exists(caminho_arquivo):
+            carregar_gz(caminho_arquivo, conexao, nome_tabela(arquivo), em_massa=True)
+            os.remove(caminho_arquivo)
+    if not agregado:
+        conexao.execute(f"DROP TABLE IF EXISTS {AgregadorParticipantes.tabela}")
+
+    resultados = materializar_analiticas(conexao, completa=True, motor=motor)
+    conexao.close()
+    return {tabela: resultado["segundos"] for tabela, resultado in resultados.items()}
+
+
+# Banda de cada download no cenário "pipeline" (bytes/s), para a rede pesar como pesaria no site do IMDb
+BANDA_DOWNLOAD = 2 * 1024 ** 2
+
+
+class ServidorLimitado(SimpleHTTPRequestHandler):
+    # Serve os .gz do diretório de origem com a banda limitada por conexão
+    def copyfile(self, origem, destino):
+        while bloco := origem.read(64 * 1024):
+            destino.write(bloco)
+            time.sleep(len(bloco) / BANDA_DOWNLOAD)
+
+    def log_message(self, *args):
+        pass
+
+
+def fluxo_download(diretorio, pipeline, max_downloads=2, processos=2):
+    # Download (de um servidor HTTP local com banda limitada) -> tratamento -> carga: uma etapa de cada vez
+    # para todos os arquivos, como no execute_script, ou com cada arquivo passando pelas etapas sozinho
+    origem = os.path.join(diretorio, "origem")
+    dados = os.path.join(diretorio, "data")
+    os.makedirs(origem)
+    arquivos = arquivos_gz(diretorio)
+    for arquivo in arquivos:
+        os.rename(os.path.join(diretorio, arquivo), os.path.join(origem, arquivo))
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), partial(ServidorLimitado, directory=origem))
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{servidor.server_address[1]}/"
+
+    def carregar(caminho_arquivo, conexao, tabela):
+        carregar_tratado(caminho_arquivo, conexao, tabela, em_massa=True)
+        remover_tratado(caminho_arquivo)
+
+    conexao = sqlite3.connect(os.path.join(diretorio, "imdb_data.db"))
+    try:
+        if pipeline:
+            executar_pipeline(base_url, arquivos, dados, conexao, carregar, max_downloads=max_downloads,
+                              processos_transformacao=processos)
+            return None
+
+        etapas = {}
+        inicio = time.perf_counter()
+        baixar_arquivos(base_url, arquivos, dados, max_downloads=max_downloads)
+        etapas["download"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        diretorio_tratados = os.path.join(dados, "tratados")
+        os.makedirs(diretorio_tratados, exist_ok=True)
+        tratar_arquivos([(os.path.join(dados, arquivo), caminho_tratado(diretorio_tratados, arquivo))
+                         for arquivo in arquivos], processos=processos)
+        etapas["tratamento"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        for arquivo in sorted(os.listdir(diretorio_tratados)):
+            carregar(os.path.join(diretorio_tratados, arquivo), conexao, nome_tabela(arquivo))
+        etapas["carga"] = time.perf_counter() - inicio
+        return etapas
+    finally:
+        conexao.close()
+        servidor.shutdown()
+        servidor.server_close()
+
+
+CENARIOS = {
+    "streaming": [
+        ("três etapas (tratados/*.tsv)", fluxo_tres_etapas),
+        ("streaming gzip -> SQLite", fluxo_streaming),
+    ],
+    "intermediario": [
+        ("tratados em TSV", fluxo_tres_etapas),
+        ("tratados em Parquet (zstd)", partial(fluxo_tres_etapas, formato=FORMATO_PARQUET)),
+        ("tratados em Parquet particionado", partial(fluxo_tres_etapas, formato=FORMATO_PARQUET,
+                                                     particoes=["titleType", "startYear"])),
+    ],
+    "motor": [
+        (f"{nome} ({motor})", partial(fluxo_leitura, arquivo=f"{nome}.tsv.gz", motor=motor))
+        for nome in ESQUEMAS
+        for motor in (MOTOR_PANDAS, MOTOR_PYARROW)
+    ],
+    "carga": [
+        ("três etapas, to_sql", fluxo_tres_etapas),
+        ("três etapas, executemany + pragmas", partial(fluxo_tres_etapas, em_massa=True)),
+        ("streaming, to_sql", fluxo_streaming),
+        ("streaming, executemany + pragmas", partial(fluxo_streaming, em_massa=True)),
+    ],
+    "backend": [
+        ("SQLite", partial(fluxo_backend, backend=BACKEND_SQLITE)),
+        ("DuckDB", partial(fluxo_backend, backend=BACKEND_DUCKDB)),
+    ],
+    "busca": [
+        ("LIKE em title_basics e title_akas", partial(fluxo_busca, fts=False)),
+        ("índice FTS5 (busca_titulos)", partial(fluxo_busca, fts=True)),
+    ],
+    "consultas": [
+        ("conexão + read_sql por consulta", partial(fluxo_consultas, modo="ad hoc")),
+        ("ServicoConsultas, sem cache", partial(fluxo_consultas, modo="pool")),
+        ("ServicoConsultas, com cache", partial(fluxo_consultas, modo="cache")),
+    ],
+    "analiticas": [
+        ("CREATE TABLE ... AS", partial(fluxo_analiticas, motor=MOTOR_SQL)),
+        ("joins em NumPy", partial(fluxo_analiticas, motor=MOTOR_VETORIZADO)),
+        ("CREATE TABLE ... AS, sem agregado", partial(fluxo_analiticas, motor=MOTOR_SQL, agregado=False)),
+        ("joins em NumPy, sem agregado", partial(fluxo_analiticas, motor=MOTOR_VETORIZADO, agregado=False)),
+    ],
+    "pipeline": [
+        ("download, tratamento e carga em sequência", partial(fluxo_download, pipeline=False)),
+        ("pipeline por arquivo", partial(fluxo_download, pipeline=True)),
+    ],
+    "ddl": [
+        ("to_sql + índice único", partial(fluxo_ddl, em_massa=False)),
+        ("STRICT / WITHOUT ROWID", partial(fluxo_ddl, em_massa=True)),
+    ],
+}
+
+
+def medir(funcao, diretorio_origem):
+    with tempfile.TemporaryDirectory(prefix="benchmark_etl_") as diretorio:
+        for arquivo in arquivos_gz(diretorio_origem):
+            shutil.copy(os.path.join(diretorio_origem, arquivo), diretorio)
+
+        medidor = MedidorDisco(diretorio)
+        medidor.start()
+        inicio = time.perf_counter()
+        etapas = funcao(diretorio) or {}
+        segundos = time.perf_counter() - inicio
+        pico = medidor.finalizar()
+
+    return segundos, pico, etapas
+
+
+def main(argumentos):
+    if len(argumentos) != 2 or argumentos[0] not in CENARIOS:
+        print(f"Uso: python benchmark_etl.py <{'|'.join(CENARIOS)}> <diretorio com os .gz>")
+        return 1
+
+    cenario, diretorio_origem = argumentos
+    print(f"{'fluxo':<40} {'tempo (s)':>10} {'pico de disco (MB)':>20}")
+    for nome, funcao in CENARIOS[cenario]:
+        segundos, pico, etapas = medir(funcao, diretorio_origem)
+        print(f"{nome:<40} {segundos:>10.2f} {pico / 1024 ** 2:>20.1f}")
+        for etapa, valor in etapas.items():
+            print(f"  {etapa:<38} {valor:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
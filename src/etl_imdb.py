@@ -1,12 +1,20 @@
 # IMPORTS
 import os
-import requests
-import pandas as pd
 import sqlite3
 import logging
 import schedule
 import time
-import shutil
+from functools import partial
+from imdb_extracao import baixar_arquivos
+from imdb_pipeline import executar_pipeline
+from imdb_analitico import TABELAS_ANALITICAS, materializar_analiticas
+from imdb_vetorizado import MOTOR_SQL
+from imdb_busca import TABELA_BUSCA
+from imdb_rollup import criar_rollups
+from imdb_duckdb import BACKEND_SQLITE, BACKEND_DUCKDB, conectar
+from imdb_transformacao import tratar_arquivos, caminho_tratado
+from imdb_carga import (nome_tabela, carregar_no_backend, carregar_arquivos, criar_indices, criar_visoes_texto,
+                        preparar_sombra, publicar_sombra)
 
 # Configuração do logging
 log_format = '%(asctime)s - %(levelname)s - %(message)s'
@@ -35,153 +43,216 @@ def execute_script():
     ]
     destino_diretorio = "data"
 
-    os.makedirs(destino_diretorio, exist_ok=True)
+    # Quantidade máxima de downloads simultâneos
+    max_downloads = 4
 
-    for arquivo in arquivos:
-        url = base_url + arquivo
-        caminho_destino = os.path.join(destino_diretorio, arquivo)
+    # Pipeline por arquivo: cada arquivo é tratado assim que termina de baixar e carregado assim que termina de
+    # ser tratado (imdb_pipeline), em vez de cada etapa esperar todos os arquivos da anterior. A carga continua
+    # com um único escritor (não usa processos_carga).
+    executar_em_pipeline = False
 
-        if not os.path.exists(caminho_destino):
-            logging.info(f"Baixando {arquivo}...")
-            response = requests.get(url, stream=True)
+    if not executar_em_pipeline:
+        baixar_arquivos(base_url, arquivos, destino_diretorio, max_downloads=max_downloads)
 
-            if response.status_code == 200:
-                with open(caminho_destino, 'wb') as f:
-                    shutil.copyfileobj(response.raw, f)
-                logging.info(f"{arquivo} baixado com sucesso!")
-            else:
-                logging.error(f"Falha ao baixar {arquivo}. Código de status: {response.status_code}")
+    # Modo streaming: descompacta, trata e carrega cada arquivo em uma única passada, sem o data/tratados
+    modo_streaming = False
+    linhas_por_bloco = 500_000
 
-            del response  # Liberar recursos da resposta
-        else:
-            logging.info(f"{arquivo} já existe. Pulando o download.")
+    # Modo em blocos: trata cada arquivo em blocos de linhas_por_bloco linhas (ou no limite de memória abaixo)
+    modo_em_blocos = False
+    memoria_maxima_mb = None
 
-    logging.info("Download concluído.")
+    # Formato dos arquivos em data/tratados: "tsv" ou "parquet" (zstd, opcionalmente particionado)
+    formato_tratados = "tsv"
+    particoes_parquet = None  # ex.: ["titleType", "startYear"]
 
-    # TRANSFORMAÇÃO DOS DADOS
-    diretorio_dados = "data"
-    diretorio_tratados = os.path.join(diretorio_dados, "tratados")
-
-    os.makedirs(diretorio_tratados, exist_ok=True)
-
-    for arquivo in arquivos:
-        caminho_arquivo = os.path.join(diretorio_dados, arquivo)
+    # Motor de leitura dos TSVs: "pandas" ou "pyarrow" (multi-thread)
+    motor_leitura = "pandas"
 
-        if os.path.isfile(caminho_arquivo) and arquivo.endswith(".gz"):
-            logging.debug(f"Lendo e tratando o arquivo {arquivo}...")
+    # Pontes: gera title_genre, title_director, person_known_for, ... (uma linha por item das colunas com listas)
+    # junto com os arquivos tratados; não se aplica ao modo streaming
+    gerar_pontes = False
 
-            df = pd.read_csv(caminho_arquivo, sep='\t', compression='gzip', low_memory=False)
+    # Processos usados para tratar os arquivos em paralelo (1 = um arquivo de cada vez)
+    processos_transformacao = 1
 
-            df.replace({"\\N": None}, inplace=True)
+    # Processos usados na carga: cada um grava uma tabela em um arquivo próprio (1 = carga sequencial).
+    # A carga delta altera as tabelas existentes e por isso é sempre sequencial.
+    processos_carga = 1
 
-            caminho_destino = os.path.join(diretorio_tratados, arquivo[:-3])
-            df.to_csv(caminho_destino, sep='\t', index=False)
+    # Chaves inteiras: guarda só a parte numérica de tconst/nconst (views vw_* mostram o texto original)
+    chaves_inteiras = False
 
-            logging.debug(f"Tratamento concluído para {arquivo}. Arquivo tratado salvo em {caminho_destino}")
+    # Carga em massa: executemany em uma transação por tabela, com pragmas de carga (em vez do to_sql do pandas)
+    carga_em_massa = False
 
-            # Remova o arquivo baixado após o tratamento
-            os.remove(caminho_arquivo)
+    # Carga delta: compara o hash de cada linha com a carga anterior e aplica só inserções, atualizações e
+    # remoções (registradas na tabela log_alteracoes); a primeira carga de cada tabela é completa
+    carga_delta = False
+    identificador_carga = time.strftime("%Y-%m-%dT%H:%M:%S")
 
-    logging.info("Todos os arquivos foram tratados e salvos no diretório 'tratados'.")
-
-    # CARGA DOS DADOS
-    diretorio_tratados = os.path.join("data", "tratados")
-    banco_dados = "imdb_data.db"
+    # Tabelas analíticas: refeitas só nos tconsts alterados desde a última atualização (com a carga delta);
+    # True força a reconstrução completa
+    reconstruir_analiticas = False
 
-    conexao = sqlite3.connect(banco_dados)
+    # Motor da reconstrução completa das tabelas analíticas: MOTOR_SQL (CREATE TABLE ... AS) ou
+    # MOTOR_VETORIZADO (joins em NumPy sobre as chaves inteiras, imdb_vetorizado; só no SQLite)
+    motor_analiticas = MOTOR_SQL
 
-    arquivos = os.listdir(diretorio_tratados)
+    # Rollups de analitico_titulos para os painéis (gênero x ano/década x titleType), refeitos a cada execução
+    gerar_rollups = True
 
-    for arquivo in arquivos:
-        caminho_arquivo = os.path.join(diretorio_tratados, arquivo)
+    # Índice de busca de títulos (FTS5 sobre títulos principais, originais e de title_akas), só no SQLite
+    indice_busca = True
 
-        if os.path.isfile(caminho_arquivo) and arquivo.endswith(".tsv"):
-            df = pd.read_csv(caminho_arquivo, sep='\t', low_memory=False)
+    # Índices (únicos nas chaves naturais e secundários como title_episode.parentTconst), criados depois da carga
+    indexar_tabelas = True
 
-            nome_tabela = os.path.splitext(arquivo)[0]
-            nome_tabela = nome_tabela.replace(".", "_").replace("-", "_")
+    banco_dados = "imdb_data.db"
 
-            df.to_sql(nome_tabela, conexao, index=False, if_exists='replace')
+    # Construção em sombra: carrega tudo em imdb_data.db.novo e só troca pelo banco publicado (rename atômico)
+    # depois de verificado; as últimas geracoes_mantidas versões anteriores ficam guardadas para rollback
+    construir_em_sombra = False
+    geracoes_mantidas = 3
 
-            logging.info(f"Arquivo {arquivo} salvo como tabela {nome_tabela} no banco de dados.")
+    # Backend das tabelas: "sqlite" (padrão) ou "duckdb", que lê os arquivos diretamente e executa as consultas
+    # analíticas em paralelo. Com o DuckDB não há carga delta, índices, views nem construção em sombra.
+    backend_banco = BACKEND_SQLITE
+    banco_duckdb = "imdb_data.duckdb"
 
-            # Remova o arquivo tratado após a carga no banco de dados
-            os.remove(caminho_arquivo)
+    if backend_banco == BACKEND_DUCKDB:
+        banco_carga = banco_duckdb
+    else:
+        banco_carga = preparar_sombra(banco_dados) if construir_em_sombra else banco_dados
 
-    conexao.close()
+    diretorio_dados = "data"
 
-    logging.info("Todos os arquivos foram salvos no banco de dados.")
+    if executar_em_pipeline:
+        # Download, tratamento e carga de cada arquivo acontecem juntos, na etapa de carga abaixo
+        arquivos_carga = []
+
+    elif modo_streaming:
+        # Modo streaming: os .gz são descompactados, tratados e carregados em uma única passada.
+        # Arquivos que não mudaram desde o último download não estão no diretório e pulam as próximas etapas
+        arquivos_carga = []
+        for arquivo in arquivos:
+            caminho_arquivo = os.path.join(diretorio_dados, arquivo)
+
+            if os.path.isfile(caminho_arquivo) and arquivo.endswith(".gz"):
+                arquivos_carga.append((caminho_arquivo, nome_tabela(arquivo)))
+
+    else:
+        # TRANSFORMAÇÃO DOS DADOS
+        diretorio_tratados = os.path.join(diretorio_dados, "tratados")
+
+        os.makedirs(diretorio_tratados, exist_ok=True)
+
+        # Arquivos que não mudaram desde o último download não estão no diretório e pulam as próximas etapas
+        tarefas = []
+        for arquivo in arquivos:
+            caminho_arquivo = os.path.join(diretorio_dados, arquivo)
+
+            if os.path.isfile(caminho_arquivo) and arquivo.endswith(".gz"):
+                tarefas.append((caminho_arquivo, caminho_tratado(diretorio_tratados, arquivo, formato_tratados)))
+
+        # Trata os arquivos (em paralelo quando processos_transformacao > 1) e remove os .gz tratados
+        tratar_arquivos(
+            tarefas,
+            processos=processos_transformacao,
+            linhas_por_bloco=linhas_por_bloco if modo_em_blocos and not memoria_maxima_mb else None,
+            memoria_mb=memoria_maxima_mb if modo_em_blocos else None,
+            formato=formato_tratados,
+            particoes=particoes_parquet,
+            motor=motor_leitura,
+            chaves_inteiras=chaves_inteiras,
+            gerar_pontes=gerar_pontes,
+        )
+
+        logging.info("Todos os arquivos foram tratados e salvos no diretório 'tratados'.")
+
+        arquivos_carga = [
+            (os.path.join(diretorio_tratados, arquivo), nome_tabela(arquivo))
+            for arquivo in os.listdir(diretorio_tratados)
+            if arquivo.endswith((".tsv", ".parquet"))
+        ]
 
-    # CRIAÇÃO DAS TABELAS ANALÍTICAS
-    analitico_titulos = """
-    CREATE TABLE IF NOT EXISTS analitico_titulos AS
-
-    WITH 
-    participantes AS (
-        SELECT
-            tconst,
-            COUNT(DISTINCT nconst) as qtParticipantes
-        
-        FROM title_principals
-        
-        GROUP BY 1
+    # CARGA DOS DADOS
+    # Cada arquivo (.gz ou tratado) é carregado no backend e removido depois da carga
+    opcoes_carga = dict(
+        backend=backend_banco,
+        carga_delta=carga_delta,
+        carga=identificador_carga,
+        linhas_por_bloco=linhas_por_bloco,
+        motor=motor_leitura,
+        chaves_inteiras=chaves_inteiras,
+        em_massa=carga_em_massa,
     )
 
-    SELECT
-        tb.tconst,
-        tb.titleType,
-        tb.originalTitle,
-        tb.startYear,
-        tb.endYear,
-        tb.genres,
-        tr.averageRating,
-        tr.numVotes,
-        tp.qtParticipantes
-
-    FROM title_basics tb 
-
-    LEFT JOIN title_ratings tr
-        ON tr.tconst = tb.tconst
-
-    LEFT JOIN participantes tp
-        ON tp.tconst = tb.tconst
-    """
+    if executar_em_pipeline:
+        conexao = conectar(banco_carga, backend_banco)
+        executar_pipeline(
+            base_url,
+            arquivos,
+            diretorio_dados,
+            conexao,
+            partial(carregar_no_backend, **opcoes_carga),
+            max_downloads=max_downloads,
+            processos_transformacao=processos_transformacao,
+            streaming=modo_streaming,
+            linhas_por_bloco=linhas_por_bloco if modo_em_blocos and not memoria_maxima_mb else None,
+            memoria_mb=memoria_maxima_mb if modo_em_blocos else None,
+            formato=formato_tratados,
+            particoes=particoes_parquet,
+            motor=motor_leitura,
+            chaves_inteiras=chaves_inteiras,
+            gerar_pontes=gerar_pontes,
+        )
+        conexao.close()
 
-    analitico_participantes = """
-    CREATE TABLE IF NOT EXISTS analitico_participantes AS
+    else:
+        # Com processos_carga > 1 (SQLite, sem carga delta) cada tabela é carregada no seu próprio arquivo
+        # por um processo e depois copiada para o banco
+        carregar_arquivos(arquivos_carga, banco_carga, processos=processos_carga, **opcoes_carga)
 
-    SELECT
-        tp.nconst,
-        tp.tconst,
-        tp.ordering,
-        tp.category,
-        tb.genres
+    logging.info("Todos os arquivos foram salvos no banco de dados.")
 
-    FROM title_principals tp
+    # ÍNDICES E ESTATÍSTICAS DAS TABELAS CARREGADAS
+    if indexar_tabelas and backend_banco == BACKEND_SQLITE:
+        conexao = sqlite3.connect(banco_carga)
+        criar_indices(conexao)
+        conexao.close()
 
-    LEFT JOIN title_basics tb
-        ON tb.tconst = tp.tconst
-    """
+    # CRIAÇÃO DAS TABELAS ANALÍTICAS
+    logging.info("Salvando tabelas anlíticas no banco de dados.")
 
-    queries = [analitico_titulos, analitico_participantes]
+    # Conecta ao banco de dados (SQLite ou DuckDB) e atualiza cada tabela, incrementalmente quando possível
+    tabelas_analiticas = TABELAS_ANALITICAS
+    if indice_busca and backend_banco == BACKEND_SQLITE:
+        tabelas_analiticas = TABELAS_ANALITICAS + [TABELA_BUSCA]
 
-    logging.info("Salvando tabelas anlíticas no banco de dados.")
+    conexao = conectar(banco_carga, backend_banco)
+    materializar_analiticas(conexao, tabelas_analiticas, completa=reconstruir_analiticas, motor=motor_analiticas)
+    if gerar_rollups:
+        criar_rollups(conexao)
+    conexao.close()
 
-    for query in queries:
-        # Defininfo o banco de dados
-        banco_dados = "imdb_data.db"
-        
-        # Conecta ao banco de dados SQLite
-        conexao = sqlite3.connect(banco_dados)
-        
-        # Executa a consulta SQL
-        conexao.execute(query)
-        
-        # Fecha a conexão com o banco de dados
+    # Views com as chaves no formato original, quando as tabelas usam chaves inteiras
+    if backend_banco == BACKEND_SQLITE:
+        conexao = sqlite3.connect(banco_carga)
+        criar_visoes_texto(conexao)
+        if indexar_tabelas:
+            criar_indices(conexao, TABELAS_ANALITICAS)
         conexao.close()
 
     logging.info("Tabelas analíticas criadas com sucesso.")
 
+    # PUBLICAÇÃO DO BANCO EM SOMBRA
+    if construir_em_sombra and backend_banco == BACKEND_SQLITE:
+        tabelas = [nome_tabela(arquivo) for arquivo in arquivos] + tabelas_analiticas
+        geracao = publicar_sombra(banco_dados, banco_carga, tabelas, geracoes_mantidas)
+
+        logging.info(f"Banco {banco_dados} publicado (versão anterior guardada em {geracao}).")
+
     print('Fim do processo de ETL')
 
 # Agende a execução do script
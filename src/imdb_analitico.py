@@ -0,0 +1,237 @@
+# Consultas das tabelas analíticas, usadas pelo etl_imdb.py, pela DAG e pelos benchmarks.
+# O mesmo SQL roda no SQLite e no DuckDB.
+
+# IMPORTS
+import time
+import logging
+import sqlite3
+from datetime import datetime
+from imdb_carga import TABELA_ALTERACOES, RECARGA, tabela_existe
+from imdb_transformacao import AgregadorParticipantes
+from imdb_busca import TABELA_BUSCA, CRIACAO_BUSCA, SELECT_BUSCA
+from imdb_vetorizado import MOTOR_SQL, MOTOR_VETORIZADO, CONSTRUCOES, construir_vetorizado
+
+# Cada consulta é um SELECT com os filtros {filtro} (e {filtro_participantes}) vazios na criação da tabela
+# e restritos aos tconsts alterados na atualização incremental; {participantes} é a origem da contagem de
+# participantes (PARTICIPANTES_AGRUPADOS ou PARTICIPANTES_AGREGADOS)
+SELECT_TITULOS = """
+WITH
+participantes AS (
+    {participantes}
+)
+
+SELECT
+    tb.tconst,
+    tb.titleType,
+    tb.originalTitle,
+    tb.startYear,
+    tb.endYear,
+    tb.genres,
+    tr.averageRating,
+    tr.numVotes,
+    tp.qtParticipantes
+
+FROM title_basics tb
+
+LEFT JOIN title_ratings tr
+    ON tr.tconst = tb.tconst
+
+LEFT JOIN participantes tp
+    ON tp.tconst = tb.tconst
+{filtro}
+"""
+
+# Participantes distintos por título: GROUP BY sobre title_principals ou, quando a carga já calculou o
+# agregado (AgregadorParticipantes), a leitura da tabela pequena agregado_participantes
+TABELA_AGREGADO_PARTICIPANTES = AgregadorParticipantes.tabela
+
+PARTICIPANTES_AGRUPADOS = """SELECT
+        tconst,
+        COUNT(DISTINCT nconst) as qtParticipantes
+
+    FROM title_principals
+    {filtro_participantes}
+    GROUP BY 1"""
+
+PARTICIPANTES_AGREGADOS = f"""SELECT
+        tconst,
+        qtParticipantes
+
+    FROM {TABELA_AGREGADO_PARTICIPANTES}
+    {{filtro_participantes}}"""
+
+SELECT_PARTICIPANTES = """
+SELECT
+    tp.nconst,
+    tp.tconst,
+    tp.ordering,
+    tp.category,
+    tb.genres
+
+FROM title_principals tp
+
+LEFT JOIN title_basics tb
+    ON tb.tconst = tp.tconst
+{filtro}
+"""
+
+
+def montar_select(selecao, filtro="", filtro_participantes="", agregado=False):
+    participantes = (PARTICIPANTES_AGREGADOS if agregado else PARTICIPANTES_AGRUPADOS).format(
+        filtro_participantes=filtro_participantes)
+    return selecao.format(participantes=participantes, filtro=filtro)
+
+
+def montar_criacao(tabela, selecao, agregado=False):
+    return f"\nCREATE TABLE IF NOT EXISTS {tabela} AS\n" + montar_select(selecao, agregado=agregado)
+
+
+ANALITICO_TITULOS = montar_criacao("analitico_titulos", SELECT_TITULOS)
+ANALITICO_PARTICIPANTES = montar_criacao("analitico_participantes", SELECT_PARTICIPANTES)
+
+CONSULTAS_ANALITICAS = [ANALITICO_TITULOS, ANALITICO_PARTICIPANTES]
+TABELAS_ANALITICAS = ["analitico_titulos", "analitico_participantes"]
+
+# Materialização: cada tabela analítica é (SELECT, coluna tconst do SELECT, tabelas base das quais depende,
+# CREATE próprio ou None para CREATE TABLE ... AS SELECT). Uma atualização refaz só as linhas dos tconsts
+# que mudaram nas tabelas base desde a anterior, segundo o log_alteracoes da carga delta; sem esse
+# histórico, depois de uma recarga completa de uma tabela base ou com alterações demais
+# (FRACAO_INCREMENTAL dos tconsts da tabela), a tabela é reconstruída inteira.
+MATERIALIZACOES = {
+    "analitico_titulos": (SELECT_TITULOS, "tb.tconst", ["title_basics", "title_ratings", "title_principals"], None),
+    "analitico_participantes": (SELECT_PARTICIPANTES, "tp.tconst", ["title_principals", "title_basics"], None),
+    TABELA_BUSCA: (SELECT_BUSCA, "tconst", ["title_basics", "title_akas"], CRIACAO_BUSCA),
+}
+TABELA_MATERIALIZACOES = "log_materializacao"
+TABELA_TCONSTS_ALTERADOS = "tconsts_alterados"
+COMPLETA, INCREMENTAL = "completa", "incremental"
+FRACAO_INCREMENTAL = 0.2
+
+# Motores da reconstrução completa: o CREATE TABLE ... AS do banco (MOTOR_SQL) ou, no SQLite, os joins em
+# NumPy do imdb_vetorizado (MOTOR_VETORIZADO) para as tabelas que ele sabe montar (CONSTRUCOES)
+MOTORES = [MOTOR_SQL, MOTOR_VETORIZADO]
+
+
+def filtro_alterados(coluna):
+    return f"WHERE {coluna} IN (SELECT tconst FROM temp.{TABELA_TCONSTS_ALTERADOS})"
+
+
+def ultima_alteracao(conexao):
+    # rowid da última linha do log_alteracoes (0 se o log não existe)
+    if not tabela_existe(conexao, TABELA_ALTERACOES):
+        return 0
+    return conexao.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM "{TABELA_ALTERACOES}"').fetchone()[0]
+
+
+def alteracao_aplicada(conexao, tabela):
+    # rowid do log_alteracoes até onde a tabela já foi atualizada, None sem atualização registrada
+    if not tabela_existe(conexao, TABELA_MATERIALIZACOES):
+        return None
+    aplicada, = conexao.execute(f'SELECT MAX(ultima_alteracao) FROM "{TABELA_MATERIALIZACOES}" WHERE tabela = ?',
+                                (tabela,)).fetchone()
+    return aplicada
+
+
+def preparar_tconsts_alterados(conexao, dependencias, desde, ate):
+    # Monta temp.tconsts_alterados com os tconsts alterados nas tabelas base entre os rowids do log
+    # (chaves compostas "tt0000001|2" ficam só com o tconst). Retorna quantos são, ou None se alguma
+    # tabela base foi recarregada inteira no intervalo.
+    marcadores = ", ".join("?" * len(dependencias))
+    intervalo = f'FROM "{TABELA_ALTERACOES}" WHERE rowid > ? AND rowid <= ? AND tabela IN ({marcadores})'
+
+    if conexao.execute(f"SELECT 1 {intervalo} AND operacao = ? LIMIT 1",
+                       (desde, ate, *dependencias, RECARGA)).fetchone():
+        return None
+
+    # A coluna copia o tipo do tconst da tabela base, para a chave em texto do log virar inteiro se preciso
+    conexao.execute(f"DROP TABLE IF EXISTS temp.{TABELA_TCONSTS_ALTERADOS}")
+    conexao.execute(f'CREATE TEMP TABLE {TABELA_TCONSTS_ALTERADOS} AS SELECT tconst FROM "{dependencias[0]}" LIMIT 0')
+    conexao.execute(f"INSERT INTO temp.{TABELA_TCONSTS_ALTERADOS} "
+                    f"SELECT DISTINCT CASE WHEN instr(chave, '|') > 0 THEN substr(chave, 1, instr(chave, '|') - 1) "
+                    f"ELSE chave END {intervalo}", (desde, ate, *dependencias))
+    conexao.execute(f"CREATE INDEX temp.ix_{TABELA_TCONSTS_ALTERADOS} ON {TABELA_TCONSTS_ALTERADOS} (tconst)")
+    return conexao.execute(f"SELECT COUNT(*) FROM temp.{TABELA_TCONSTS_ALTERADOS}").fetchone()[0]
+
+
+def contar_linhas(conexao, tabela):
+    if not tabela_existe(conexao, tabela):
+        return 0
+    return conexao.execute(f'SELECT COUNT(*) FROM "{tabela}"').fetchone()[0]
+
+
+def contar_tconsts(conexao, tabela):
+    # Títulos distintos da tabela, na mesma unidade de tconsts_alterados (analitico_participantes e
+    # busca_titulos têm várias linhas por título)
+    return conexao.execute(f'SELECT COUNT(DISTINCT tconst) FROM "{tabela}"').fetchone()[0]
+
+
+def registrar_materializacao(conexao, tabela, inicio, resultado, ultima):
+    conexao.execute(f'CREATE TABLE IF NOT EXISTS "{TABELA_MATERIALIZACOES}" (tabela TEXT, inicio TEXT, modo TEXT, '
+                    f'segundos REAL, linhas_removidas INTEGER, linhas_inseridas INTEGER, ultima_alteracao INTEGER)')
+    conexao.execute(f'INSERT INTO "{TABELA_MATERIALIZACOES}" VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (tabela, inicio, resultado["modo"], resultado["segundos"], resultado["removidas"],
+                     resultado["inseridas"], ultima))
+    conexao.commit()
+
+
+def materializar(conexao, tabela, completa=False, fracao=FRACAO_INCREMENTAL, motor=MOTOR_SQL, log=logging):
+    # Atualiza uma tabela analítica, incrementalmente quando possível (só no SQLite, onde fica o log_alteracoes).
+    # O `motor` só vale para a reconstrução completa; a incremental é sempre em SQL.
+    # Retorna o modo usado, os segundos gastos e as linhas removidas e inseridas.
+    selecao, coluna, dependencias, criacao = MATERIALIZACOES[tabela]
+    agregado = tabela_existe(conexao, TABELA_AGREGADO_PARTICIPANTES)
+    inicio = datetime.now().isoformat(timespec="seconds")
+    cronometro = time.perf_counter()
+
+    incremental = isinstance(conexao, sqlite3.Connection) and not completa and tabela_existe(conexao, tabela)
+    desde = alteracao_aplicada(conexao, tabela) if incremental else None
+    ultima = ultima_alteracao(conexao) if isinstance(conexao, sqlite3.Connection) else None
+
+    alterados = None
+    if desde is not None:
+        alterados = preparar_tconsts_alterados(conexao, dependencias, desde, ultima)
+        if alterados is not None and alterados > fracao * contar_tconsts(conexao, tabela):
+            log.info(f"{alterados} tconsts alterados em {tabela}: reconstruindo a tabela inteira.")
+            alterados = None
+
+    if alterados is not None:
+        conexao.commit()
+        conexao.execute("BEGIN")
+        try:
+            removidas = conexao.execute(f'DELETE FROM "{tabela}" {filtro_alterados("tconst")}').rowcount
+            inseridas = conexao.execute(
+                f'INSERT INTO "{tabela}" '
+                + montar_select(selecao, filtro_alterados(coluna), filtro_alterados("tconst"), agregado)
+            ).rowcount
+            conexao.commit()
+        except BaseException:
+            conexao.rollback()
+            raise
+        finally:
+            conexao.execute(f"DROP TABLE IF EXISTS temp.{TABELA_TCONSTS_ALTERADOS}")
+        modo = INCREMENTAL
+    else:
+        removidas = contar_linhas(conexao, tabela)
+        conexao.execute(f'DROP TABLE IF EXISTS "{tabela}"')
+        if motor == MOTOR_VETORIZADO and tabela in CONSTRUCOES and isinstance(conexao, sqlite3.Connection):
+            construir_vetorizado(conexao, tabela)
+        elif criacao:
+            # Tabelas virtuais (FTS5) não aceitam CREATE TABLE ... AS: criação e carga separadas
+            conexao.execute(criacao)
+            conexao.execute(f'INSERT INTO "{tabela}" ' + montar_select(selecao, agregado=agregado))
+        else:
+            conexao.execute(montar_criacao(tabela, selecao, agregado))
+        conexao.commit()
+        inseridas = contar_linhas(conexao, tabela)
+        modo = COMPLETA
+
+    resultado = {"modo": modo, "segundos": time.perf_counter() - cronometro,
+                 "removidas": removidas, "inseridas": inseridas}
+    registrar_materializacao(conexao, tabela, inicio, resultado, ultima)
+    log.info(f"Tabela {tabela} atualizada ({modo}) em {resultado['segundos']:.2f}s: "
+             f"{removidas} linhas removidas e {inseridas} inseridas.")
+    return resultado
+
+
+def materializar_analiticas(conexao, tabelas=TABELAS_ANALITICAS, completa=False, motor=MOTOR_SQL, log=logging):
+    return {tabela: materializar(conexao, tabela, completa, motor=motor, log=log) for tabela in tabelas}
@@ -0,0 +1,92 @@
+# Busca de títulos por nome (parcial, em qualquer idioma) com um índice FTS5 do SQLite sobre os títulos
+# principais, originais e alternativos (title_akas), em vez de LIKE sobre as tabelas inteiras.
+# O índice é uma tabela materializada (imdb_analitico.MATERIALIZACOES): refeito só nos tconsts alterados.
+
+# IMPORTS
+import re
+
+TABELA_BUSCA = "busca_titulos"
+
+# unicode61 sem diacríticos: "Amélie", "amelie" e "AMÉLIE" encontram o mesmo título.
+# tconst e origem só são guardados (UNINDEXED), o texto pesquisado é só o título.
+CRIACAO_BUSCA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_BUSCA} USING fts5(
+    titulo,
+    tconst UNINDEXED,
+    origem UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+# Um documento por título distinto de cada tconst (títulos iguais são agrupados, ficando a menor origem).
+# O filtro da atualização incremental vai dentro de cada parte, para não ler as tabelas inteiras.
+SELECT_BUSCA = """
+SELECT titulo, tconst, MIN(origem) AS origem
+
+FROM (
+    SELECT primaryTitle AS titulo, tconst, 'primaryTitle' AS origem
+    FROM title_basics
+    {filtro}
+
+    UNION ALL
+
+    SELECT originalTitle, tconst, 'originalTitle'
+    FROM title_basics
+    {filtro}
+
+    UNION ALL
+
+    SELECT title, tconst, 'title_akas'
+    FROM (SELECT titleId AS tconst, title FROM title_akas)
+    {filtro}
+)
+
+WHERE titulo IS NOT NULL
+
+GROUP BY tconst, titulo
+"""
+
+# Resultado da busca: o título mais relevante de cada tconst (bm25 do FTS5, menor = melhor)
+CONSULTA_BUSCA = f"""
+WITH encontrados AS (
+    SELECT tconst, titulo, MIN(rank) AS relevancia
+    FROM {TABELA_BUSCA}
+    WHERE {TABELA_BUSCA} MATCH ?
+    GROUP BY tconst
+    ORDER BY relevancia
+    LIMIT ?
+)
+
+SELECT
+    e.tconst,
+    e.titulo,
+    tb.primaryTitle,
+    tb.titleType,
+    tb.startYear,
+    e.relevancia
+
+FROM encontrados e
+
+LEFT JOIN title_basics tb
+    ON tb.tconst = e.tconst
+
+ORDER BY e.relevancia
+"""
+
+
+def expressao_busca(texto, prefixo=True):
+    # Texto livre -> consulta FTS5: cada palavra entre aspas (sem operadores do FTS5 vindos do usuário) e,
+    # com prefixo, a última palavra como prefixo, para achar o título enquanto ele é digitado ("matr" -> "matrix")
+    palavras = [f'"{palavra}"' for palavra in re.findall(r"\w+", texto)]
+    if prefixo and palavras:
+        palavras[-1] += "*"
+    return " ".join(palavras)
+
+
+def buscar_titulos(conexao, texto, limite=20, prefixo=True):
+    # Títulos cujo nome (principal, original ou alternativo) contém todas as palavras de `texto`, ordenados
+    # por relevância: (tconst, título encontrado, primaryTitle, titleType, startYear, relevância)
+    expressao = expressao_busca(texto, prefixo)
+    if not expressao:
+        return []
+    return conexao.execute(CONSULTA_BUSCA, (expressao, limite)).fetchall()
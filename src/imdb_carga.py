@@ -0,0 +1,722 @@
+# IMPORTS
+import os
+import re
+import time
+import shutil
+import logging
+import sqlite3
+import traceback
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import pandas as pd
+from imdb_esquema import CHAVES_NATURAIS, DIGITOS_CHAVE, PONTES, PREFIXOS_CHAVES, chaves_naturais, nome_base
+from imdb_duckdb import BACKEND_DUCKDB, BACKEND_SQLITE, carregar_duckdb, conectar
+from imdb_transformacao import (LINHAS_POR_BLOCO, FORMATO_PARQUET, MOTOR_PANDAS, codificar_chaves, ler_arquivo,
+                                ler_em_blocos, ler_parquet, logs_do_processo, novo_agregador, remover_tratado,
+                                tamanho_tratado)
+
+# Prefixo das views que mostram as chaves inteiras no formato original do IMDb
+PREFIXO_VISAO = "vw_"
+
+# Banco em sombra: construído ao lado do banco publicado e trocado por ele com um rename atômico.
+# As gerações anteriores ficam como <banco>.<data e hora> para rollback imediato.
+SUFIXO_SOMBRA = ".novo"
+FORMATO_GERACAO = "%Y%m%dT%H%M%S"
+GERACOES = 3
+
+# Carga paralela: cada processo grava uma tabela em <banco>.parte_<tabela>, depois copiada para o banco
+SUFIXO_FRAGMENTO = ".parte_"
+
+# Carga delta: o hash de cada linha fica em delta_<tabela> (chave natural + hash) e cada chave inserida,
+# atualizada ou removida é registrada em log_alteracoes. Uma tabela substituída inteira (carga completa)
+# ganha uma linha "recarga" sem chave, para quem acompanha o log saber que todas as chaves mudaram.
+# Só as tabelas base e as pontes são acompanhadas: as derivadas (agregados, analíticas, rollups) são
+# refeitas a partir delas.
+PREFIXO_DELTA = "delta_"
+TABELA_ALTERACOES = "log_alteracoes"
+INSERCAO, ATUALIZACAO, REMOCAO, RECARGA = "insercao", "atualizacao", "remocao", "recarga"
+
+# Índices secundários de cada tabela, além do índice único na chave natural (CHAVES_NATURAIS).
+# Cada índice é uma lista de colunas; as tabelas analíticas não têm chave natural garantida.
+# As pontes (PONTES) têm um índice em cada sentido, que já cobre a consulta sem ler a tabela.
+INDICES_SECUNDARIOS = {
+    "title_episode": [["parentTconst"]],
+    "title_principals": [["nconst"]],
+    "title_genre": [["tconst", "genre"], ["genre", "tconst"]],
+    "title_director": [["tconst", "nconst"], ["nconst", "tconst"]],
+    "title_writer": [["tconst", "nconst"], ["nconst", "tconst"]],
+    "person_profession": [["nconst", "profession"], ["profession", "nconst"]],
+    "person_known_for": [["nconst", "tconst"], ["tconst", "nconst"]],
+    "aka_type": [["titleId", "ordering"], ["type"]],
+    "aka_attribute": [["titleId", "ordering"], ["attribute"]],
+    "agregado_participantes": [["tconst"]],
+    "analitico_titulos": [["tconst"]],
+    "analitico_participantes": [["tconst"], ["nconst"]],
+}
+
+# STRICT (tipos verificados em cada INSERT) existe a partir do SQLite 3.37
+SUPORTA_STRICT = sqlite3.sqlite_version_info >= (3, 37, 0)
+
+# Pragmas aplicados durante a carga em massa. O journal fica em memória (o ROLLBACK ainda funciona,
+# mas uma queda no meio da carga pode corromper o arquivo), sem fsync a cada commit, com cache de 1 GB
+# (valor negativo = KiB) e com o arquivo travado para esta conexão até o fim da carga.
+PRAGMAS_CARGA = {
+    "journal_mode": "MEMORY",
+    "synchronous": "OFF",
+    "cache_size": -1024 * 1024,
+    "temp_store": "MEMORY",
+    "locking_mode": "EXCLUSIVE",
+}
+
+
+def nome_tabela(arquivo):
+    # "title.basics.tsv.gz" ou "title.basics.tsv" -> "title_basics"
+    return nome_base(arquivo).replace(".", "_").replace("-", "_")
+
+
+@contextmanager
+def pragmas_carga(conexao, pragmas=PRAGMAS_CARGA):
+    # Aplica os pragmas de carga na conexão e, ao sair, volta aos valores que ela tinha antes
+    conexao.commit()
+    anteriores = {nome: conexao.execute(f"PRAGMA {nome}").fetchone()[0] for nome in pragmas}
+    for nome, valor in pragmas.items():
+        conexao.execute(f"PRAGMA {nome} = {valor}")
+
+    try:
+        yield conexao
+    finally:
+        conexao.commit()
+        for nome, valor in anteriores.items():
+            conexao.execute(f"PRAGMA {nome} = {valor}")
+        # Com locking_mode de volta a NORMAL, a trava exclusiva só é liberada no próximo acesso ao arquivo
+        conexao.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+
+
+def tipo_sqlite(dtype):
+    # Mesma afinidade que o to_sql daria à coluna, mas decidida pelo tipo do esquema
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+
+def chaves_tabela(tabela):
+    # Chave natural de uma tabela carregada (ou da sua tabela delta_<tabela>), None se não houver
+    origem = tabela[len(PREFIXO_DELTA):] if tabela.startswith(PREFIXO_DELTA) else tabela
+    return {nome_tabela(arquivo): colunas for arquivo, colunas in CHAVES_NATURAIS.items()}.get(origem)
+
+
+def ddl_tabela(tabela, bloco):
+    # CREATE TABLE com os tipos do esquema (via dtypes do bloco), STRICT e, quando a tabela tem chave natural,
+    # PRIMARY KEY na chave com WITHOUT ROWID: a tabela é a própria árvore da chave, sem o rowid escondido
+    chaves = chaves_tabela(tabela)
+    if chaves and not set(chaves) <= set(bloco.columns):
+        chaves = None
+
+    colunas = [f'"{coluna}" {tipo_sqlite(dtype)}{" NOT NULL" if chaves and coluna in chaves else ""}'
+               for coluna, dtype in bloco.dtypes.items()]
+    opcoes = ["STRICT"] if SUPORTA_STRICT else []
+    if chaves:
+        lista_chaves = ", ".join(f'"{chave}"' for chave in chaves)
+        colunas.append(f"PRIMARY KEY ({lista_chaves})")
+        opcoes.append("WITHOUT ROWID")
+
+    return f'CREATE TABLE "{tabela}" ({", ".join(colunas)}) {", ".join(opcoes)}'.rstrip()
+
+
+def gravar_em_massa(blocos, conexao, tabela):
+    # Substitui a tabela em uma única transação, com os pragmas de carga: cria a tabela com ddl_tabela e
+    # insere cada bloco com um só executemany (o INSERT é preparado uma vez por bloco). Uma chave natural
+    # repetida no arquivo não interrompe a carga: fica a última linha da chave (INSERT OR REPLACE), com um
+    # aviso, assim como criar_indices avisa e segue quando encontra a chave repetida em outras tabelas.
+    # Retorna as linhas gravadas; sem nenhum bloco a tabela anterior fica como está, e o retorno é None.
+    linhas = 0
+    insert = None
+    chaves = chaves_tabela(tabela)
+
+    with pragmas_carga(conexao):
+        conexao.execute("BEGIN")
+        try:
+            for bloco in blocos:
+                if insert is None:
+                    conexao.execute(f'DROP TABLE IF EXISTS "{tabela}"')
+                    conexao.execute(ddl_tabela(tabela, bloco))
+                    chaves = chaves if chaves and set(chaves) <= set(bloco.columns) else None
+                    insert = (f'INSERT {"OR REPLACE " if chaves else ""}INTO "{tabela}" '
+                              f'VALUES ({", ".join("?" * len(bloco.columns))})')
+
+                # Nulos do pandas (pd.NA/NaN) viram None, e os valores, tipos nativos do Python
+                conexao.executemany(insert, bloco.to_numpy(dtype=object, na_value=None).tolist())
+                linhas += len(bloco)
+
+            if chaves:
+                gravadas = conexao.execute(f'SELECT COUNT(*) FROM "{tabela}"').fetchone()[0]
+                if gravadas < linhas:
+                    logging.warning(f"Chave {chaves} repetida na tabela {tabela}: {linhas - gravadas} linhas "
+                                    f"substituídas pela última linha da mesma chave.")
+                linhas = gravadas
+            conexao.commit()
+        except BaseException:
+            conexao.rollback()
+            raise
+
+    return linhas if insert is not None else None
+
+
+def gravar_blocos(blocos, conexao, tabela, em_massa=False):
+    # Substitui a tabela pelo conteúdo dos blocos, com o carregador em massa ou com o to_sql do pandas.
+    # Sem nenhum bloco (arquivo vazio, filtro sem linhas) nada é substituído nem registrado como recarga.
+    if em_massa:
+        linhas = gravar_em_massa(blocos, conexao, tabela)
+    else:
+        linhas = None
+        if_exists = 'replace'
+
+        for bloco in blocos:
+            bloco.to_sql(tabela, conexao, index=False, if_exists=if_exists)
+            if_exists = 'append'
+            linhas = (linhas or 0) + len(bloco)
+
+    if linhas is None:
+        logging.warning(f"Nenhum bloco para a tabela {tabela}: a versão anterior foi mantida.")
+        return 0
+
+    registrar_recarga(conexao, tabela)
+    return linhas
+
+
+def gravar_agregado(conexao, agregador, em_massa=False, log=logging):
+    # Grava a tabela do agregado calculado na leitura; se ele foi descartado (arquivo fora de ordem), remove a
+    # versão anterior para as tabelas analíticas voltarem ao GROUP BY sobre a tabela completa
+    agregado = agregador.resultado()
+    if agregado is None:
+        log.warning(f"Arquivo fora da ordem da chave: {agregador.tabela} não foi calculado na carga.")
+        conexao.execute(f'DROP TABLE IF EXISTS "{agregador.tabela}"')
+        conexao.commit()
+        return
+    gravar_blocos([agregado], conexao, agregador.tabela, em_massa)
+
+
+def gravar_com_agregados(blocos, conexao, tabela, caminho_arquivo, em_massa=False):
+    # Grava a tabela e, na mesma passada pelos blocos, o agregado do arquivo, se houver (AGREGADORES)
+    agregador = novo_agregador(caminho_arquivo)
+    if agregador is None:
+        return gravar_blocos(blocos, conexao, tabela, em_massa)
+
+    linhas = gravar_blocos(agregador.acompanhar(blocos), conexao, tabela, em_massa)
+    gravar_agregado(conexao, agregador, em_massa)
+    return linhas
+
+
+def carregar_tsv(caminho_arquivo, conexao, tabela, motor=MOTOR_PANDAS, chaves_inteiras=False, em_massa=False):
+    # Carrega um TSV já tratado, substituindo a tabela; os tipos do esquema viram os tipos das colunas
+    df = ler_arquivo(caminho_arquivo, motor, chaves_inteiras)
+    return gravar_com_agregados([df], conexao, tabela, caminho_arquivo, em_massa)
+
+
+def carregar_parquet(caminho_arquivo, conexao, tabela, colunas=None, filtros=None, em_massa=False):
+    # Carrega um Parquet tratado em blocos, lendo só as colunas e os row groups necessários
+    blocos = ler_parquet(caminho_arquivo, colunas, filtros)
+    if colunas or filtros:
+        return gravar_blocos(blocos, conexao, tabela, em_massa)
+    return gravar_com_agregados(blocos, conexao, tabela, caminho_arquivo, em_massa)
+
+
+def carregar_tratado(caminho_arquivo, conexao, tabela, motor=MOTOR_PANDAS, chaves_inteiras=False, em_massa=False):
+    # Escolhe a carga pelo formato do arquivo em data/tratados (o Parquet já guarda o tipo das chaves)
+    if caminho_arquivo.endswith("." + FORMATO_PARQUET):
+        return carregar_parquet(caminho_arquivo, conexao, tabela, em_massa=em_massa)
+    return carregar_tsv(caminho_arquivo, conexao, tabela, motor, chaves_inteiras, em_massa)
+
+
+def carregar_gz(caminho_arquivo, conexao, tabela, linhas_por_bloco=LINHAS_POR_BLOCO, motor=MOTOR_PANDAS,
+                chaves_inteiras=False, em_massa=False):
+    # Modo streaming: descompacta e insere bloco a bloco, sem passar pelo data/tratados
+    blocos = ler_em_blocos(caminho_arquivo, linhas_por_bloco, motor)
+    if chaves_inteiras:
+        blocos = (codificar_chaves(bloco) for bloco in blocos)
+    return gravar_com_agregados(blocos, conexao, tabela, caminho_arquivo, em_massa)
+
+
+def carregar_arquivo(caminho_arquivo, conexao, tabela, linhas_por_bloco=LINHAS_POR_BLOCO, motor=MOTOR_PANDAS,
+                     chaves_inteiras=False, em_massa=False):
+    # .gz original (modo streaming) ou arquivo de data/tratados
+    if caminho_arquivo.endswith(".gz"):
+        return carregar_gz(caminho_arquivo, conexao, tabela, linhas_por_bloco, motor, chaves_inteiras, em_massa)
+    return carregar_tratado(caminho_arquivo, conexao, tabela, motor, chaves_inteiras, em_massa)
+
+
+def caminho_fragmento(banco, tabela):
+    return f"{banco}{SUFIXO_FRAGMENTO}{tabela}"
+
+
+def carregar_em_processo(caminho_arquivo, fragmento, tabela, opcoes):
+    # Executado no processo filho: carrega a tabela no seu próprio arquivo, sem disputar a trava do banco.
+    # Nunca levanta exceção, devolve o erro e os logs para o pai.
+    linhas, erro = None, None
+
+    with logs_do_processo() as registros:
+        try:
+            if os.path.exists(fragmento):
+                os.remove(fragmento)
+            inicio = time.monotonic()
+            conexao = sqlite3.connect(fragmento)
+            try:
+                linhas = carregar_arquivo(caminho_arquivo, conexao, tabela, **opcoes)
+            finally:
+                conexao.close()
+            logging.info(f"Processo {os.getpid()}: {os.path.basename(caminho_arquivo)} carregado em {fragmento} "
+                         f"({linhas} linhas em {time.monotonic() - inicio:.1f}s)")
+        except Exception:
+            erro = traceback.format_exc()
+
+    return linhas, erro, registros
+
+
+def anexar_fragmento(conexao, fragmento, tabela, derivadas=()):
+    # Copia a tabela do fragmento para o banco com ATTACH + INSERT ... SELECT, com o mesmo CREATE TABLE
+    # (e portanto os mesmos tipos) do fragmento, e apaga o fragmento. As tabelas `derivadas` (agregados
+    # calculados na carga) vão junto; as que faltam no fragmento são removidas do banco.
+    conexao.commit()
+    conexao.execute("ATTACH DATABASE ? AS fragmento", (fragmento,))
+    try:
+        ddls = dict(conexao.execute("SELECT name, sql FROM fragmento.sqlite_master WHERE type = 'table'"))
+        with pragmas_carga(conexao):
+            conexao.execute("BEGIN")
+            try:
+                for nome in [tabela, *derivadas]:
+                    conexao.execute(f'DROP TABLE IF EXISTS main."{nome}"')
+                    if nome != tabela and nome not in ddls:
+                        continue
+                    conexao.execute(ddls[nome])
+                    conexao.execute(f'INSERT INTO main."{nome}" SELECT * FROM fragmento."{nome}"')
+                    registrar_recarga(conexao, nome, confirmar=False)
+                conexao.commit()
+            except BaseException:
+                conexao.rollback()
+                raise
+    finally:
+        conexao.execute("DETACH DATABASE fragmento")
+    os.remove(fragmento)
+
+
+def carregar_paralelo(tarefas, banco, processos, remover_origem=True, log=logging, **opcoes):
+    # Carrega os arquivos `tarefas` (lista de pares arquivo/tabela) em `processos` processos ao mesmo tempo,
+    # cada um no seu fragmento, e monta o banco à medida que os fragmentos ficam prontos (um único escritor).
+    # Os maiores arquivos são enviados primeiro. Retorna as linhas carregadas por tabela.
+    tarefas = sorted(tarefas, key=lambda tarefa: tamanho_tratado(tarefa[0]), reverse=True)
+    resultados = {}
+    falhas = []
+
+    conexao = sqlite3.connect(banco)
+    try:
+        with ProcessPoolExecutor(max_workers=min(processos, len(tarefas) or 1)) as executor:
+            futuros = {}
+            for caminho_arquivo, tabela in tarefas:
+                log.info(f"Carregando o arquivo {os.path.basename(caminho_arquivo)} em um processo separado...")
+                fragmento = caminho_fragmento(banco, tabela)
+                futuro = executor.submit(carregar_em_processo, caminho_arquivo, fragmento, tabela, opcoes)
+                futuros[futuro] = (caminho_arquivo, fragmento, tabela)
+
+            for futuro in as_completed(futuros):
+                caminho_arquivo, fragmento, tabela = futuros[futuro]
+                arquivo = os.path.basename(caminho_arquivo)
+                try:
+                    linhas, erro, registros = futuro.result()
+                except Exception:
+                    # O processo filho morreu (ex.: OOM) antes de devolver o resultado
+                    linhas, erro, registros = None, traceback.format_exc(), []
+
+                for nivel, mensagem in registros:
+                    log.log(nivel, mensagem)
+                if erro:
+                    log.error(f"Falha ao carregar {arquivo}:\n{erro}")
+                    falhas.append(arquivo)
+                    if os.path.exists(fragmento):
+                        os.remove(fragmento)
+                    continue
+
+                inicio = time.perf_counter()
+                agregador = novo_agregador(caminho_arquivo)
+                anexar_fragmento(conexao, fragmento, tabela, [agregador.tabela] if agregador else [])
+                log.info(f"Arquivo {arquivo} salvo como tabela {tabela} no banco de dados ({linhas} linhas, "
+                         f"cópia do fragmento em {time.perf_counter() - inicio:.1f}s).")
+                resultados[tabela] = linhas
+                if remover_origem:
+                    remover_tratado(caminho_arquivo)
+    finally:
+        conexao.close()
+
+    if falhas:
+        raise RuntimeError(f"Falha ao carregar os arquivos: {', '.join(falhas)}")
+    return resultados
+
+
+def ler_completo(caminho_arquivo, motor=MOTOR_PANDAS, chaves_inteiras=False):
+    # Lê um arquivo inteiro em qualquer formato do pipeline: .gz original, TSV ou Parquet tratado
+    if caminho_arquivo.endswith("." + FORMATO_PARQUET):
+        return pd.concat(ler_parquet(caminho_arquivo), ignore_index=True)
+    if caminho_arquivo.endswith(".gz"):
+        df = ler_arquivo(caminho_arquivo, motor)
+        return codificar_chaves(df) if chaves_inteiras else df
+    return ler_arquivo(caminho_arquivo, motor, chaves_inteiras)
+
+
+def hashes_linhas(df, chaves):
+    # Chave natural + hash de 64 bits das demais colunas (com sinal, que é o inteiro do SQLite)
+    hashes = df[chaves].copy()
+    hashes["hash"] = pd.util.hash_pandas_object(df.drop(columns=chaves), index=False).to_numpy().view("int64")
+    return hashes
+
+
+def tabela_existe(conexao, tabela):
+    return conexao.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                           (tabela,)).fetchone() is not None
+
+
+def inserir_linhas(conexao, tabela, df):
+    colunas = ", ".join(f'"{coluna}"' for coluna in df.columns)
+    conexao.executemany(f'INSERT INTO "{tabela}" ({colunas}) VALUES ({", ".join("?" * len(df.columns))})',
+                        df.to_numpy(dtype=object, na_value=None).tolist())
+
+
+def criar_log_alteracoes(conexao):
+    conexao.execute(f'CREATE TABLE IF NOT EXISTS "{TABELA_ALTERACOES}" '
+                    f'(carga TEXT, tabela TEXT, operacao TEXT, chave TEXT)')
+
+
+def registrar_alteracoes(conexao, carga, tabela, operacao, chaves_alteradas):
+    # Uma linha por chave; chaves compostas ficam como "tt0000001|2"
+    criar_log_alteracoes(conexao)
+    colunas = [chaves_alteradas[coluna].astype(str) for coluna in chaves_alteradas.columns]
+    chaves_texto = colunas[0].str.cat(colunas[1:], sep="|") if len(colunas) > 1 else colunas[0]
+    conexao.executemany(f'INSERT INTO "{TABELA_ALTERACOES}" VALUES (?, ?, ?, ?)',
+                        ((carga, tabela, operacao, chave) for chave in chaves_texto))
+
+
+def tabela_acompanhada(tabela):
+    # Tabelas base (com chave natural) e pontes; não inclui as delta_<tabela> nem as derivadas
+    return tabela in PONTES or (not tabela.startswith(PREFIXO_DELTA) and chaves_tabela(tabela) is not None)
+
+
+def registrar_recarga(conexao, tabela, carga=None, confirmar=True):
+    # Marca no log que a tabela foi substituída inteira, se ela é acompanhada pelo log
+    if not tabela_acompanhada(tabela):
+        return
+    carga = carga or datetime.now().isoformat(timespec="seconds")
+    criar_log_alteracoes(conexao)
+    conexao.execute(f'INSERT INTO "{TABELA_ALTERACOES}" VALUES (?, ?, ?, NULL)', (carga, tabela, RECARGA))
+    if confirmar:
+        conexao.commit()
+
+
+def aplicar_delta(df, conexao, tabela, chaves, carga=None, em_massa=False):
+    # Compara o hash de cada linha com o da carga anterior (delta_<tabela>) e aplica só as diferenças,
+    # em uma única transação. Sem carga anterior, substitui a tabela e guarda os hashes para a próxima.
+    # Retorna a quantidade de linhas inseridas, atualizadas e removidas.
+    carga = carga or datetime.now().isoformat(timespec="seconds")
+    tabela_hashes = PREFIXO_DELTA + tabela
+    novos = hashes_linhas(df, chaves)
+
+    if not (tabela_existe(conexao, tabela) and tabela_existe(conexao, tabela_hashes)):
+        gravar_blocos([df], conexao, tabela, em_massa)
+        gravar_blocos([novos], conexao, tabela_hashes, em_massa)
+        return {INSERCAO: len(df), ATUALIZACAO: 0, REMOCAO: 0}
+
+    anteriores = pd.read_sql(f'SELECT * FROM "{tabela_hashes}"', conexao, dtype=novos.dtypes.to_dict())
+    comparacao = novos.merge(anteriores, on=chaves, how="outer", suffixes=("", "_anterior"), indicator=True)
+
+    inseridas = comparacao.loc[comparacao["_merge"] == "left_only", chaves]
+    atualizadas = comparacao.loc[(comparacao["_merge"] == "both")
+                                 & (comparacao["hash"] != comparacao["hash_anterior"]), chaves]
+    removidas = comparacao.loc[comparacao["_merge"] == "right_only", chaves]
+
+    # Atualização = remover a linha antiga e inserir a nova
+    substituidas = pd.concat([removidas, atualizadas], ignore_index=True)
+    novas = pd.concat([inseridas, atualizadas], ignore_index=True)
+    linhas_novas = df.merge(novas, on=chaves)
+    hashes_novos = novos.merge(novas, on=chaves)
+    lista_chaves = ", ".join(f'"{chave}"' for chave in chaves)
+
+    conexao.commit()
+    conexao.execute("BEGIN")
+    try:
+        if len(substituidas):
+            conexao.execute(f'CREATE TEMP TABLE delta_chaves AS SELECT {lista_chaves} FROM "{tabela_hashes}" LIMIT 0')
+            inserir_linhas(conexao, "delta_chaves", substituidas)
+            for destino in (tabela, tabela_hashes):
+                conexao.execute(f'DELETE FROM "{destino}" WHERE ({lista_chaves}) IN '
+                                f'(SELECT {lista_chaves} FROM temp.delta_chaves)')
+            conexao.execute("DROP TABLE temp.delta_chaves")
+
+        inserir_linhas(conexao, tabela, linhas_novas)
+        inserir_linhas(conexao, tabela_hashes, hashes_novos)
+
+        for operacao, chaves_alteradas in ((INSERCAO, inseridas), (ATUALIZACAO, atualizadas), (REMOCAO, removidas)):
+            registrar_alteracoes(conexao, carga, tabela, operacao, chaves_alteradas)
+
+        conexao.commit()
+    except BaseException:
+        conexao.rollback()
+        raise
+
+    return {INSERCAO: len(inseridas), ATUALIZACAO: len(atualizadas), REMOCAO: len(removidas)}
+
+
+def carregar_delta(caminho_arquivo, conexao, tabela, motor=MOTOR_PANDAS, chaves_inteiras=False, carga=None,
+                   em_massa=False):
+    # Carga delta de um .gz, TSV ou Parquet tratado; arquivos sem chave natural conhecida são recarregados inteiros
+    df = ler_completo(caminho_arquivo, motor, chaves_inteiras)
+    chaves = chaves_naturais(caminho_arquivo)
+    if chaves is None:
+        gravar_com_agregados([df], conexao, tabela, caminho_arquivo, em_massa)
+        return {INSERCAO: len(df), ATUALIZACAO: 0, REMOCAO: 0}
+
+    alteracoes = aplicar_delta(df, conexao, tabela, chaves, carga, em_massa)
+
+    # O agregado é pequeno: é refeito inteiro a partir do arquivo já lido
+    agregador = novo_agregador(caminho_arquivo)
+    if agregador is not None:
+        agregador.adicionar(df)
+        gravar_agregado(conexao, agregador, em_massa)
+    return alteracoes
+
+
+def carregar_no_backend(caminho_arquivo, conexao, tabela, backend=BACKEND_SQLITE, carga_delta=False, carga=None,
+                        linhas_por_bloco=LINHAS_POR_BLOCO, motor=MOTOR_PANDAS, chaves_inteiras=False,
+                        em_massa=False, log=logging):
+    # Carrega um arquivo (.gz ou tratado) na conexão do backend, com a carga delta quando pedida (só no
+    # SQLite; o DuckDB lê o arquivo direto e ignora as outras opções), e o remove depois da carga.
+    # Usada pelo etl_imdb (também como a carga do pipeline) e pelos operadores do ciclo 5.
+    arquivo = os.path.basename(caminho_arquivo)
+    log.debug(f"Carregando o arquivo {arquivo}...")
+
+    inicio = time.perf_counter()
+    if backend == BACKEND_DUCKDB:
+        linhas = carregar_duckdb(caminho_arquivo, conexao, tabela, chaves_inteiras)
+    elif carga_delta:
+        alteracoes = carregar_delta(caminho_arquivo, conexao, tabela, motor, chaves_inteiras, carga, em_massa)
+        linhas = sum(alteracoes.values())
+        log.info(f"Carga delta da tabela {tabela}: {alteracoes}.")
+    else:
+        linhas = carregar_arquivo(caminho_arquivo, conexao, tabela, linhas_por_bloco, motor, chaves_inteiras,
+                                  em_massa)
+    segundos = time.perf_counter() - inicio
+
+    destino = "no DuckDB" if backend == BACKEND_DUCKDB else "no banco de dados"
+    log.info(f"Arquivo {arquivo} salvo como tabela {tabela} {destino} "
+             f"({linhas} linhas, {linhas / segundos:,.0f} linhas/s).")
+
+    remover_tratado(caminho_arquivo)
+    return linhas
+
+
+def carregar_arquivos(tarefas, banco, backend=BACKEND_SQLITE, processos=1, carga_delta=False, carga=None,
+                      log=logging, **opcoes):
+    # Carrega os pares (arquivo, tabela) no banco: em processos separados (carregar_paralelo) quando
+    # processos > 1 no SQLite sem carga delta, senão um por vez com carregar_no_backend. Retorna as linhas
+    # carregadas por tabela.
+    if processos > 1 and not carga_delta and backend == BACKEND_SQLITE:
+        return carregar_paralelo(tarefas, banco, processos, log=log, **opcoes)
+
+    conexao = conectar(banco, backend)
+    try:
+        return {tabela: carregar_no_backend(caminho_arquivo, conexao, tabela, backend, carga_delta, carga,
+                                            log=log, **opcoes)
+                for caminho_arquivo, tabela in tarefas}
+    finally:
+        conexao.close()
+
+
+def indices_tabela(tabela):
+    # (nome, colunas, único) de cada índice declarado para a tabela; as tabelas delta_<tabela> recebem o
+    # mesmo índice único da tabela de origem, usado na remoção das chaves alteradas
+    chaves = chaves_tabela(tabela)
+
+    indices = [(f"ux_{tabela}", chaves, True)] if chaves else []
+    if not tabela.startswith(PREFIXO_DELTA):
+        indices += [(f"ix_{tabela}_{'_'.join(colunas)}", colunas, False)
+                    for colunas in INDICES_SECUNDARIOS.get(tabela, [])]
+    return indices
+
+
+def criar_indices(conexao, tabelas=None, log=logging):
+    # Cria os índices declarados das tabelas existentes (só os que faltam: uma tabela recarregada perde os
+    # índices junto com o DROP, e eles são refeitos de uma vez sobre os dados já inseridos) e roda o ANALYZE.
+    # Retorna os segundos gastos em cada índice criado.
+    existentes = [nome for nome, in conexao.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    tempos = {}
+
+    for tabela in tabelas or existentes:
+        if tabela not in existentes:
+            continue
+
+        # Tabelas criadas por ddl_tabela já têm a chave natural como PRIMARY KEY
+        chave_primaria = [nome for pk, nome in sorted((pk, nome) for _, nome, _, _, _, pk in
+                                                      conexao.execute(f'PRAGMA table_info("{tabela}")') if pk)]
+
+        for indice, colunas, unico in indices_tabela(tabela):
+            if unico and colunas == chave_primaria:
+                continue
+            if conexao.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                               (indice,)).fetchone():
+                continue
+
+            lista_colunas = ", ".join(f'"{coluna}"' for coluna in colunas)
+            inicio = time.perf_counter()
+            try:
+                conexao.execute(f'CREATE {"UNIQUE " if unico else ""}INDEX "{indice}" ON "{tabela}" ({lista_colunas})')
+            except sqlite3.IntegrityError:
+                # Chave natural repetida no arquivo: o índice continua útil para as buscas, só não é único
+                log.warning(f"Chave {colunas} repetida na tabela {tabela}. Criando o índice sem UNIQUE.")
+                conexao.execute(f'CREATE INDEX "{indice}" ON "{tabela}" ({lista_colunas})')
+            conexao.commit()
+
+            tempos[indice] = time.perf_counter() - inicio
+            log.info(f"Índice {indice} criado em {tempos[indice]:.2f}s.")
+
+    inicio = time.perf_counter()
+    if tabelas:
+        for tabela in set(tabelas) & set(existentes):
+            conexao.execute(f'ANALYZE "{tabela}"')
+    else:
+        conexao.execute("ANALYZE")
+    conexao.commit()
+    log.info(f"Estatísticas (ANALYZE) atualizadas em {time.perf_counter() - inicio:.2f}s.")
+
+    return tempos
+
+
+def criar_visoes_texto(conexao):
+    # Para cada tabela com chaves inteiras (tconst/nconst/...), cria a view vw_<tabela> com as chaves
+    # no formato original ("tt0000001"). Tabelas com chaves em texto perdem a view, se existir.
+    tabelas = [nome for nome, in conexao.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+
+    for tabela in tabelas:
+        if tabela.startswith(PREFIXO_DELTA):
+            continue
+
+        colunas = conexao.execute(f'PRAGMA table_info("{tabela}")').fetchall()
+        chaves_inteiras = any(
+            nome in PREFIXOS_CHAVES and tipo.upper().startswith("INT") for _, nome, tipo, *_ in colunas
+        )
+
+        visao = PREFIXO_VISAO + tabela
+        conexao.execute(f'DROP VIEW IF EXISTS "{visao}"')
+        if not chaves_inteiras:
+            continue
+
+        expressoes = []
+        for _, nome, tipo, *_ in colunas:
+            if nome in PREFIXOS_CHAVES and tipo.upper().startswith("INT"):
+                texto = f"'{PREFIXOS_CHAVES[nome]}' || printf('%0{DIGITOS_CHAVE}d', \"{nome}\")"
+                expressoes.append(f'CASE WHEN "{nome}" IS NOT NULL THEN {texto} END AS "{nome}"')
+            else:
+                expressoes.append(f'"{nome}"')
+
+        conexao.execute(f'CREATE VIEW "{visao}" AS SELECT {", ".join(expressoes)} FROM "{tabela}"')
+
+    conexao.commit()
+
+
+def caminho_sombra(banco):
+    return banco + SUFIXO_SOMBRA
+
+
+def preparar_sombra(banco, sombra=None):
+    # Cria o banco em sombra a partir de uma cópia consistente do banco publicado (API de backup do SQLite,
+    # que não bloqueia os leitores), para que as tabelas de arquivos que não mudaram continuem lá.
+    # As tabelas analíticas também são copiadas: o materializar decide, pelo log_alteracoes, se basta
+    # atualizar os tconsts alterados ou se é preciso reconstruí-las.
+    sombra = sombra or caminho_sombra(banco)
+    for caminho in (sombra, sombra + "-journal"):
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+    destino = sqlite3.connect(sombra)
+    if os.path.exists(banco):
+        origem = sqlite3.connect(f"file:{banco}?mode=ro", uri=True)
+        origem.backup(destino)
+        origem.close()
+    destino.close()
+
+    return sombra
+
+
+def verificar_banco(caminho, tabelas=()):
+    # Confere a integridade do arquivo e se cada tabela esperada existe e tem linhas
+    conexao = sqlite3.connect(f"file:{caminho}?mode=ro", uri=True)
+    try:
+        problemas = [linha for linha, in conexao.execute("PRAGMA quick_check") if linha != "ok"]
+        existentes = {nome for nome, in conexao.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for tabela in tabelas:
+            if tabela not in existentes:
+                problemas.append(f"tabela {tabela} não existe")
+            elif conexao.execute(f'SELECT 1 FROM "{tabela}" LIMIT 1').fetchone() is None:
+                problemas.append(f"tabela {tabela} está vazia")
+    finally:
+        conexao.close()
+
+    if problemas:
+        raise RuntimeError(f"Banco {caminho} inválido: {'; '.join(problemas)}")
+
+
+def geracoes(banco):
+    # Gerações anteriores do banco publicado, da mais recente para a mais antiga
+    diretorio = os.path.dirname(os.path.abspath(banco))
+    padrao = re.compile(re.escape(os.path.basename(banco)) + r"\.\d{8}T\d{6}$")
+    nomes = sorted((nome for nome in os.listdir(diretorio) if padrao.match(nome)), reverse=True)
+    return [os.path.join(diretorio, nome) for nome in nomes]
+
+
+def trocar_banco(origem, banco):
+    # O banco publicado nunca deixa de existir: a troca é um único rename por cima dele.
+    # Leitores com conexão aberta continuam lendo o arquivo antigo até fecharem a conexão.
+    os.replace(origem, banco)
+    if hasattr(os, "O_DIRECTORY"):
+        descritor = os.open(os.path.dirname(os.path.abspath(banco)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descritor)
+        finally:
+            os.close(descritor)
+
+
+def publicar_sombra(banco, sombra=None, tabelas=(), manter=GERACOES):
+    # Verifica o banco em sombra, guarda o banco publicado como geração e troca um pelo outro.
+    # Retorna o caminho da geração guardada (None no primeiro build).
+    sombra = sombra or caminho_sombra(banco)
+    verificar_banco(sombra, tabelas)
+
+    geracao = None
+    if os.path.exists(banco):
+        geracao = f"{banco}.{datetime.now().strftime(FORMATO_GERACAO)}"
+        try:
+            # Hard link: a geração aponta para o mesmo arquivo, sem copiar nada
+            os.link(banco, geracao)
+        except OSError:
+            shutil.copy2(banco, geracao)
+
+    trocar_banco(sombra, banco)
+
+    for antiga in geracoes(banco)[manter:]:
+        os.remove(antiga)
+
+    return geracao
+
+
+def restaurar_geracao(banco, geracao=None):
+    # Rollback: publica de novo uma geração anterior (a mais recente, se nenhuma for indicada)
+    if geracao is None:
+        anteriores = geracoes(banco)
+        if not anteriores:
+            raise FileNotFoundError(f"Nenhuma geração anterior de {banco}")
+        geracao = anteriores[0]
+
+    temporario = caminho_sombra(banco)
+    if os.path.exists(temporario):
+        os.remove(temporario)
+    shutil.copy2(geracao, temporario)
+    trocar_banco(temporario, banco)
+    return geracao
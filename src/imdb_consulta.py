@@ -0,0 +1,145 @@
+# Camada de leitura do imdb_data.db para os consumidores: conexões somente leitura reaproveitadas (pool),
+# com mmap e cache de páginas ajustados, cache de comandos preparados do sqlite3 e cache LRU de resultados
+# por SQL + parâmetros, descartado sozinho quando uma nova geração do banco é publicada.
+
+# IMPORTS
+import os
+import queue
+import sqlite3
+import threading
+import pandas as pd
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Conexões abertas ao mesmo tempo e resultados guardados no cache
+CONEXOES = 8
+ITENS_CACHE = 1024
+
+# Comandos preparados guardados por conexão (cache LRU do próprio módulo sqlite3, por texto do SQL)
+COMANDOS_PREPARADOS = 256
+
+# Pragmas de cada conexão de leitura: o arquivo é lido via mmap (sem copiar páginas para o cache do SQLite),
+# com 256 MB de cache de páginas (valor negativo = KiB) e a conexão impedida de escrever
+PRAGMAS_LEITURA = {
+    "mmap_size": 1024 ** 3,
+    "cache_size": -262144,
+    "temp_store": "MEMORY",
+    "query_only": "ON",
+}
+
+
+def geracao_banco(banco):
+    # Identifica a versão publicada do arquivo: publicar_sombra troca o inode (rename) e uma carga sem sombra
+    # muda o tamanho ou a data de modificação
+    estado = os.stat(banco)
+    return estado.st_ino, estado.st_mtime_ns, estado.st_size
+
+
+def chave_cache(sql, parametros):
+    if isinstance(parametros, dict):
+        return sql, tuple(sorted(parametros.items()))
+    return sql, tuple(parametros)
+
+
+class ServicoConsultas:
+    # Uso: servico = ServicoConsultas("imdb_data.db"); servico.consultar("SELECT ... WHERE tconst = ?", (tconst,))
+    # Seguro entre threads: cada consulta usa uma conexão do pool só para ela.
+    def __init__(self, banco, conexoes=CONEXOES, itens_cache=ITENS_CACHE, pragmas=PRAGMAS_LEITURA):
+        self.banco = banco
+        self.pragmas = pragmas
+        self.itens_cache = itens_cache
+        self.livres = queue.LifoQueue()
+        self.vagas = threading.BoundedSemaphore(conexoes)
+        self.trava = threading.Lock()
+        self.resultados = OrderedDict()
+        self.geracao = geracao_banco(banco)
+        self.acertos = 0
+        self.falhas = 0
+
+    def abrir(self):
+        conexao = sqlite3.connect(f"file:{self.banco}?mode=ro", uri=True, check_same_thread=False,
+                                  cached_statements=COMANDOS_PREPARADOS)
+        for pragma, valor in self.pragmas.items():
+            conexao.execute(f"PRAGMA {pragma} = {valor}")
+        return conexao
+
+    def fechar_livres(self):
+        while True:
+            try:
+                _, conexao = self.livres.get_nowait()
+            except queue.Empty:
+                return
+            conexao.close()
+
+    def verificar_geracao(self):
+        # Nova geração publicada: o cache de resultados é descartado e as conexões livres, que continuam
+        # apontando para o arquivo antigo, são fechadas; as que estão em uso são fechadas ao voltar
+        atual = geracao_banco(self.banco)
+        with self.trava:
+            if atual != self.geracao:
+                self.geracao = atual
+                self.resultados.clear()
+                self.fechar_livres()
+        return atual
+
+    @contextmanager
+    def conexao(self):
+        geracao = self.verificar_geracao()
+        with self.vagas:
+            try:
+                geracao_conexao, conexao = self.livres.get_nowait()
+            except queue.Empty:
+                geracao_conexao, conexao = geracao, self.abrir()
+            if geracao_conexao != geracao:
+                conexao.close()
+                geracao_conexao, conexao = geracao, self.abrir()
+
+            try:
+                yield conexao
+            finally:
+                if geracao_conexao == self.geracao:
+                    self.livres.put((geracao_conexao, conexao))
+                else:
+                    conexao.close()
+
+    def executar(self, sql, parametros=(), usar_cache=True):
+        # (colunas, linhas) da consulta, do cache quando o mesmo SQL com os mesmos parâmetros já foi executado
+        # nesta geração do banco. As linhas são uma tupla, compartilhada entre quem recebe o mesmo resultado.
+        chave = chave_cache(sql, parametros)
+        geracao = self.verificar_geracao()
+        if usar_cache:
+            with self.trava:
+                if chave in self.resultados:
+                    self.resultados.move_to_end(chave)
+                    self.acertos += 1
+                    return self.resultados[chave]
+                self.falhas += 1
+
+        with self.conexao() as conexao:
+            cursor = conexao.execute(sql, parametros)
+            resultado = ([coluna for coluna, *_ in cursor.description or []], tuple(cursor.fetchall()))
+
+        if usar_cache:
+            with self.trava:
+                # Um resultado lido de uma geração que acabou de ser trocada não entra no cache
+                if geracao == self.geracao:
+                    self.resultados[chave] = resultado
+                    if len(self.resultados) > self.itens_cache:
+                        self.resultados.popitem(last=False)
+        return resultado
+
+    def consultar(self, sql, parametros=(), usar_cache=True):
+        return self.executar(sql, parametros, usar_cache)[1]
+
+    def consultar_df(self, sql, parametros=(), usar_cache=True):
+        colunas, linhas = self.executar(sql, parametros, usar_cache)
+        return pd.DataFrame.from_records(list(linhas), columns=colunas)
+
+    def estatisticas(self):
+        with self.trava:
+            return {"acertos": self.acertos, "falhas": self.falhas, "itens": len(self.resultados)}
+
+    def fechar(self):
+        with self.trava:
+            self.resultados.clear()
+            self.fechar_livres()
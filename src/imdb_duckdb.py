@@ -0,0 +1,77 @@
+# IMPORTS
+import os
+import sqlite3
+from imdb_esquema import NULO, PREFIXOS_CHAVES, TEXTO, TIPO_CHAVE_INTEIRA, esquema
+from imdb_transformacao import FORMATO_PARQUET
+
+# O DuckDB é opcional: só é necessário quando o backend "duckdb" é escolhido
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Backends de armazenamento aceitos pelas etapas de carga e das tabelas analíticas
+BACKEND_SQLITE = "sqlite"
+BACKEND_DUCKDB = "duckdb"
+
+# Tipo do DuckDB equivalente a cada tipo do pandas usado nos esquemas
+TIPOS_DUCKDB = {
+    TEXTO: "VARCHAR",
+    "Int16": "SMALLINT",
+    "Int32": "INTEGER",
+    "Float64": "DOUBLE",
+    "boolean": "BOOLEAN",
+    "category": "VARCHAR",
+}
+
+
+def conectar(banco, backend=BACKEND_SQLITE):
+    # As duas conexões têm execute/commit/close, o suficiente para as consultas analíticas
+    if backend == BACKEND_DUCKDB:
+        if duckdb is None:
+            raise ImportError("O backend duckdb precisa do pacote duckdb (pip install duckdb)")
+        return duckdb.connect(banco)
+    return sqlite3.connect(banco)
+
+
+def texto_sql(valor):
+    return "'" + valor.replace("'", "''") + "'"
+
+
+def origem_csv(caminho_arquivo, chaves_inteiras=False):
+    # read_csv do DuckDB com as mesmas regras de opcoes_leitura: tabulação, sem aspas e "\N" como nulo.
+    # Um .gz original ainda tem as chaves em texto: com chaves_inteiras elas são convertidas no SELECT.
+    original = caminho_arquivo.endswith(".gz")
+    colunas = esquema(caminho_arquivo, chaves_inteiras and not original)
+    tipos = ", ".join(f"{texto_sql(coluna)}: {texto_sql(TIPOS_DUCKDB[tipo])}" for coluna, tipo in colunas.items())
+
+    expressoes = []
+    for coluna in colunas:
+        if chaves_inteiras and original and coluna in PREFIXOS_CHAVES:
+            expressoes.append(f'CAST(substr("{coluna}", 3) AS {TIPOS_DUCKDB[TIPO_CHAVE_INTEIRA]}) AS "{coluna}"')
+        else:
+            expressoes.append(f'"{coluna}"')
+
+    origem = (f"read_csv({texto_sql(caminho_arquivo)}, delim = '\t', quote = '', escape = '', header = true, "
+              f"nullstr = {texto_sql(NULO)}, columns = {{{tipos}}})")
+    return f"SELECT {', '.join(expressoes)} FROM {origem}"
+
+
+def origem_parquet(caminho_arquivo):
+    # Diretório Parquet tratado, particionado ou não; as colunas voltam na ordem do esquema
+    colunas = esquema(caminho_arquivo) or {}
+    arquivos = texto_sql(os.path.join(caminho_arquivo, "**", "*.parquet"))
+    selecao = ", ".join(f'"{coluna}"' for coluna in colunas) or "*"
+    return f"SELECT {selecao} FROM read_parquet({arquivos}, hive_partitioning = true)"
+
+
+def carregar_duckdb(caminho_arquivo, conexao, tabela, chaves_inteiras=False):
+    # O DuckDB lê o .gz, o TSV ou o Parquet tratado diretamente (em paralelo), sem passar pelo pandas
+    if caminho_arquivo.endswith("." + FORMATO_PARQUET):
+        origem = origem_parquet(caminho_arquivo)
+    else:
+        origem = origem_csv(caminho_arquivo, chaves_inteiras)
+
+    conexao.execute(f'CREATE OR REPLACE TABLE "{tabela}" AS {origem}')
+    linhas, = conexao.execute(f'SELECT COUNT(*) FROM "{tabela}"').fetchone()
+    return linhas
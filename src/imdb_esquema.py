@@ -0,0 +1,202 @@
+# IMPORTS
+import os
+import csv
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+# Tipos de cada coluna dos arquivos do IMDb (https://developer.imdb.com/non-commercial-datasets/).
+# Inteiros e booleanos anuláveis aceitam o "\N" do IMDb como nulo; colunas com poucos valores
+# distintos viram category e os textos usam strings do pyarrow, bem mais compactas que object.
+TEXTO = "string[pyarrow]"
+
+ESQUEMAS = {
+    "name.basics": {
+        "nconst": TEXTO,
+        "primaryName": TEXTO,
+        "birthYear": "Int16",
+        "deathYear": "Int16",
+        "primaryProfession": TEXTO,
+        "knownForTitles": TEXTO,
+    },
+    "title.akas": {
+        "titleId": TEXTO,
+        "ordering": "Int32",
+        "title": TEXTO,
+        "region": "category",
+        "language": "category",
+        "types": "category",
+        "attributes": TEXTO,
+        "isOriginalTitle": "boolean",
+    },
+    "title.basics": {
+        "tconst": TEXTO,
+        "titleType": "category",
+        "primaryTitle": TEXTO,
+        "originalTitle": TEXTO,
+        "isAdult": "boolean",
+        "startYear": "Int16",
+        "endYear": "Int16",
+        "runtimeMinutes": "Int32",
+        "genres": TEXTO,
+    },
+    "title.crew": {
+        "tconst": TEXTO,
+        "directors": TEXTO,
+        "writers": TEXTO,
+    },
+    "title.episode": {
+        "tconst": TEXTO,
+        "parentTconst": TEXTO,
+        "seasonNumber": "Int32",
+        "episodeNumber": "Int32",
+    },
+    "title.principals": {
+        "tconst": TEXTO,
+        "ordering": "Int32",
+        "nconst": TEXTO,
+        "category": "category",
+        "job": TEXTO,
+        "characters": TEXTO,
+    },
+    "title.ratings": {
+        "tconst": TEXTO,
+        "averageRating": "Float64",
+        "numVotes": "Int32",
+    },
+}
+
+# Tabelas-ponte geradas no tratamento a partir das colunas com listas ("Action,Comedy", "nm0000001,nm0000002"):
+# uma linha por item, com a chave da linha de origem. Cada ponte é
+# (arquivo de origem, colunas-chave, coluna com a lista, coluna do item, tipo do item).
+PONTES = {
+    "title_genre": ("title.basics", ["tconst"], "genres", "genre", "category"),
+    "title_director": ("title.crew", ["tconst"], "directors", "nconst", TEXTO),
+    "title_writer": ("title.crew", ["tconst"], "writers", "nconst", TEXTO),
+    "person_profession": ("name.basics", ["nconst"], "primaryProfession", "profession", "category"),
+    "person_known_for": ("name.basics", ["nconst"], "knownForTitles", "tconst", TEXTO),
+    "aka_type": ("title.akas", ["titleId", "ordering"], "types", "type", "category"),
+    "aka_attribute": ("title.akas", ["titleId", "ordering"], "attributes", "attribute", TEXTO),
+}
+
+# Separadores das listas: vírgula, e o caractere \x02 que o IMDb usa em types/attributes de title.akas
+SEPARADOR_LISTA = r"[,\x02]"
+
+# Marcador de nulo usado pelo IMDb e mantido nos arquivos tratados
+NULO = "\\N"
+
+# Colunas-chave do IMDb e seus prefixos. Com chaves inteiras só a parte numérica é guardada
+# ("tt0000001" -> 1) e o texto original é remontado nas views com prefixo + 7 dígitos.
+PREFIXOS_CHAVES = {
+    "tconst": "tt",
+    "titleId": "tt",
+    "parentTconst": "tt",
+    "nconst": "nm",
+}
+TIPO_CHAVE_INTEIRA = "Int32"
+DIGITOS_CHAVE = 7
+
+# Chave natural de cada arquivo: identifica a linha entre uma versão do arquivo e a seguinte
+CHAVES_NATURAIS = {
+    "name.basics": ["nconst"],
+    "title.akas": ["titleId", "ordering"],
+    "title.basics": ["tconst"],
+    "title.crew": ["tconst"],
+    "title.episode": ["tconst"],
+    "title.principals": ["tconst", "ordering"],
+    "title.ratings": ["tconst"],
+}
+
+# Tipo Arrow/Parquet equivalente a cada tipo do pandas usado nos esquemas
+TIPOS_ARROW = {
+    TEXTO: pa.string(),
+    "Int16": pa.int16(),
+    "Int32": pa.int32(),
+    "Float64": pa.float64(),
+    "boolean": pa.bool_(),
+    "category": pa.dictionary(pa.int32(), pa.string()),
+}
+
+# Caminho inverso, ao converter tabelas Arrow/Parquet para DataFrame: inteiros e booleanos anuláveis
+# continuam anuláveis em vez de virar float/object
+TIPOS_PANDAS = {
+    pa.string(): pd.StringDtype("pyarrow"),
+    pa.int16(): pd.Int16Dtype(),
+    pa.int32(): pd.Int32Dtype(),
+    pa.int64(): pd.Int64Dtype(),
+    pa.float64(): pd.Float64Dtype(),
+    pa.bool_(): pd.BooleanDtype(),
+}
+
+
+def nome_base(arquivo):
+    # "data/title.basics.tsv.gz", "title.basics.tsv" ou "title.basics.parquet" -> "title.basics"
+    arquivo = os.path.basename(os.path.normpath(arquivo))
+    for extensao in (".gz", ".tsv", ".parquet"):
+        if arquivo.endswith(extensao):
+            arquivo = arquivo[:-len(extensao)]
+    return arquivo
+
+
+def chaves_naturais(arquivo):
+    return CHAVES_NATURAIS.get(nome_base(arquivo))
+
+
+def esquema_ponte(ponte):
+    origem, chaves, _, item, tipo_item = PONTES[ponte]
+    return {**{chave: ESQUEMAS[origem][chave] for chave in chaves}, item: tipo_item}
+
+
+def pontes(arquivo):
+    # Nomes das pontes geradas a partir do arquivo ("title.basics.tsv.gz" -> ["title_genre"])
+    return [ponte for ponte, (origem, *_) in PONTES.items() if origem == nome_base(arquivo)]
+
+
+def esquema(arquivo, chaves_inteiras=False):
+    nome = nome_base(arquivo)
+    colunas = esquema_ponte(nome) if nome in PONTES else ESQUEMAS.get(nome)
+    if colunas is None or not chaves_inteiras:
+        return colunas
+    return {coluna: TIPO_CHAVE_INTEIRA if coluna in PREFIXOS_CHAVES else tipo for coluna, tipo in colunas.items()}
+
+
+def opcoes_leitura(arquivo, chaves_inteiras=False):
+    # O IMDb não usa aspas: um '"' no início de um título é texto, não o começo de um campo entre aspas
+    return {
+        "sep": "\t",
+        "quoting": csv.QUOTE_NONE,
+        "na_values": [NULO],
+        "keep_default_na": False,
+        "dtype": esquema(arquivo, chaves_inteiras) or str,
+    }
+
+
+def opcoes_leitura_arrow(arquivo, bytes_por_bloco=None, chaves_inteiras=False):
+    # As mesmas regras de opcoes_leitura para o leitor multi-thread do pyarrow.csv
+    opcoes_bloco = {"block_size": bytes_por_bloco} if bytes_por_bloco else {}
+    return {
+        "read_options": pacsv.ReadOptions(use_threads=True, **opcoes_bloco),
+        "parse_options": pacsv.ParseOptions(delimiter="\t", quote_char=False, newlines_in_values=False),
+        "convert_options": pacsv.ConvertOptions(
+            column_types=esquema_arrow(arquivo, chaves_inteiras),
+            null_values=[NULO],
+            strings_can_be_null=True,
+        ),
+    }
+
+
+def opcoes_escrita():
+    # Os arquivos tratados seguem o mesmo formato do IMDb, para serem lidos com as mesmas opções
+    return {
+        "sep": "\t",
+        "quoting": csv.QUOTE_NONE,
+        "na_rep": NULO,
+        "index": False,
+    }
+
+
+def esquema_arrow(arquivo, chaves_inteiras=False):
+    colunas = esquema(arquivo, chaves_inteiras)
+    if colunas is None:
+        return None
+    return pa.schema([(coluna, TIPOS_ARROW[tipo]) for coluna, tipo in colunas.items()])
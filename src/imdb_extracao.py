@@ -0,0 +1,331 @@
+# IMPORTS
+import os
+import json
+import time
+import hashlib
+import logging
+import traceback
+import zlib
+import threading
+import requests
+import urllib3
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+
+# Tamanho dos blocos lidos da resposta HTTP (1 MB)
+TAMANHO_BLOCO = 1024 * 1024
+
+# Intervalo mínimo, em segundos, entre duas mensagens de progresso do mesmo arquivo
+INTERVALO_PROGRESSO = 10
+
+# Nome do arquivo JSON, dentro do diretório de destino, com os metadados dos downloads
+ARQUIVO_METADADOS = "metadados_downloads.json"
+
+# Sufixo do arquivo que recebe os bytes enquanto o download não termina
+SUFIXO_PARCIAL = ".part"
+
+# Tentativas por arquivo e espera inicial (em segundos) entre elas, dobrada a cada falha
+MAX_TENTATIVAS = 5
+ESPERA_INICIAL = 2
+
+# Timeout de conexão e de leitura das requisições, em segundos
+TIMEOUT = (30, 120)
+
+# Erros de rede que justificam uma nova tentativa a partir do último byte recebido
+ERROS_REDE = (requests.RequestException, urllib3.exceptions.HTTPError, OSError)
+
+
+class ProgressoDownload:
+    # Contadores de um arquivo: cada arquivo é atualizado apenas pela sua própria thread
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.status = "pendente"
+        self.bytes_baixados = 0
+        self.bytes_totais = None
+        self.segundos = 0.0
+
+    def percentual(self):
+        if not self.bytes_totais:
+            return None
+        return 100.0 * self.bytes_baixados / self.bytes_totais
+
+
+class MetadadosDownload:
+    # Guarda ETag, Last-Modified, tamanho e checksum de cada arquivo baixado em um JSON ao lado dos dados
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.trava = threading.Lock()
+        self.dados = {}
+
+        if os.path.exists(caminho):
+            with open(caminho, encoding='utf-8') as f:
+                self.dados = json.load(f)
+
+    def obter(self, arquivo):
+        with self.trava:
+            return dict(self.dados.get(arquivo, {}))
+
+    def registrar(self, arquivo, etag, last_modified, tamanho, sha256):
+        with self.trava:
+            self.dados[arquivo] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "tamanho": tamanho,
+                "sha256": sha256,
+                "baixado_em": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            }
+            self._salvar()
+
+    def registrar_parcial(self, arquivo, etag, last_modified):
+        # Versão do arquivo que está sendo gravada no .part, usada no If-Range ao retomar
+        with self.trava:
+            self.dados[arquivo + SUFIXO_PARCIAL] = {"etag": etag, "last_modified": last_modified}
+            self._salvar()
+
+    def remover_parcial(self, arquivo):
+        with self.trava:
+            if self.dados.pop(arquivo + SUFIXO_PARCIAL, None) is not None:
+                self._salvar()
+
+    def _salvar(self):
+        # Escreve em um arquivo temporário e renomeia, para nunca deixar o JSON pela metade
+        caminho_temporario = self.caminho + ".tmp"
+        with open(caminho_temporario, 'w', encoding='utf-8') as f:
+            json.dump(self.dados, f, indent=2, sort_keys=True)
+        os.replace(caminho_temporario, self.caminho)
+
+
+def validador_if_range(versao_parcial):
+    # ETag forte ou Last-Modified: um ETag fraco (W/"...") não pode ir no If-Range (RFC 9110)
+    etag = versao_parcial.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return versao_parcial.get("last_modified")
+
+
+def cabecalhos_condicionais(metadados):
+    cabecalhos = {}
+    if metadados.get("etag"):
+        cabecalhos["If-None-Match"] = metadados["etag"]
+    if metadados.get("last_modified"):
+        cabecalhos["If-Modified-Since"] = metadados["last_modified"]
+    return cabecalhos
+
+
+class VerificadorGzip:
+    # Descompacta os blocos conforme chegam (descartando a saída) para validar CRC32 e tamanho do trailer gzip
+    def __init__(self):
+        self.descompactador = zlib.decompressobj(wbits=31)
+        self.fim_do_membro = False
+        self.corrompido = False
+
+    def atualizar(self, bloco):
+        if self.corrompido:
+            return
+        try:
+            while bloco:
+                if self.descompactador.eof:
+                    # Arquivos gzip podem ter vários membros concatenados
+                    self.descompactador = zlib.decompressobj(wbits=31)
+                self.descompactador.decompress(bloco)
+                bloco = self.descompactador.unused_data
+        except zlib.error:
+            self.corrompido = True
+            return
+        self.fim_do_membro = self.descompactador.eof
+
+
+def criar_sessao(max_conexoes):
+    # Sessão compartilhada entre as threads, com um pool de conexões por host
+    sessao = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=max_conexoes, pool_maxsize=max_conexoes)
+    sessao.mount("http://", adaptador)
+    sessao.mount("https://", adaptador)
+    return sessao
+
+
+def hash_parcial(caminho_parcial, checksum, verificador):
+    # Reprocessa os bytes já gravados no .part para continuar o hash e a verificação de onde pararam
+    with open(caminho_parcial, 'rb') as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b""):
+            checksum.update(bloco)
+            verificador.atualizar(bloco)
+
+
+def baixar_arquivo(sessao, base_url, arquivo, destino_diretorio, metadados, log=logging):
+    progresso = ProgressoDownload(arquivo)
+    url = base_url + arquivo
+    caminho_destino = os.path.join(destino_diretorio, arquivo)
+    caminho_parcial = caminho_destino + SUFIXO_PARCIAL
+
+    inicio = time.monotonic()
+    espera = ESPERA_INICIAL
+
+    for tentativa in range(1, MAX_TENTATIVAS + 1):
+        offset = os.path.getsize(caminho_parcial) if os.path.exists(caminho_parcial) else 0
+
+        if offset:
+            # Retoma do último byte recebido, desde que o arquivo no servidor seja a mesma versão
+            versao_parcial = metadados.obter(arquivo + SUFIXO_PARCIAL)
+            validador = validador_if_range(versao_parcial)
+            cabecalhos = {"Range": f"bytes={offset}-"}
+            if validador:
+                cabecalhos["If-Range"] = validador
+            log.info(f"Retomando {arquivo} a partir do byte {offset}...")
+        else:
+            # Só baixa de novo se o servidor disser que o arquivo mudou desde o último download
+            cabecalhos = cabecalhos_condicionais(metadados.obter(arquivo))
+            log.info(f"Baixando {arquivo}...")
+
+        try:
+            with sessao.get(url, stream=True, headers=cabecalhos, timeout=TIMEOUT) as response:
+                if response.status_code == 304:
+                    # Se o .gz ainda estiver no diretório, ele não foi tratado e segue para as próximas etapas
+                    log.info(f"{arquivo} não mudou desde o último download. Pulando o download.")
+                    progresso.status = "pendente" if os.path.exists(caminho_destino) else "inalterado"
+                    return progresso
+
+                if response.status_code == 416:
+                    # O .part não corresponde ao arquivo do servidor: recomeça do zero
+                    log.warning(f"Intervalo inválido ao retomar {arquivo}. Recomeçando o download.")
+                    os.remove(caminho_parcial)
+                    continue
+
+                if response.status_code >= 500:
+                    raise requests.HTTPError(f"Código de status: {response.status_code}", response=response)
+
+                if response.status_code not in (200, 206):
+                    log.error(f"Falha ao baixar {arquivo}. Código de status: {response.status_code}")
+                    progresso.status = "falha"
+                    return progresso
+
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                checksum = hashlib.sha256()
+                verificador = VerificadorGzip()
+
+                if response.status_code == 206:
+                    if not response.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+                        raise requests.HTTPError(f"Content-Range inesperado: {response.headers.get('Content-Range')}")
+                    hash_parcial(caminho_parcial, checksum, verificador)
+                    if arquivo.endswith(".gz") and verificador.corrompido:
+                        # O .part já tem bytes inválidos: recomeça do zero, sem baixar o resto antes
+                        log.warning(f"{arquivo}.part não passou na verificação do gzip. Recomeçando o download.")
+                        os.remove(caminho_parcial)
+                        metadados.remover_parcial(arquivo)
+                        continue
+                    modo = 'ab'
+                else:
+                    # Servidor ignorou o Range (ou o arquivo mudou): começa um .part novo
+                    offset = 0
+                    modo = 'wb'
+                    metadados.registrar_parcial(arquivo, etag, last_modified)
+
+                # Sem Content-Length (ou com um valor inválido) o tamanho fica desconhecido e o fim do .gz
+                # é conferido pelo trailer
+                tamanho = response.headers.get("Content-Length", "").strip()
+                progresso.bytes_totais = offset + int(tamanho) if tamanho.isdigit() else None
+                progresso.bytes_baixados = offset
+                ultimo_aviso = time.monotonic()
+
+                with open(caminho_parcial, modo) as f:
+                    # Lê os bytes crus, sem decodificar, como o shutil.copyfileobj(response.raw, f) fazia
+                    for bloco in response.raw.stream(TAMANHO_BLOCO, decode_content=False):
+                        f.write(bloco)
+                        checksum.update(bloco)
+                        verificador.atualizar(bloco)
+                        progresso.bytes_baixados += len(bloco)
+
+                        agora = time.monotonic()
+                        if agora - ultimo_aviso >= INTERVALO_PROGRESSO:
+                            ultimo_aviso = agora
+                            percentual = progresso.percentual()
+                            sufixo = f" ({percentual:.1f}%)" if percentual is not None else ""
+                            log.info(f"{arquivo}: {progresso.bytes_baixados / 1024 ** 2:.1f} MB baixados{sufixo}")
+
+                if progresso.bytes_totais is not None and progresso.bytes_baixados < progresso.bytes_totais:
+                    # Conexão encerrada antes do fim: o .part fica para a próxima tentativa
+                    raise OSError(f"incompleto ({progresso.bytes_baixados} de {progresso.bytes_totais} bytes)")
+
+                if arquivo.endswith(".gz"):
+                    if verificador.corrompido:
+                        # Bytes inválidos: descarta o .part para não retomar sobre dados ruins
+                        log.warning(f"{arquivo} não passou na verificação do gzip. Recomeçando o download.")
+                        os.remove(caminho_parcial)
+                        continue
+                    if not verificador.fim_do_membro:
+                        raise OSError("incompleto (trailer gzip ausente)")
+
+        except ERROS_REDE as erro:
+            if tentativa == MAX_TENTATIVAS:
+                log.error(f"Falha ao baixar {arquivo} após {tentativa} tentativas: {erro}")
+                progresso.status = "falha"
+                return progresso
+            log.warning(f"Erro ao baixar {arquivo} (tentativa {tentativa}/{MAX_TENTATIVAS}): {erro}. "
+                        f"Nova tentativa em {espera}s.")
+            time.sleep(espera)
+            espera *= 2
+            continue
+
+        # Só o arquivo completo e verificado ganha o nome final
+        os.replace(caminho_parcial, caminho_destino)
+        metadados.remover_parcial(arquivo)
+        metadados.registrar(
+            arquivo,
+            etag=etag,
+            last_modified=last_modified,
+            tamanho=progresso.bytes_baixados,
+            sha256=checksum.hexdigest(),
+        )
+
+        progresso.segundos = time.monotonic() - inicio
+        progresso.status = "baixado"
+        log.info(f"{arquivo} baixado com sucesso! "
+                 f"{progresso.bytes_baixados / 1024 ** 2:.1f} MB em {progresso.segundos:.1f}s")
+        return progresso
+
+    log.error(f"Falha ao baixar {arquivo} após {MAX_TENTATIVAS} tentativas.")
+    progresso.status = "falha"
+    return progresso
+
+
+def baixar_arquivos(base_url, arquivos, destino_diretorio, max_downloads=4, caminho_metadados=None, log=logging):
+    # Baixa os arquivos em paralelo, no máximo `max_downloads` ao mesmo tempo. Um arquivo que falhou não
+    # interrompe os outros: depois que todos terminam, levanta RuntimeError com a lista dos que falharam.
+    os.makedirs(destino_diretorio, exist_ok=True)
+
+    if caminho_metadados is None:
+        caminho_metadados = os.path.join(destino_diretorio, ARQUIVO_METADADOS)
+    metadados = MetadadosDownload(caminho_metadados)
+
+    max_downloads = max(1, min(max_downloads, len(arquivos)))
+    resultados = {}
+    inicio = time.monotonic()
+
+    with criar_sessao(max_downloads) as sessao, ThreadPoolExecutor(max_workers=max_downloads) as executor:
+        futuros = {
+            executor.submit(baixar_arquivo, sessao, base_url, arquivo, destino_diretorio, metadados, log): arquivo
+            for arquivo in arquivos
+        }
+
+        for futuro in as_completed(futuros):
+            arquivo = futuros[futuro]
+            try:
+                resultados[arquivo] = futuro.result()
+            except Exception:
+                log.error(f"Falha ao baixar {arquivo}:\n{traceback.format_exc()}")
+                progresso = ProgressoDownload(arquivo)
+                progresso.status = "falha"
+                resultados[arquivo] = progresso
+
+    total_bytes = sum(progresso.bytes_baixados for progresso in resultados.values())
+    inalterados = sum(progresso.status == "inalterado" for progresso in resultados.values())
+    log.info(f"Download concluído: {total_bytes / 1024 ** 2:.1f} MB em {time.monotonic() - inicio:.1f}s "
+             f"com até {max_downloads} downloads simultâneos ({inalterados} arquivos sem alteração).")
+
+    falhas = [arquivo for arquivo in arquivos if resultados[arquivo].status == "falha"]
+    if falhas:
+        raise RuntimeError(f"Falha ao baixar os arquivos: {', '.join(falhas)}")
+
+    # Mantém a ordem original da lista de arquivos
+    return {arquivo: resultados[arquivo] for arquivo in arquivos}
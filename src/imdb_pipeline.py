@@ -0,0 +1,243 @@
+# Execução em pipeline por arquivo: cada arquivo segue download -> tratamento -> carga assim que termina a
+# etapa anterior, em vez de todas as cargas esperarem todos os tratamentos, que esperam todos os downloads.
+# As etapas são ligadas por filas limitadas (um arquivo tratado só espera a carga se a fila estiver cheia,
+# o que também limita o disco ocupado por arquivos intermediários) e a carga tem um único escritor: a
+# thread que chamou executar_pipeline, dona da conexão com o banco.
+
+# IMPORTS
+import os
+import time
+import queue
+import logging
+import threading
+import traceback
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from imdb_esquema import PONTES, nome_base, pontes
+from imdb_extracao import ARQUIVO_METADADOS, MetadadosDownload, baixar_arquivo, criar_sessao
+from imdb_transformacao import FORMATO_TSV, caminho_tratado, tratar, tratar_em_processo
+from imdb_carga import nome_tabela
+
+# Arquivos esperando em cada fila: quem produz para quando a fila enche
+TAMANHO_FILA = 2
+
+# Marca de fim em uma fila (uma por consumidor)
+FIM = None
+
+
+class EstadoPipeline:
+    # Tempos de cada arquivo em cada etapa e arquivos que falharam no download, no tratamento ou na carga;
+    # atualizado pelas threads das etapas
+    def __init__(self):
+        self.trava = threading.Lock()
+        self.tempos = {}
+        self.falhas = []
+
+    def registrar(self, arquivo, etapa, segundos):
+        with self.trava:
+            self.tempos.setdefault(arquivo, {})[etapa] = segundos
+
+    def falhar(self, arquivo, etapa, erro, log):
+        log.error(f"Falha ao {etapa} {arquivo}:\n{erro}")
+        with self.trava:
+            self.falhas.append(arquivo)
+
+
+def ordenar_por_tamanho(arquivos, metadados):
+    # Maiores arquivos primeiro (pelo tamanho do último download), para o maior, que define o caminho
+    # crítico, começar logo; arquivos ainda sem metadados vão na frente
+    return sorted(arquivos, key=lambda arquivo: metadados.obter(arquivo).get("tamanho", float("inf")),
+                  reverse=True)
+
+
+def arquivo_de_origem(caminho_arquivo):
+    # .gz do qual veio um arquivo tratado ("title.basics.tsv" ou a ponte "title_genre.tsv" ->
+    # "title.basics.tsv.gz")
+    nome = nome_base(caminho_arquivo)
+    return f"{PONTES[nome][0] if nome in PONTES else nome}.tsv.gz"
+
+
+def sobras(arquivos, diretorio_dados, diretorio_tratados):
+    # Arquivos que uma execução anterior interrompida ou com falha deixou no caminho: .gz já baixados e
+    # ainda não tratados (no modo streaming, não carregados) e arquivos tratados que não chegaram a ser
+    # carregados. Um tratado cujo .gz também sobrou é refeito a partir do .gz.
+    # Retorna (.gz pendentes, tratados pendentes)
+    gz = [os.path.join(diretorio_dados, arquivo) for arquivo in arquivos
+          if os.path.isfile(os.path.join(diretorio_dados, arquivo))]
+    pendentes = {os.path.basename(caminho_arquivo) for caminho_arquivo in gz}
+
+    tratados = []
+    if os.path.isdir(diretorio_tratados):
+        for nome in sorted(os.listdir(diretorio_tratados)):
+            origem = arquivo_de_origem(nome)
+            if nome.endswith((".tsv", ".parquet")) and origem in arquivos and origem not in pendentes:
+                tratados.append(os.path.join(diretorio_tratados, nome))
+    return gz, tratados
+
+
+def etapa_download(base_url, arquivos, diretorio_dados, fila_saida, consumidores, max_downloads, estado, log,
+                   pendentes=()):
+    # Passa adiante os .gz `pendentes` de uma execução anterior e depois baixa até `max_downloads` arquivos
+    # ao mesmo tempo, passando adiante cada .gz presente no diretório assim que o seu download termina. Um
+    # download que falhou entra nas falhas da execução, como nas outras etapas; os arquivos que não mudaram
+    # desde o último download ficam fora desta execução
+    try:
+        for caminho_arquivo in pendentes:
+            fila_saida.put(caminho_arquivo)
+
+        metadados = MetadadosDownload(os.path.join(diretorio_dados, ARQUIVO_METADADOS))
+        arquivos = ordenar_por_tamanho(arquivos, metadados)
+        with criar_sessao(max_downloads) as sessao, ThreadPoolExecutor(max_workers=max_downloads) as executor:
+            futuros = {executor.submit(baixar_arquivo, sessao, base_url, arquivo, diretorio_dados, metadados, log):
+                       arquivo for arquivo in arquivos}
+
+            for futuro in as_completed(futuros):
+                arquivo = futuros[futuro]
+                try:
+                    progresso = futuro.result()
+                except Exception:
+                    estado.falhar(arquivo, "baixar", traceback.format_exc(), log)
+                    continue
+                if progresso.status == "falha":
+                    # baixar_arquivo já registrou o motivo no log
+                    estado.falhar(arquivo, "baixar", "download sem sucesso (detalhes acima)", log)
+                    continue
+
+                caminho_arquivo = os.path.join(diretorio_dados, arquivo)
+                if os.path.isfile(caminho_arquivo):
+                    estado.registrar(arquivo, "download", progresso.segundos)
+                    fila_saida.put(caminho_arquivo)
+    finally:
+        for _ in range(consumidores):
+            fila_saida.put(FIM)
+
+
+class EtapaTratamento:
+    # Threads que tiram cada .gz da fila, tratam (no próprio processo ou em um processo separado, quando há
+    # um executor) e colocam na fila da carga o arquivo tratado e as pontes geradas junto com ele.
+    # A última thread a terminar avisa o escritor.
+    def __init__(self, fila_entrada, fila_saida, diretorio_tratados, threads, executor, estado, log, **opcoes):
+        self.fila_entrada = fila_entrada
+        self.fila_saida = fila_saida
+        self.diretorio_tratados = diretorio_tratados
+        self.executor = executor
+        self.estado = estado
+        self.log = log
+        self.opcoes = opcoes
+        self.ativas = threads
+        self.trava = threading.Lock()
+
+    def tratar(self, caminho_arquivo, caminho_destino):
+        if self.executor is None:
+            return tratar(caminho_arquivo, caminho_destino, **self.opcoes)
+
+        linhas, erro, registros = self.executor.submit(tratar_em_processo, caminho_arquivo, caminho_destino,
+                                                       self.opcoes).result()
+        for nivel, mensagem in registros:
+            self.log.log(nivel, mensagem)
+        if erro:
+            raise RuntimeError(erro)
+        return linhas
+
+    def executar(self):
+        formato = self.opcoes.get("formato", FORMATO_TSV)
+        try:
+            while (caminho_arquivo := self.fila_entrada.get()) is not FIM:
+                arquivo = os.path.basename(caminho_arquivo)
+                caminho_destino = caminho_tratado(self.diretorio_tratados, arquivo, formato)
+                inicio = time.perf_counter()
+                try:
+                    self.tratar(caminho_arquivo, caminho_destino)
+                except Exception:
+                    self.estado.falhar(arquivo, "tratar", traceback.format_exc(), self.log)
+                    continue
+                self.estado.registrar(arquivo, "tratamento", time.perf_counter() - inicio)
+                self.log.info(f"Processamento concluído para {arquivo}. Arquivo processado salvo em {caminho_destino}")
+                os.remove(caminho_arquivo)
+
+                self.fila_saida.put(caminho_destino)
+                if self.opcoes.get("gerar_pontes"):
+                    for ponte in pontes(arquivo):
+                        self.fila_saida.put(caminho_tratado(self.diretorio_tratados, ponte, formato))
+        finally:
+            with self.trava:
+                self.ativas -= 1
+                ultima = self.ativas == 0
+            if ultima:
+                self.fila_saida.put(FIM)
+
+
+def executar_pipeline(base_url, arquivos, diretorio_dados, conexao, carregar, max_downloads=4,
+                      processos_transformacao=1, streaming=False, tamanho_fila=TAMANHO_FILA, log=logging,
+                      **opcoes_tratamento):
+    # Baixa, trata e carrega cada arquivo de forma independente. carregar(caminho_arquivo, conexao, tabela)
+    # grava um arquivo (tratado, ou o .gz no modo streaming) e é chamada só nesta thread, um arquivo por vez.
+    # processos_transformacao arquivos são tratados ao mesmo tempo (em processos separados quando > 1).
+    # O que sobrou de uma execução anterior (.gz não tratados, tratados não carregados) segue da etapa em
+    # que parou e não é baixado de novo nesta execução: depois de um 304 não chegaria mais à carga.
+    # Retorna os segundos de cada arquivo em cada etapa; levanta RuntimeError se algum arquivo falhou.
+    os.makedirs(diretorio_dados, exist_ok=True)
+    estado = EstadoPipeline()
+    fila_carga = queue.Queue(maxsize=tamanho_fila)
+    inicio = time.perf_counter()
+
+    diretorio_tratados = os.path.join(diretorio_dados, "tratados")
+    gz_pendentes, tratados_pendentes = sobras(arquivos, diretorio_dados, diretorio_tratados)
+    retomados = {os.path.basename(caminho_arquivo) for caminho_arquivo in gz_pendentes}
+    retomados |= {arquivo_de_origem(caminho_arquivo) for caminho_arquivo in tratados_pendentes}
+    if retomados:
+        log.info(f"Retomando da execução anterior, sem novo download: {', '.join(sorted(retomados))}.")
+    arquivos = [arquivo for arquivo in arquivos if arquivo not in retomados]
+    max_downloads = max(1, min(max_downloads, len(arquivos)))
+
+    threads = []
+    executor = None
+    if streaming:
+        # Sem tratamento: o .gz baixado vai direto para a carga
+        threads.append(threading.Thread(target=etapa_download, daemon=True, args=(
+            base_url, arquivos, diretorio_dados, fila_carga, 1, max_downloads, estado, log, gz_pendentes)))
+    else:
+        os.makedirs(diretorio_tratados, exist_ok=True)
+        fila_tratamento = queue.Queue(maxsize=tamanho_fila)
+        tratadores = max(1, processos_transformacao)
+        if processos_transformacao > 1:
+            executor = ProcessPoolExecutor(max_workers=processos_transformacao)
+
+        tratamento = EtapaTratamento(fila_tratamento, fila_carga, diretorio_tratados, tratadores, executor,
+                                     estado, log, **opcoes_tratamento)
+        threads.append(threading.Thread(target=etapa_download, daemon=True, args=(
+            base_url, arquivos, diretorio_dados, fila_tratamento, tratadores, max_downloads, estado, log,
+            gz_pendentes)))
+        threads += [threading.Thread(target=tratamento.executar, daemon=True) for _ in range(tratadores)]
+
+    for thread in threads:
+        thread.start()
+
+    # Escritor único: carrega primeiro os tratados pendentes (enquanto as outras etapas já trabalham) e
+    # depois consome a fila até a marca de fim, sem parar em uma falha (as etapas anteriores ficariam presas
+    # na fila cheia). Interrompido, deixa as threads (daemon) para trás.
+    try:
+        for caminho_arquivo in chain(tratados_pendentes, iter(fila_carga.get, FIM)):
+            arquivo = os.path.basename(caminho_arquivo)
+            inicio_carga = time.perf_counter()
+            try:
+                carregar(caminho_arquivo, conexao, nome_tabela(arquivo))
+            except Exception:
+                estado.falhar(arquivo, "carregar", traceback.format_exc(), log)
+                continue
+            estado.registrar(arquivo, "carga", time.perf_counter() - inicio_carga)
+    except BaseException:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        raise
+
+    for thread in threads:
+        thread.join()
+    if executor is not None:
+        executor.shutdown()
+
+    log.info(f"Pipeline concluído em {time.perf_counter() - inicio:.1f}s "
+             f"(soma das etapas: {sum(sum(tempos.values()) for tempos in estado.tempos.values()):.1f}s).")
+    if estado.falhas:
+        raise RuntimeError(f"Falha ao processar os arquivos: {', '.join(estado.falhas)}")
+    return estado.tempos
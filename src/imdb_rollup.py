@@ -0,0 +1,118 @@
+# Rollups de analitico_titulos para os painéis: contagens, médias, nota ponderada pelos votos e percentis
+# por gênero, ano/década e titleType, calculados em uma passada do pandas sobre colunas tipadas e gravados
+# em tabelas pequenas (rollup_*), em vez de um GROUP BY com separação de genres a cada consulta.
+
+# IMPORTS
+import time
+import logging
+import sqlite3
+import pandas as pd
+from datetime import datetime
+from imdb_carga import gravar_blocos
+from imdb_analitico import COMPLETA, registrar_materializacao
+
+# Tabela de rollup -> colunas de agrupamento. Os níveis com "genre" contam um título em cada um dos seus
+# gêneros; os demais contam cada título uma vez.
+ROLLUPS = {
+    "rollup_genero_ano_tipo": ["genre", "startYear", "titleType"],
+    "rollup_genero_decada_tipo": ["genre", "decada", "titleType"],
+    "rollup_genero_decada": ["genre", "decada"],
+    "rollup_genero": ["genre"],
+    "rollup_decada_tipo": ["decada", "titleType"],
+    "rollup_tipo": ["titleType"],
+}
+
+# Percentis de averageRating guardados em cada grupo (coluna p25, p50, ...)
+PERCENTIS = [0.25, 0.5, 0.75, 0.9]
+
+# Só as colunas usadas, já com os tipos compactos: category para os textos repetidos
+CONSULTA_TITULOS = "SELECT titleType, startYear, genres, averageRating, numVotes FROM analitico_titulos"
+TIPOS_TITULOS = {
+    "titleType": "category",
+    "startYear": "Int16",
+    "genres": "category",
+    "averageRating": "Float64",
+    "numVotes": "Int64",
+}
+
+
+def ler_titulos(conexao):
+    if isinstance(conexao, sqlite3.Connection):
+        df = pd.read_sql(CONSULTA_TITULOS, conexao)
+    else:
+        df = conexao.execute(CONSULTA_TITULOS).df()
+    return df.astype(TIPOS_TITULOS)
+
+
+def explodir_generos(df):
+    # Uma linha por gênero do título. genres tem poucos valores distintos ("Action,Comedy", ...): a separação é
+    # feita uma vez por combinação e as linhas são repetidas pelo código da categoria, sem split por linha
+    generos = df["genres"].cat.categories.to_series(index=range(len(df["genres"].cat.categories)))
+    generos = generos.str.split(",").explode().rename("genre").astype("category")
+    explodido = df.join(generos, on=df["genres"].cat.codes.rename("codigo"), how="left")
+    return explodido.drop(columns="genres").reset_index(drop=True)
+
+
+def agregar(df, colunas):
+    # Contagens, média simples, nota ponderada pelos votos (só títulos avaliados) e percentis por grupo
+    df = df.assign(
+        votosAvaliados=df["numVotes"].where(df["averageRating"].notna()),
+        notaVotos=df["averageRating"] * df["numVotes"],
+    )
+    grupos = df.groupby(colunas, dropna=False, observed=True, sort=True)
+
+    rollup = grupos.agg(
+        qtTitulos=("averageRating", "size"),
+        qtAvaliados=("averageRating", "count"),
+        notaMedia=("averageRating", "mean"),
+        totalVotos=("votosAvaliados", "sum"),
+        notaVotos=("notaVotos", "sum"),
+    )
+    rollup["notaPonderada"] = rollup["notaVotos"] / rollup["totalVotos"].where(rollup["totalVotos"] > 0)
+    rollup = rollup.drop(columns="notaVotos")
+
+    # Percentis agrupados pelo número do grupo: o quantile do groupby descarta os grupos com chave nula
+    percentis = df["averageRating"].groupby(grupos.ngroup()).quantile(PERCENTIS).unstack()
+    for percentil in PERCENTIS:
+        rollup[f"p{round(percentil * 100)}"] = percentis[percentil].to_numpy()
+
+    return rollup.reset_index()
+
+
+def gravar_rollup(conexao, tabela, rollup):
+    if isinstance(conexao, sqlite3.Connection):
+        gravar_blocos([rollup], conexao, tabela, em_massa=True)
+        return
+    conexao.register("rollup_df", rollup)
+    try:
+        conexao.execute(f'CREATE OR REPLACE TABLE "{tabela}" AS SELECT * FROM rollup_df')
+    finally:
+        conexao.unregister("rollup_df")
+
+
+def criar_rollups(conexao, rollups=None, log=logging):
+    # Lê analitico_titulos uma vez e grava cada rollup (SQLite ou DuckDB). Cada tabela fica registrada em
+    # log_materializacao, como as tabelas analíticas. Retorna as linhas de cada rollup.
+    rollups = rollups or list(ROLLUPS)
+    inicio = time.perf_counter()
+    titulos = ler_titulos(conexao)
+    titulos["decada"] = (titulos["startYear"] // 10 * 10).astype("Int16")
+    generos = explodir_generos(titulos) if any("genre" in ROLLUPS[tabela] for tabela in rollups) else None
+    log.info(f"analitico_titulos lida para os rollups em {time.perf_counter() - inicio:.2f}s ({len(titulos)} linhas).")
+
+    linhas = {}
+    for tabela in rollups:
+        colunas = ROLLUPS[tabela]
+        inicio_tabela = datetime.now().isoformat(timespec="seconds")
+        cronometro = time.perf_counter()
+
+        rollup = agregar(generos if "genre" in colunas else titulos, colunas)
+        gravar_rollup(conexao, tabela, rollup)
+
+        resultado = {"modo": COMPLETA, "segundos": time.perf_counter() - cronometro,
+                     "removidas": None, "inseridas": len(rollup)}
+        registrar_materializacao(conexao, tabela, inicio_tabela, resultado, None)
+        log.info(f"Rollup {tabela} criado em {resultado['segundos']:.2f}s ({len(rollup)} linhas).")
+        linhas[tabela] = len(rollup)
+
+    return linhas
@@ -0,0 +1,464 @@
+# IMPORTS
+import os
+import gzip
+import time
+import shutil
+import logging
+import traceback
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from imdb_esquema import (DIGITOS_CHAVE, PONTES, PREFIXOS_CHAVES, SEPARADOR_LISTA, TEXTO, TIPO_CHAVE_INTEIRA,
+                          TIPOS_PANDAS, esquema, esquema_arrow, nome_base, opcoes_leitura, opcoes_leitura_arrow,
+                          opcoes_escrita, pontes)
+
+# Quantidade de linhas lidas de cada vez quando o arquivo é processado em blocos
+LINHAS_POR_BLOCO = 500_000
+
+# Linhas lidas do início do arquivo para estimar o consumo de memória por linha
+LINHAS_AMOSTRA = 10_000
+
+# Fator entre a memória de um bloco no DataFrame e o pico real durante leitura, tratamento e escrita
+FATOR_PICO_MEMORIA = 3
+
+# Formatos dos arquivos intermediários em data/tratados
+FORMATO_TSV = "tsv"
+FORMATO_PARQUET = "parquet"
+
+# Máximo de linhas por row group nos arquivos Parquet: cada row group é a unidade mínima lida com filtros
+LINHAS_POR_GRUPO = 1_000_000
+
+# Limite de partições de um diretório Parquet (o padrão do Arrow, 1024, é menor que as combinações
+# titleType x startYear do title.basics)
+MAX_PARTICOES_PARQUET = 100_000
+
+# Compressão dos arquivos Parquet
+COMPRESSAO_PARQUET = "zstd"
+
+# Motores de leitura dos TSVs: o leitor C do pandas (um núcleo) ou o pyarrow.csv (multi-thread)
+MOTOR_PANDAS = "pandas"
+MOTOR_PYARROW = "pyarrow"
+
+# Bytes descompactados lidos do início do arquivo para estimar o tamanho médio de uma linha
+BYTES_AMOSTRA = 1024 * 1024
+
+
+def ler_tabela_arrow(caminho_arquivo, chaves_inteiras=False):
+    # Lê o TSV (compactado ou não) inteiro como tabela Arrow, usando todos os núcleos
+    return pacsv.read_csv(caminho_arquivo, **opcoes_leitura_arrow(caminho_arquivo, chaves_inteiras=chaves_inteiras))
+
+
+def bytes_por_linha(caminho_arquivo):
+    abrir = gzip.open if caminho_arquivo.endswith(".gz") else open
+    with abrir(caminho_arquivo, 'rb') as f:
+        amostra = f.read(BYTES_AMOSTRA)
+    return max(1, len(amostra) // max(amostra.count(b"\n"), 1))
+
+
+def ler_lotes_arrow(caminho_arquivo, linhas_por_bloco=LINHAS_POR_BLOCO, chaves_inteiras=False):
+    # O pyarrow.csv divide a leitura em bytes: converte as linhas por bloco usando o tamanho médio da linha
+    bytes_por_bloco = linhas_por_bloco * bytes_por_linha(caminho_arquivo)
+    opcoes = opcoes_leitura_arrow(caminho_arquivo, bytes_por_bloco, chaves_inteiras)
+    with pacsv.open_csv(caminho_arquivo, **opcoes) as leitor:
+        yield from leitor
+
+
+def ler_arquivo(caminho_arquivo, motor=MOTOR_PANDAS, chaves_inteiras=False):
+    # Lê o TSV (compactado ou não) inteiro, já com os tipos do esquema e o "\N" como nulo.
+    # `chaves_inteiras` indica um arquivo tratado cujas chaves já foram convertidas por codificar_chaves.
+    if motor == MOTOR_PYARROW:
+        return ler_tabela_arrow(caminho_arquivo, chaves_inteiras).to_pandas(types_mapper=TIPOS_PANDAS.get)
+    return pd.read_csv(caminho_arquivo, compression='infer', **opcoes_leitura(caminho_arquivo, chaves_inteiras))
+
+
+def ler_em_blocos(caminho_arquivo, linhas_por_bloco=LINHAS_POR_BLOCO, motor=MOTOR_PANDAS, chaves_inteiras=False):
+    # Lê o TSV (compactado ou não) em blocos de `linhas_por_bloco` linhas, sem carregar o arquivo inteiro
+    if motor == MOTOR_PYARROW:
+        lotes = ler_lotes_arrow(caminho_arquivo, linhas_por_bloco, chaves_inteiras)
+        return (lote.to_pandas(types_mapper=TIPOS_PANDAS.get) for lote in lotes)
+    return pd.read_csv(caminho_arquivo, compression='infer', chunksize=linhas_por_bloco,
+                       **opcoes_leitura(caminho_arquivo, chaves_inteiras))
+
+
+def codificar_chaves(df, colunas=None):
+    # "tt0000001"/"nm0000001" -> 1: descarta o prefixo de duas letras e converte o resto, coluna inteira de uma vez
+    for coluna in df.columns.intersection(colunas or list(PREFIXOS_CHAVES)):
+        df[coluna] = df[coluna].str.slice(2).astype(TIPO_CHAVE_INTEIRA)
+    return df
+
+
+def linhas_por_memoria(caminho_arquivo, memoria_mb):
+    # Converte um limite de memória em linhas por bloco a partir de uma amostra do início do arquivo
+    amostra = pd.read_csv(caminho_arquivo, compression='infer', nrows=LINHAS_AMOSTRA,
+                          **opcoes_leitura(caminho_arquivo))
+    bytes_por_linha = amostra.memory_usage(deep=True).sum() / max(len(amostra), 1)
+    return max(1_000, int(memoria_mb * 1024 ** 2 / (bytes_por_linha * FATOR_PICO_MEMORIA)))
+
+
+def caminho_tratado(diretorio_tratados, arquivo, formato=FORMATO_TSV):
+    # "title.basics.tsv.gz" -> data/tratados/title.basics.tsv ou data/tratados/title.basics.parquet
+    return os.path.join(diretorio_tratados, f"{nome_base(arquivo)}.{formato}")
+
+
+def remover_tratado(caminho_arquivo):
+    # Arquivos Parquet são diretórios (um arquivo por partição)
+    if os.path.isdir(caminho_arquivo):
+        shutil.rmtree(caminho_arquivo)
+    else:
+        os.remove(caminho_arquivo)
+
+
+def tamanho_tratado(caminho_arquivo):
+    # Bytes de um arquivo tratado (ou .gz); no Parquet, a soma dos arquivos de todas as partições
+    if not os.path.isdir(caminho_arquivo):
+        return os.path.getsize(caminho_arquivo)
+    return sum(os.path.getsize(os.path.join(raiz, nome))
+               for raiz, _, nomes in os.walk(caminho_arquivo) for nome in nomes)
+
+
+def particoes_parquet(arquivo, particoes):
+    # Só particiona pelas colunas que existem no arquivo (titleType/startYear existem só em title.basics)
+    esquema_arquivo = esquema_arrow(arquivo)
+    colunas = [coluna for coluna in (particoes or []) if coluna in esquema_arquivo.names]
+    if not colunas:
+        return None
+    campos = []
+    for coluna in colunas:
+        tipo = esquema_arquivo.field(coluna).type
+        campos.append((coluna, tipo.value_type if pa.types.is_dictionary(tipo) else tipo))
+    return ds.partitioning(pa.schema(campos), flavor="hive")
+
+
+def escrever_tsv(blocos, caminho_destino):
+    linhas = 0
+    with open(caminho_destino, 'w', encoding='utf-8', newline='') as f:
+        for bloco in blocos:
+            bloco.to_csv(f, header=linhas == 0, **opcoes_escrita())
+            linhas += len(bloco)
+    return linhas
+
+
+def escrever_parquet(blocos, caminho_destino, particoes=None, chaves_inteiras=False,
+                     linhas_por_grupo=LINHAS_POR_GRUPO):
+    # Grava um diretório Parquet (zstd), opcionalmente particionado no formato hive (coluna=valor/).
+    # Sem mínimo de linhas por row group: o Arrow guardaria essas linhas em memória para cada partição aberta,
+    # então cada bloco lido vira os seus próprios row groups.
+    esquema_arquivo = esquema_arrow(caminho_destino, chaves_inteiras)
+    contador = {"linhas": 0}
+
+    def lotes():
+        for bloco in blocos:
+            contador["linhas"] += len(bloco)
+            yield from pa.Table.from_pandas(bloco, schema=esquema_arquivo, preserve_index=False).to_batches()
+
+    if os.path.exists(caminho_destino):
+        remover_tratado(caminho_destino)
+
+    ds.write_dataset(
+        lotes(),
+        caminho_destino,
+        schema=esquema_arquivo,
+        format="parquet",
+        partitioning=particoes_parquet(caminho_destino, particoes),
+        file_options=ds.ParquetFileFormat().make_write_options(compression=COMPRESSAO_PARQUET),
+        max_rows_per_group=linhas_por_grupo,
+        max_partitions=MAX_PARTICOES_PARQUET,
+        basename_template="parte-{i}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return contador["linhas"]
+
+
+def explodir_lista(df, ponte, chaves_inteiras=False):
+    # Uma linha por item da lista ("Action,Comedy" -> "Action", "Comedy"), sem laço em Python: split + explode
+    # e as chaves da linha de origem repetidas pelo índice. Com chaves_inteiras, `df` já tem as chaves codificadas.
+    _, chaves, coluna, item, _ = PONTES[ponte]
+    itens = df[coluna].dropna().str.split(SEPARADOR_LISTA, regex=True).explode()
+    itens = itens[itens.notna() & (itens != "")]
+
+    resultado = df.loc[itens.index, chaves].reset_index(drop=True)
+    resultado[item] = pd.Series(itens.to_numpy(), dtype=TEXTO)
+    if chaves_inteiras and item in PREFIXOS_CHAVES:
+        codificar_chaves(resultado, [item])
+    return resultado.astype(esquema(ponte, chaves_inteiras))
+
+
+class EscritorPonte:
+    # Grava uma ponte bloco a bloco, no mesmo formato do arquivo tratado de origem
+    def __init__(self, caminho_destino, formato=FORMATO_TSV, chaves_inteiras=False):
+        self.formato = formato
+        self.linhas = 0
+        if formato == FORMATO_PARQUET:
+            if os.path.exists(caminho_destino):
+                remover_tratado(caminho_destino)
+            os.makedirs(caminho_destino)
+            self.esquema = esquema_arrow(caminho_destino, chaves_inteiras)
+            self.arquivo = pq.ParquetWriter(os.path.join(caminho_destino, "parte-0.parquet"), self.esquema,
+                                            compression=COMPRESSAO_PARQUET)
+        else:
+            self.arquivo = open(caminho_destino, 'w', encoding='utf-8', newline='')
+
+    def escrever(self, bloco):
+        if self.formato == FORMATO_PARQUET:
+            self.arquivo.write_table(pa.Table.from_pandas(bloco, schema=self.esquema, preserve_index=False))
+        else:
+            bloco.to_csv(self.arquivo, header=self.arquivo.tell() == 0, **opcoes_escrita())
+        self.linhas += len(bloco)
+
+    def fechar(self):
+        self.arquivo.close()
+
+
+def com_pontes(blocos, caminho_destino, formato=FORMATO_TSV, chaves_inteiras=False):
+    # Repassa os blocos para o escritor do arquivo tratado e grava, na mesma passada, as pontes do arquivo
+    # ao lado dele (data/tratados/title_genre.tsv, ...)
+    diretorio = os.path.dirname(caminho_destino)
+    escritores = {ponte: EscritorPonte(caminho_tratado(diretorio, ponte, formato), formato, chaves_inteiras)
+                  for ponte in pontes(caminho_destino)}
+    try:
+        for bloco in blocos:
+            for ponte, escritor in escritores.items():
+                escritor.escrever(explodir_lista(bloco, ponte, chaves_inteiras))
+            yield bloco
+    finally:
+        for escritor in escritores.values():
+            escritor.fechar()
+
+
+class AgregadorParticipantes:
+    # Agregados por título calculados enquanto title.principals é lido, bloco a bloco, em arrays do NumPy:
+    # participantes distintos (o COUNT(DISTINCT nconst) de analitico_titulos), créditos e créditos de elenco.
+    # O arquivo vem ordenado por tconst: só o último título de cada bloco pode continuar no bloco seguinte,
+    # e fica pendente até lá. Se a ordem não se confirmar, o agregado é descartado (resultado() devolve None).
+    tabela = "agregado_participantes"
+    categorias_elenco = ["actor", "actress", "self"]
+
+    def __init__(self):
+        self.partes = []
+        self.pendente = None
+        self.chaves_texto = False
+        self.ordenado = True
+
+    def acompanhar(self, blocos):
+        for bloco in blocos:
+            self.adicionar(bloco)
+            yield bloco
+
+    def adicionar(self, bloco):
+        if not self.ordenado or bloco.empty:
+            return
+
+        # Chaves em texto ("tt0000001") ou já codificadas; nconst nulo vira -1 e não conta como participante
+        self.chaves_texto = not pd.api.types.is_integer_dtype(bloco["tconst"])
+        tconst, nconst = (
+            (bloco[coluna].str.slice(2) if self.chaves_texto else bloco[coluna])
+            .astype("Int64").to_numpy(dtype="int64", na_value=-1)
+            for coluna in ("tconst", "nconst")
+        )
+        elenco = bloco["category"].isin(self.categorias_elenco).to_numpy(dtype=bool)
+
+        if self.pendente is not None:
+            tconst, nconst, elenco = (np.concatenate(par) for par in zip(self.pendente, (tconst, nconst, elenco)))
+        if (np.diff(tconst) < 0).any():
+            self.ordenado, self.partes, self.pendente = False, [], None
+            return
+
+        corte = np.searchsorted(tconst, tconst[-1])
+        self.pendente = (tconst[corte:], nconst[corte:], elenco[corte:])
+        self.acumular(tconst[:corte], nconst[:corte], elenco[:corte])
+
+    def acumular(self, tconst, nconst, elenco):
+        if not len(tconst):
+            return
+        titulos, inicios, creditos = np.unique(tconst, return_index=True, return_counts=True)
+
+        # Pares (tconst, nconst) distintos em um único int64, contados por título
+        validos = nconst >= 0
+        pares = np.unique((tconst[validos] << 32) | nconst[validos])
+        participantes = np.bincount(np.searchsorted(titulos, pares >> 32), minlength=len(titulos))
+
+        self.partes.append((titulos, participantes, creditos, np.add.reduceat(elenco.astype("int64"), inicios)))
+
+    def resultado(self):
+        if not self.ordenado:
+            return None
+        if self.pendente is not None:
+            self.acumular(*self.pendente)
+            self.pendente = None
+
+        if self.partes:
+            titulos, participantes, creditos, elenco = (np.concatenate(coluna) for coluna in zip(*self.partes))
+        else:
+            titulos = participantes = creditos = elenco = np.array([], dtype="int64")
+
+        df = pd.DataFrame({
+            "tconst": titulos,
+            "qtParticipantes": participantes,
+            "qtCreditos": creditos,
+            "qtElenco": elenco,
+        }).astype(TIPO_CHAVE_INTEIRA)
+        if self.chaves_texto:
+            texto = PREFIXOS_CHAVES["tconst"] + df["tconst"].astype(str).str.zfill(DIGITOS_CHAVE)
+            df["tconst"] = texto.astype(TEXTO)
+        return df
+
+
+# Agregados calculados na leitura de cada arquivo
+AGREGADORES = {
+    "title.principals": AgregadorParticipantes,
+}
+
+
+def novo_agregador(arquivo):
+    classe = AGREGADORES.get(nome_base(arquivo))
+    return classe() if classe else None
+
+
+def escrever_tratado(blocos, caminho_destino, formato=FORMATO_TSV, particoes=None, chaves_inteiras=False,
+                     gerar_pontes=False):
+    if chaves_inteiras:
+        blocos = (codificar_chaves(bloco) for bloco in blocos)
+    if gerar_pontes:
+        blocos = com_pontes(blocos, caminho_destino, formato, chaves_inteiras)
+    if formato == FORMATO_PARQUET:
+        return escrever_parquet(blocos, caminho_destino, particoes, chaves_inteiras)
+    return escrever_tsv(blocos, caminho_destino)
+
+
+def tratar_arquivo(caminho_arquivo, caminho_destino, formato=FORMATO_TSV, particoes=None, motor=MOTOR_PANDAS,
+                   chaves_inteiras=False, gerar_pontes=False):
+    # Lê o .gz inteiro e salva o arquivo tratado (TSV sem compressão ou Parquet) em `caminho_destino`
+    blocos = [ler_arquivo(caminho_arquivo, motor)]
+    return escrever_tratado(blocos, caminho_destino, formato, particoes, chaves_inteiras, gerar_pontes)
+
+
+def tratar_arquivo_em_blocos(caminho_arquivo, caminho_destino, linhas_por_bloco=None, memoria_mb=None,
+                             formato=FORMATO_TSV, particoes=None, motor=MOTOR_PANDAS, chaves_inteiras=False,
+                             gerar_pontes=False):
+    # Mesmo resultado de tratar_arquivo, mas com memória limitada ao tamanho de um bloco.
+    # Os tipos vêm do esquema, então não mudam de um bloco para outro.
+    if linhas_por_bloco is None:
+        linhas_por_bloco = linhas_por_memoria(caminho_arquivo, memoria_mb) if memoria_mb else LINHAS_POR_BLOCO
+
+    blocos = ler_em_blocos(caminho_arquivo, linhas_por_bloco, motor)
+    return escrever_tratado(blocos, caminho_destino, formato, particoes, chaves_inteiras, gerar_pontes)
+
+
+def tratar(caminho_arquivo, caminho_destino, linhas_por_bloco=None, memoria_mb=None, formato=FORMATO_TSV,
+           particoes=None, motor=MOTOR_PANDAS, chaves_inteiras=False, gerar_pontes=False):
+    # Em blocos quando há limite de linhas ou de memória; senão lê o arquivo inteiro
+    if linhas_por_bloco or memoria_mb:
+        return tratar_arquivo_em_blocos(caminho_arquivo, caminho_destino, linhas_por_bloco, memoria_mb,
+                                        formato, particoes, motor, chaves_inteiras, gerar_pontes)
+    return tratar_arquivo(caminho_arquivo, caminho_destino, formato, particoes, motor, chaves_inteiras,
+                          gerar_pontes)
+
+
+class RegistrosLog(logging.Handler):
+    # Guarda as mensagens de log emitidas dentro de um processo filho para devolvê-las ao processo pai
+    def __init__(self):
+        super().__init__(level=logging.DEBUG)
+        self.registros = []
+
+    def emit(self, record):
+        self.registros.append((record.levelno, self.format(record)))
+
+
+@contextmanager
+def logs_do_processo():
+    # Coleta os logs emitidos dentro de um processo filho (lista de pares nível/mensagem) para o pai repetir.
+    # Os handlers herdados do pai são trocados pelo coletor, para que cada mensagem apareça só uma vez no log do pai
+    registros = RegistrosLog()
+    raiz = logging.getLogger()
+    handlers_originais = raiz.handlers[:]
+    raiz.handlers = [registros]
+    logging.captureWarnings(True)
+
+    try:
+        yield registros.registros
+    finally:
+        raiz.handlers = handlers_originais
+
+
+def tratar_em_processo(caminho_arquivo, caminho_destino, opcoes):
+    # Executado no processo filho: nunca levanta exceção, devolve o erro e os logs para o pai
+    linhas, erro = None, None
+
+    with logs_do_processo() as registros:
+        try:
+            inicio = time.monotonic()
+            linhas = tratar(caminho_arquivo, caminho_destino, **opcoes)
+            logging.info(f"Processo {os.getpid()}: {os.path.basename(caminho_arquivo)} tratado "
+                         f"({linhas} linhas em {time.monotonic() - inicio:.1f}s)")
+        except Exception:
+            erro = traceback.format_exc()
+
+    return linhas, erro, registros
+
+
+def tratar_arquivos(tarefas, processos=1, remover_origem=True, log=logging, **opcoes):
+    # Trata os arquivos `tarefas` (lista de pares origem/destino), em paralelo quando processos > 1.
+    # Os maiores arquivos são enviados primeiro, para que o fim da etapa fique perto do tempo do maior.
+    tarefas = sorted(tarefas, key=lambda tarefa: os.path.getsize(tarefa[0]), reverse=True)
+    resultados = {}
+    falhas = []
+
+    def concluir(caminho_arquivo, caminho_destino, linhas, erro):
+        arquivo = os.path.basename(caminho_arquivo)
+        if erro:
+            log.error(f"Falha ao tratar {arquivo}:\n{erro}")
+            falhas.append(arquivo)
+            return
+        log.info(f"Processamento concluído para {arquivo}. Arquivo processado salvo em {caminho_destino}")
+        resultados[caminho_arquivo] = linhas
+        if remover_origem:
+            # Remove o arquivo de origem após o processamento
+            os.remove(caminho_arquivo)
+
+    if processos <= 1:
+        for caminho_arquivo, caminho_destino in tarefas:
+            log.info(f"Lendo e processando o arquivo {os.path.basename(caminho_arquivo)}...")
+            linhas = tratar(caminho_arquivo, caminho_destino, **opcoes)
+            concluir(caminho_arquivo, caminho_destino, linhas, None)
+        return resultados
+
+    with ProcessPoolExecutor(max_workers=min(processos, len(tarefas) or 1)) as executor:
+        futuros = {}
+        for caminho_arquivo, caminho_destino in tarefas:
+            log.info(f"Lendo e processando o arquivo {os.path.basename(caminho_arquivo)}...")
+            futuro = executor.submit(tratar_em_processo, caminho_arquivo, caminho_destino, opcoes)
+            futuros[futuro] = (caminho_arquivo, caminho_destino)
+
+        for futuro in as_completed(futuros):
+            caminho_arquivo, caminho_destino = futuros[futuro]
+            try:
+                linhas, erro, registros = futuro.result()
+            except Exception:
+                # O processo filho morreu (ex.: OOM) antes de devolver o resultado
+                linhas, erro, registros = None, traceback.format_exc(), []
+
+            for nivel, mensagem in registros:
+                log.log(nivel, mensagem)
+            concluir(caminho_arquivo, caminho_destino, linhas, erro)
+
+    if falhas:
+        raise RuntimeError(f"Falha ao tratar os arquivos: {', '.join(falhas)}")
+    return resultados
+
+
+def ler_parquet(caminho_arquivo, colunas=None, filtros=None, linhas_por_bloco=LINHAS_POR_BLOCO):
+    # Lê um Parquet tratado em blocos, só com as `colunas` pedidas e só com os row groups/partições
+    # que podem atender aos `filtros` (mesmo formato do pandas.read_parquet, ex.: [("startYear", ">=", 2000)])
+    if colunas is None:
+        colunas = list(esquema(caminho_arquivo) or ds.dataset(caminho_arquivo, format="parquet").schema.names)
+    dataset = ds.dataset(caminho_arquivo, format="parquet",
+                         partitioning=ds.HivePartitioning.discover(infer_dictionary=False))
+    filtro = pq.filters_to_expression(filtros) if filtros else None
+
+    for lote in dataset.to_batches(columns=colunas, filter=filtro, batch_size=linhas_por_bloco):
+        yield lote.to_pandas(types_mapper=TIPOS_PANDAS.get)
@@ -0,0 +1,148 @@
+# Construção das tabelas analíticas fora do SQL: as tabelas base são lidas em blocos, as chaves viram
+# inteiros (tt0000001 -> 1) e os LEFT JOINs de SELECT_TITULOS e SELECT_PARTICIPANTES são feitos em arrays
+# do NumPy (merge ordenado com searchsorted), com a gravação em massa do imdb_carga.
+# Gera as mesmas linhas que o CREATE TABLE ... AS (tests/test_vetorizado.py); usado só quando o materializar
+# recebe motor="vetorizado". Não é mais rápido que o SQL (cerca de 6x mais lento no benchmark), o padrão é "sql".
+
+# IMPORTS
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from imdb_carga import gravar_blocos, tabela_existe
+from imdb_transformacao import LINHAS_POR_BLOCO, AgregadorParticipantes
+
+MOTOR_SQL = "sql"
+MOTOR_VETORIZADO = "vetorizado"
+
+# Colunas lidas de cada tabela base
+COLUNAS_BASICS = ["tconst", "titleType", "originalTitle", "startYear", "endYear", "genres"]
+COLUNAS_RATINGS = ["tconst", "averageRating", "numVotes"]
+COLUNAS_PRINCIPALS = ["nconst", "tconst", "ordering", "category"]
+
+
+def tipo_pandas(tipo_declarado):
+    # Afinidade do SQLite (INT -> inteiro, REAL/FLOA/DOUB -> real) em tipos anuláveis; texto fica como object
+    tipo_declarado = tipo_declarado.upper()
+    if "INT" in tipo_declarado:
+        return "Int64"
+    if any(tipo in tipo_declarado for tipo in ("REAL", "FLOA", "DOUB")):
+        return "Float64"
+    return "object"
+
+
+def ler_blocos(conexao, tabela, colunas, linhas_por_bloco=LINHAS_POR_BLOCO):
+    # Blocos da tabela com os tipos declarados das colunas, e não os inferidos de cada bloco: um bloco só com
+    # NULL em endYear continua inteiro. Uma tabela vazia gera um bloco vazio.
+    tipos = {coluna: tipo_pandas(tipo) for _, coluna, tipo, *_ in conexao.execute(f'PRAGMA table_info("{tabela}")')}
+    tipos = {coluna: tipos[coluna] for coluna in colunas}
+    lista_colunas = ", ".join(f'"{coluna}"' for coluna in colunas)
+    for bloco in pd.read_sql(f'SELECT {lista_colunas} FROM "{tabela}"', conexao, chunksize=linhas_por_bloco):
+        yield bloco.astype(tipos)
+
+
+def ler_tabela(conexao, tabela, colunas):
+    return pd.concat(ler_blocos(conexao, tabela, colunas), ignore_index=True)
+
+
+def codificar(coluna):
+    # Chave do IMDb como int64 ("tt0000001" -> 1, ou a chave já inteira), -1 para NULL (não casa com nada).
+    # O prefixo é cortado pelo pyarrow.compute, sem passar cada texto pelo Python
+    if pd.api.types.is_integer_dtype(coluna):
+        return coluna.to_numpy(dtype="int64", na_value=-1)
+    numeros = pc.cast(pc.utf8_slice_codeunits(pa.array(coluna, type=pa.string(), from_pandas=True), 2), pa.int64())
+    return pc.fill_null(numeros, -1).to_numpy()
+
+
+def juntar(esquerda, direita):
+    # LEFT JOIN das chaves `esquerda` com as chaves `direita` por merge ordenado: a direita é ordenada uma vez
+    # e cada chave da esquerda acha o seu intervalo com searchsorted. Retorna, por linha do resultado, a posição
+    # na esquerda e a posição na direita (-1 sem correspondência); chaves repetidas na direita repetem a linha.
+    if not len(direita):
+        return np.arange(len(esquerda)), np.full(len(esquerda), -1)
+
+    ordem = np.argsort(direita, kind="stable")
+    ordenadas = direita[ordem]
+    inicios = np.searchsorted(ordenadas, esquerda, side="left")
+    quantidades = np.where(esquerda >= 0, np.searchsorted(ordenadas, esquerda, side="right") - inicios, 0)
+
+    repeticoes = np.maximum(quantidades, 1)
+    linhas = np.repeat(np.arange(len(esquerda)), repeticoes)
+    if len(linhas) == len(esquerda):
+        return linhas, np.where(quantidades > 0, ordem[np.minimum(inicios, len(ordem) - 1)], -1)
+
+    deslocamentos = np.arange(len(linhas)) - np.repeat(np.cumsum(repeticoes) - repeticoes, repeticoes)
+    posicoes = np.repeat(inicios, repeticoes) + deslocamentos
+    casadas = np.repeat(quantidades > 0, repeticoes)
+    return linhas, np.where(casadas, ordem[np.where(casadas, posicoes, 0)], -1)
+
+
+def tomar(df, posicoes):
+    # Linhas do df nas posições (-1 vira NULL em todas as colunas)
+    return pd.DataFrame({coluna: df[coluna].array.take(posicoes, allow_fill=True) for coluna in df.columns})
+
+
+def contar_participantes(conexao):
+    # (tconsts, qtParticipantes) do CTE participantes de SELECT_TITULOS: o agregado da carga, se existir, ou
+    # COUNT(DISTINCT nconst) por tconst, com os pares (tconst, nconst) distintos em um único int64 por bloco
+    if tabela_existe(conexao, AgregadorParticipantes.tabela):
+        agregado = ler_tabela(conexao, AgregadorParticipantes.tabela, ["tconst", "qtParticipantes"])
+        return codificar(agregado["tconst"]), agregado["qtParticipantes"]
+
+    titulos, pares = [], []
+    for bloco in ler_blocos(conexao, "title_principals", ["tconst", "nconst"]):
+        tconst, nconst = codificar(bloco["tconst"]), codificar(bloco["nconst"])
+        titulos.append(np.unique(tconst))
+        pares.append(np.unique((tconst[nconst >= 0] << 32) | nconst[nconst >= 0]))
+
+    titulos = np.unique(np.concatenate(titulos)) if titulos else np.array([], dtype="int64")
+    pares = np.unique(np.concatenate(pares)) if pares else np.array([], dtype="int64")
+    # Um título só com nconst nulo tem 0 participantes (o GROUP BY ainda gera a linha)
+    participantes = np.bincount(np.searchsorted(titulos, pares >> 32), minlength=len(titulos))
+    return titulos, pd.array(participantes, dtype="Int64")
+
+
+def blocos_titulos(conexao):
+    # analitico_titulos: title_basics LEFT JOIN title_ratings LEFT JOIN participantes, bloco a bloco de
+    # title_basics, com as tabelas da direita inteiras em memória (só chaves e colunas usadas)
+    ratings = ler_tabela(conexao, "title_ratings", COLUNAS_RATINGS)
+    chaves_ratings = codificar(ratings["tconst"])
+    ratings = ratings.drop(columns="tconst")
+
+    chaves_participantes, participantes = contar_participantes(conexao)
+    participantes = pd.DataFrame({"qtParticipantes": participantes})
+
+    for bloco in ler_blocos(conexao, "title_basics", COLUNAS_BASICS):
+        chaves = codificar(bloco["tconst"])
+        linhas, posicoes_ratings = juntar(chaves, chaves_ratings)
+        linhas_participantes, posicoes_participantes = juntar(chaves[linhas], chaves_participantes)
+
+        linhas = linhas[linhas_participantes]
+        yield pd.concat([
+            bloco.take(linhas).reset_index(drop=True),
+            tomar(ratings, posicoes_ratings[linhas_participantes]),
+            tomar(participantes, posicoes_participantes),
+        ], axis=1)
+
+
+def blocos_participantes(conexao):
+    # analitico_participantes: title_principals LEFT JOIN title_basics (só genres), bloco a bloco de
+    # title_principals; genres fica como category, um código por combinação de gêneros
+    generos = ler_tabela(conexao, "title_basics", ["tconst", "genres"])
+    chaves_generos = codificar(generos["tconst"])
+    generos = generos.drop(columns="tconst").astype({"genres": "category"})
+
+    for bloco in ler_blocos(conexao, "title_principals", COLUNAS_PRINCIPALS):
+        linhas, posicoes = juntar(codificar(bloco["tconst"]), chaves_generos)
+        yield pd.concat([bloco.take(linhas).reset_index(drop=True), tomar(generos, posicoes)], axis=1)
+
+
+CONSTRUCOES = {
+    "analitico_titulos": blocos_titulos,
+    "analitico_participantes": blocos_participantes,
+}
+
+
+def construir_vetorizado(conexao, tabela):
+    # Substitui a tabela analítica pela versão calculada em NumPy (SQLite). Retorna as linhas gravadas.
+    return gravar_blocos(CONSTRUCOES[tabela](conexao), conexao, tabela, em_massa=True)
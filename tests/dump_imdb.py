@@ -0,0 +1,109 @@
+# Dumps pequenos do IMDb gerados para os testes, no mesmo formato dos .gz originais (tabulação, "\N" como nulo
+# e linhas na ordem da chave). Um dump é {arquivo: {tconst: [linhas]}}, para alterar títulos inteiros.
+
+# IMPORTS
+import os
+import gzip
+import random
+
+NULO = "\\N"
+
+CABECALHOS = {
+    "title.basics.tsv.gz": ["tconst", "titleType", "primaryTitle", "originalTitle", "isAdult", "startYear",
+                            "endYear", "runtimeMinutes", "genres"],
+    "title.ratings.tsv.gz": ["tconst", "averageRating", "numVotes"],
+    "title.principals.tsv.gz": ["tconst", "ordering", "nconst", "category", "job", "characters"],
+    "title.akas.tsv.gz": ["titleId", "ordering", "title", "region", "language", "types", "attributes",
+                          "isOriginalTitle"],
+    "title.crew.tsv.gz": ["tconst", "directors", "writers"],
+}
+
+TIPOS = ["movie", "short", "tvSeries", "tvEpisode"]
+GENEROS = ["Action", "Comedy", "Documentary", "Drama", "Romance"]
+CATEGORIAS = ["actor", "actress", "director", "writer"]
+PALAVRAS = ["Amor", "Ação", "Noite", "Cidade", "Mar", "Estrela", "Coração", "Sombra"]
+PESSOAS = 60
+
+
+def pessoa(aleatorio):
+    return f"nm{aleatorio.randrange(1, PESSOAS):07d}"
+
+
+def nulo_ou(aleatorio, chance, valor):
+    return NULO if aleatorio.random() < chance else valor
+
+
+def titulo(numero, aleatorio):
+    # Linhas de um título em cada arquivo; alguns títulos ficam sem nota, sem participantes ou sem akas
+    tconst = f"tt{numero:07d}"
+    nome = " ".join(aleatorio.sample(PALAVRAS, aleatorio.randint(1, 3)))
+    inicio = aleatorio.randint(1900, 2020)
+    generos = ",".join(sorted(aleatorio.sample(GENEROS, aleatorio.randint(1, 3))))
+    linhas = {
+        "title.basics.tsv.gz": [[tconst, aleatorio.choice(TIPOS), nome, nulo_ou(aleatorio, 0.3, nome.upper()),
+                                 str(aleatorio.randint(0, 1)), nulo_ou(aleatorio, 0.1, str(inicio)),
+                                 nulo_ou(aleatorio, 0.8, str(inicio + 5)), nulo_ou(aleatorio, 0.2, "90"),
+                                 nulo_ou(aleatorio, 0.1, generos)]],
+        "title.ratings.tsv.gz": [],
+        "title.principals.tsv.gz": [[tconst, str(ordem), pessoa(aleatorio), aleatorio.choice(CATEGORIAS),
+                                     NULO, NULO] for ordem in range(1, aleatorio.randint(0, 4) + 1)],
+        "title.akas.tsv.gz": [[tconst, str(ordem), f"{nome} {ordem}", aleatorio.choice(["BR", "US", NULO]),
+                               NULO, nulo_ou(aleatorio, 0.5, "alternative"), NULO, "0"]
+                              for ordem in range(1, aleatorio.randint(0, 2) + 1)],
+        "title.crew.tsv.gz": [[tconst, nulo_ou(aleatorio, 0.3, ",".join(sorted({pessoa(aleatorio),
+                                                                               pessoa(aleatorio)}))),
+                               nulo_ou(aleatorio, 0.5, pessoa(aleatorio))]],
+    }
+    if aleatorio.random() < 0.8:
+        linhas["title.ratings.tsv.gz"].append([tconst, f"{aleatorio.randint(10, 100) / 10:.1f}",
+                                               str(aleatorio.randint(5, 5000))])
+    return linhas
+
+
+def gerar_dump(titulos=300, semente=0):
+    aleatorio = random.Random(semente)
+    dump = {arquivo: {} for arquivo in CABECALHOS}
+    for numero in range(1, titulos + 1):
+        for arquivo, linhas in titulo(numero, aleatorio).items():
+            dump[arquivo][f"tt{numero:07d}"] = linhas
+    return dump
+
+
+def alterar_dump(dump, semente=1, removidos=10, alterados=10, novos=10):
+    # Nova versão do dump: títulos removidos de todos os arquivos, títulos com nota e nome alterados e
+    # títulos novos depois do último
+    aleatorio = random.Random(semente)
+    novo = {arquivo: dict(titulos) for arquivo, titulos in dump.items()}
+    tconsts = sorted(novo["title.basics.tsv.gz"])
+    escolhidos = aleatorio.sample(tconsts, removidos + alterados)
+
+    for tconst in escolhidos[:removidos]:
+        for titulos in novo.values():
+            titulos.pop(tconst, None)
+
+    for tconst in escolhidos[removidos:]:
+        basics = [list(linha) for linha in novo["title.basics.tsv.gz"][tconst]]
+        basics[0][2] = basics[0][2] + " " + aleatorio.choice(PALAVRAS)
+        novo["title.basics.tsv.gz"][tconst] = basics
+        novo["title.ratings.tsv.gz"][tconst] = [[tconst, f"{aleatorio.randint(10, 100) / 10:.1f}",
+                                                 str(aleatorio.randint(5, 5000))]]
+
+    ultimo = int(tconsts[-1][2:])
+    for numero in range(ultimo + 1, ultimo + novos + 1):
+        for arquivo, linhas in titulo(numero, aleatorio).items():
+            novo[arquivo][f"tt{numero:07d}"] = linhas
+    return novo
+
+
+def escrever_dump(dump, diretorio):
+    # Grava cada arquivo como .gz no diretório e retorna os caminhos
+    os.makedirs(diretorio, exist_ok=True)
+    caminhos = {}
+    for arquivo, titulos in dump.items():
+        caminhos[arquivo] = os.path.join(diretorio, arquivo)
+        with gzip.open(caminhos[arquivo], "wt", encoding="utf-8", newline="") as f:
+            f.write("\t".join(CABECALHOS[arquivo]) + "\n")
+            for tconst in sorted(titulos):
+                for linha in titulos[tconst]:
+                    f.write("\t".join(linha) + "\n")
+    return caminhos
@@ -0,0 +1,71 @@
+# Índice FTS5 de títulos (imdb_busca) e sua atualização incremental (imdb_analitico.materializar)
+
+# IMPORTS
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from imdb_busca import TABELA_BUSCA, buscar_titulos
+from imdb_carga import carregar_arquivo, carregar_delta, nome_tabela
+from imdb_analitico import INCREMENTAL, materializar
+from dump_imdb import alterar_dump, escrever_dump, gerar_dump
+
+ARQUIVOS_BUSCA = ["title.basics.tsv.gz", "title.akas.tsv.gz"]
+
+
+def documentos(conexao):
+    return sorted(conexao.execute(f"SELECT titulo, tconst, origem FROM {TABELA_BUSCA}").fetchall())
+
+
+def test_busca_sem_acentos_por_prefixo_e_nos_akas(tmp_path):
+    caminhos = escrever_dump(gerar_dump(), str(tmp_path / "dados"))
+    conexao = sqlite3.connect(":memory:")
+    for arquivo in ARQUIVOS_BUSCA:
+        carregar_arquivo(caminhos[arquivo], conexao, nome_tabela(arquivo))
+    conexao.execute("INSERT INTO title_akas (titleId, ordering, title) "
+                    "VALUES ('tt0000001', 9, 'Le Fabuleux Destin')")
+    materializar(conexao, TABELA_BUSCA, completa=True)
+
+    titulos = dict(conexao.execute("SELECT tconst, primaryTitle FROM title_basics"))
+    com_acao = {tconst for tconst, nome in titulos.items() if "Ação" in nome.split()}
+
+    # "acao" encontra "Ação" e "AÇÃO"; cada título aparece uma vez, mesmo com vários nomes que casam
+    encontrados = [linha[0] for linha in buscar_titulos(conexao, "acao", limite=1000)]
+    assert len(encontrados) == len(set(encontrados))
+    assert com_acao <= set(encontrados)
+
+    # A última palavra é prefixo: "cora" encontra "Coração"
+    assert all("Coração" in titulos[linha[0]] or "Coração" in linha[1]
+               for linha in buscar_titulos(conexao, "cora", limite=1000))
+    assert buscar_titulos(conexao, "cora") and not buscar_titulos(conexao, "cora", prefixo=False)
+
+    # Um título só dos akas encontra o título, com o primaryTitle de title_basics
+    tconst, titulo, primario, *_ = buscar_titulos(conexao, "fabuleux destin")[0]
+    assert (tconst, titulo, primario) == ("tt0000001", "Le Fabuleux Destin", titulos["tt0000001"])
+
+    # Operadores do FTS5 no texto do usuário são tratados como palavras, não como sintaxe
+    assert buscar_titulos(conexao, 'acao"* (', limite=1000) == buscar_titulos(conexao, "acao", limite=1000)
+    assert buscar_titulos(conexao, "  ") == []
+
+
+def test_busca_incremental_igual_a_reconstrucao(tmp_path):
+    anterior = gerar_dump()
+    caminhos_anterior = escrever_dump(anterior, str(tmp_path / "anterior"))
+    caminhos_atual = escrever_dump(alterar_dump(anterior), str(tmp_path / "atual"))
+
+    conexao = sqlite3.connect(":memory:")
+    for carga, caminhos in (("c1", caminhos_anterior), ("c2", caminhos_atual)):
+        for arquivo in ARQUIVOS_BUSCA:
+            carregar_delta(caminhos[arquivo], conexao, nome_tabela(arquivo), carga=carga)
+        resultado = materializar(conexao, TABELA_BUSCA, fracao=1.0)
+    assert resultado["modo"] == INCREMENTAL
+
+    recarga = sqlite3.connect(":memory:")
+    for arquivo in ARQUIVOS_BUSCA:
+        carregar_arquivo(caminhos_atual[arquivo], recarga, nome_tabela(arquivo))
+    materializar(recarga, TABELA_BUSCA, completa=True)
+
+    assert documentos(conexao) == documentos(recarga)
+    for texto in ("amor", "noite cid", "sombra mar"):
+        assert buscar_titulos(conexao, texto, limite=1000) == buscar_titulos(recarga, texto, limite=1000)
@@ -0,0 +1,28 @@
+# Carga no SQLite do imdb_carga
+
+# IMPORTS
+import os
+import sys
+import sqlite3
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from imdb_esquema import esquema
+from imdb_carga import gravar_blocos
+
+
+def ratings(linhas):
+    return pd.DataFrame(linhas, columns=["tconst", "averageRating", "numVotes"]).astype(esquema("title.ratings"))
+
+
+def test_carga_em_massa_com_chave_repetida():
+    # Uma chave repetida no arquivo não derruba a carga: fica a última linha da chave
+    conexao = sqlite3.connect(":memory:")
+    blocos = [ratings([("tt0000002", 5.0, 10), ("tt0000001", 6.0, 20)]),
+              ratings([("tt0000002", 7.5, 30), ("tt10000000", 8.0, 40)])]
+
+    linhas = gravar_blocos(iter(blocos), conexao, "title_ratings", em_massa=True)
+
+    assert linhas == 3
+    assert conexao.execute("SELECT * FROM title_ratings ORDER BY tconst").fetchall() == [
+        ("tt0000001", 6.0, 20), ("tt0000002", 7.5, 30), ("tt10000000", 8.0, 40)]
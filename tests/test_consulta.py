@@ -0,0 +1,72 @@
+# Camada de leitura (imdb_consulta.ServicoConsultas): cache de resultados por geração do banco
+
+# IMPORTS
+import os
+import sys
+import sqlite3
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from imdb_carga import preparar_sombra, publicar_sombra, restaurar_geracao
+from imdb_consulta import ServicoConsultas
+
+NOTA = "SELECT averageRating FROM title_ratings WHERE tconst = ?"
+
+
+def gravar_nota(banco, nota, tconst="tt0000001"):
+    conexao = sqlite3.connect(banco)
+    conexao.execute("CREATE TABLE IF NOT EXISTS title_ratings (tconst TEXT PRIMARY KEY, averageRating REAL)")
+    conexao.execute("INSERT OR REPLACE INTO title_ratings VALUES (?, ?)", (tconst, nota))
+    conexao.commit()
+    conexao.close()
+
+
+def test_cache_ate_a_proxima_geracao(tmp_path):
+    banco = str(tmp_path / "imdb_data.db")
+    gravar_nota(banco, 5.0)
+    servico = ServicoConsultas(banco)
+
+    # A mesma consulta com os mesmos parâmetros vem do cache
+    assert servico.consultar(NOTA, ("tt0000001",)) == ((5.0,),)
+    assert servico.consultar(NOTA, ("tt0000001",)) == ((5.0,),)
+    assert servico.estatisticas() == {"acertos": 1, "falhas": 1, "itens": 1}
+
+    # Uma carga direto no banco publicado muda o arquivo: o cache é descartado
+    gravar_nota(banco, 6.0, "tt0000002")
+    gravar_nota(banco, 6.5)
+    assert servico.consultar(NOTA, ("tt0000001",)) == ((6.5,),)
+    assert servico.estatisticas()["itens"] == 1
+
+    # Nova geração publicada a partir da sombra (rename por cima do banco)
+    sombra = preparar_sombra(banco)
+    gravar_nota(sombra, 7.0)
+    publicar_sombra(banco, sombra, tabelas=["title_ratings"])
+    assert servico.consultar(NOTA, ("tt0000001",)) == ((7.0,),)
+    assert servico.consultar(NOTA, ("tt0000002",)) == ((6.0,),)
+
+    # Rollback para a geração anterior também invalida o cache
+    restaurar_geracao(banco)
+    assert servico.consultar(NOTA, ("tt0000001",)) == ((6.5,),)
+    assert servico.estatisticas() == {"acertos": 1, "falhas": 5, "itens": 1}
+    servico.fechar()
+
+
+def test_cache_lru_e_conexoes_somente_leitura(tmp_path):
+    banco = str(tmp_path / "imdb_data.db")
+    for numero in range(1, 4):
+        gravar_nota(banco, float(numero), f"tt000000{numero}")
+    servico = ServicoConsultas(banco, conexoes=2, itens_cache=2)
+
+    for tconst in ("tt0000001", "tt0000002", "tt0000001", "tt0000003"):
+        servico.consultar(NOTA, (tconst,))
+    # tt0000002 foi o menos usado recentemente e saiu do cache; tt0000001 continua
+    assert servico.estatisticas() == {"acertos": 1, "falhas": 3, "itens": 2}
+    servico.consultar(NOTA, ("tt0000001",))
+    servico.consultar(NOTA, ("tt0000002",))
+    assert servico.estatisticas() == {"acertos": 2, "falhas": 4, "itens": 2}
+
+    # Sem cache a consulta sempre vai ao banco, e nenhuma conexão do serviço escreve
+    assert servico.consultar_df(NOTA, ("tt0000003",), usar_cache=False)["averageRating"].tolist() == [3.0]
+    with pytest.raises(sqlite3.OperationalError):
+        servico.consultar("DELETE FROM title_ratings", usar_cache=False)
+    servico.fechar()
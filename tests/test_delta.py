@@ -0,0 +1,68 @@
+# Carga delta (imdb_carga.carregar_delta) e atualização incremental das tabelas analíticas (imdb_analitico)
+
+# IMPORTS
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from imdb_carga import TABELA_ALTERACOES, carregar_arquivo, carregar_delta, nome_tabela
+from imdb_analitico import INCREMENTAL, TABELAS_ANALITICAS, materializar, materializar_analiticas
+from dump_imdb import alterar_dump, escrever_dump, gerar_dump
+
+
+def linhas(conexao, tabela):
+    return sorted(conexao.execute(f'SELECT * FROM "{tabela}"').fetchall(),
+                  key=lambda linha: [(valor is None, str(valor)) for valor in linha])
+
+
+def carregar_completo(caminhos, banco):
+    conexao = sqlite3.connect(banco)
+    for arquivo, caminho_arquivo in caminhos.items():
+        carregar_arquivo(caminho_arquivo, conexao, nome_tabela(arquivo))
+    materializar_analiticas(conexao, completa=True)
+    return conexao
+
+
+def test_delta_e_incremental_iguais_a_recarga(tmp_path):
+    anterior = gerar_dump()
+    atual = alterar_dump(anterior)
+    caminhos_anterior = escrever_dump(anterior, str(tmp_path / "anterior"))
+    caminhos_atual = escrever_dump(atual, str(tmp_path / "atual"))
+
+    conexao = sqlite3.connect(str(tmp_path / "delta.db"))
+    for arquivo, caminho_arquivo in caminhos_anterior.items():
+        carregar_delta(caminho_arquivo, conexao, nome_tabela(arquivo), carga="c1")
+    materializar_analiticas(conexao)
+
+    alteracoes = {arquivo: carregar_delta(caminho_arquivo, conexao, nome_tabela(arquivo), carga="c2")
+                  for arquivo, caminho_arquivo in caminhos_atual.items()}
+    resultados = {tabela: materializar(conexao, tabela, fracao=1.0) for tabela in TABELAS_ANALITICAS}
+
+    # Só as notas dos títulos em comum que mudaram contam como atualização
+    notas_anteriores, notas_atuais = anterior["title.ratings.tsv.gz"], atual["title.ratings.tsv.gz"]
+    esperado = {
+        "insercao": {tconst for tconst, linhas_nota in notas_atuais.items()
+                     if linhas_nota and not notas_anteriores.get(tconst)},
+        "atualizacao": {tconst for tconst, linhas_nota in notas_atuais.items()
+                        if linhas_nota and notas_anteriores.get(tconst)
+                        and linhas_nota != notas_anteriores[tconst]},
+        "remocao": {tconst for tconst, linhas_nota in notas_anteriores.items()
+                    if linhas_nota and not notas_atuais.get(tconst)},
+    }
+    for operacao, tconsts in esperado.items():
+        assert tconsts
+        assert alteracoes["title.ratings.tsv.gz"][operacao] == len(tconsts)
+        registradas = conexao.execute(f'SELECT chave FROM "{TABELA_ALTERACOES}" '
+                                      f"WHERE carga = 'c2' AND tabela = 'title_ratings' AND operacao = ?",
+                                      (operacao,)).fetchall()
+        assert {chave for chave, in registradas} == tconsts
+    assert conexao.execute(f'SELECT COUNT(*) FROM "{TABELA_ALTERACOES}" WHERE carga = \'c1\'').fetchone() == (0,)
+
+    # O resultado da carga delta + atualização incremental é o mesmo de uma carga completa do dump atual
+    recarga = carregar_completo(caminhos_atual, str(tmp_path / "completo.db"))
+    for arquivo in caminhos_atual:
+        assert linhas(conexao, nome_tabela(arquivo)) == linhas(recarga, nome_tabela(arquivo)), arquivo
+    for tabela, resultado in resultados.items():
+        assert resultado["modo"] == INCREMENTAL
+        assert linhas(conexao, tabela) == linhas(recarga, tabela), tabela
@@ -0,0 +1,211 @@
+# Downloads do imdb_extracao contra um servidor HTTP local que serve .gz de teste, com ETag, 304 e Range
+
+# IMPORTS
+import os
+import sys
+import gzip
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import imdb_extracao
+from imdb_extracao import (ARQUIVO_METADADOS, SUFIXO_PARCIAL, MetadadosDownload, baixar_arquivo, baixar_arquivos,
+                           criar_sessao)
+
+LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+def conteudo_gz(arquivo, linhas=20_000):
+    corpo = "".join(f"tt{i:07d}\t{arquivo}\t{hashlib.md5(str(i).encode()).hexdigest()}\n" for i in range(linhas))
+    return gzip.compress(corpo.encode())
+
+
+class ServidorArquivos(BaseHTTPRequestHandler):
+    # Serve `arquivos` (nome -> bytes) com ETag forte, If-None-Match -> 304 e Range/If-Range -> 206.
+    # Cada requisição fica em `requisicoes`; `truncar` corta a próxima resposta de um arquivo pela metade,
+    # `atraso_faixa` segura o corpo de uma resposta 206 por alguns segundos e `content_length`, se definido,
+    # substitui o Content-Length das respostas.
+    arquivos = {}
+    requisicoes = []
+    truncar = set()
+    atraso_faixa = 0
+    content_length = None
+    ativas = 0
+    max_ativas = 0
+    trava = threading.Lock()
+
+    def do_GET(self):
+        arquivo = self.path.lstrip("/")
+        cls = type(self)
+        with cls.trava:
+            cls.requisicoes.append((arquivo, dict(self.headers)))
+            cls.ativas += 1
+            cls.max_ativas = max(cls.max_ativas, cls.ativas)
+        try:
+            time.sleep(0.1)
+            self.responder(arquivo)
+        finally:
+            with cls.trava:
+                cls.ativas -= 1
+
+    def responder(self, arquivo):
+        if arquivo not in self.arquivos:
+            self.send_error(404)
+            return
+        dados = self.arquivos[arquivo]
+        etag = f'"{hashlib.sha256(dados).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        inicio = 0
+        faixa = self.headers.get("Range")
+        if faixa and self.headers.get("If-Range", etag) in (etag, LAST_MODIFIED):
+            inicio = int(faixa.removeprefix("bytes=").rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {inicio}-{len(dados) - 1}/{len(dados)}")
+        else:
+            self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        if self.content_length is None:
+            self.send_header("Content-Length", str(len(dados) - inicio))
+        else:
+            self.send_header("Content-Length", self.content_length)
+            self.close_connection = True
+        self.end_headers()
+
+        corpo = dados[inicio:]
+        if inicio:
+            time.sleep(self.atraso_faixa)
+        if arquivo in self.truncar:
+            self.truncar.discard(arquivo)
+            corpo = corpo[:len(corpo) // 2]
+            self.close_connection = True
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor(monkeypatch):
+    monkeypatch.setattr(imdb_extracao, "ESPERA_INICIAL", 0)
+    handler = type("Servidor", (ServidorArquivos,), {
+        "arquivos": {arquivo: conteudo_gz(arquivo) for arquivo in ("a.tsv.gz", "b.tsv.gz", "c.tsv.gz")},
+        "requisicoes": [],
+        "truncar": set(),
+    })
+    http = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    yield handler, f"http://127.0.0.1:{http.server_address[1]}/"
+    http.shutdown()
+    http.server_close()
+
+
+def ler(caminho):
+    with open(caminho, "rb") as f:
+        return f.read()
+
+
+def baixar_um(base_url, arquivo, destino):
+    metadados = MetadadosDownload(os.path.join(destino, ARQUIVO_METADADOS))
+    with criar_sessao(1) as sessao:
+        return baixar_arquivo(sessao, base_url, arquivo, destino, metadados)
+
+
+def test_download_paralelo_e_304_na_segunda_execucao(servidor, tmp_path):
+    handler, base_url = servidor
+    arquivos = sorted(handler.arquivos)
+
+    resultados = baixar_arquivos(base_url, arquivos, str(tmp_path), max_downloads=3)
+    assert [resultados[arquivo].status for arquivo in arquivos] == ["baixado"] * 3
+    assert handler.max_ativas > 1
+    for arquivo in arquivos:
+        assert ler(tmp_path / arquivo) == handler.arquivos[arquivo]
+
+    # Os .gz já foram tratados (removidos): o servidor responde 304 e nada é baixado de novo
+    for arquivo in arquivos:
+        os.remove(tmp_path / arquivo)
+    handler.requisicoes.clear()
+    resultados = baixar_arquivos(base_url, arquivos, str(tmp_path), max_downloads=3)
+    assert [resultados[arquivo].status for arquivo in arquivos] == ["inalterado"] * 3
+    assert all("If-None-Match" in cabecalhos for _, cabecalhos in handler.requisicoes)
+    assert not any((tmp_path / arquivo).exists() for arquivo in arquivos)
+
+
+def test_retoma_com_range_depois_de_truncado(servidor, tmp_path):
+    handler, base_url = servidor
+    handler.truncar.add("a.tsv.gz")
+
+    progresso = baixar_um(base_url, "a.tsv.gz", str(tmp_path))
+
+    assert progresso.status == "baixado"
+    assert ler(tmp_path / "a.tsv.gz") == handler.arquivos["a.tsv.gz"]
+    assert not (tmp_path / ("a.tsv.gz" + SUFIXO_PARCIAL)).exists()
+    primeira, segunda = handler.requisicoes
+    assert "Range" not in primeira[1]
+    assert segunda[1]["Range"] == f"bytes={len(handler.arquivos['a.tsv.gz']) // 2}-"
+    assert segunda[1]["If-Range"].startswith('"')
+
+
+def test_part_corrompido_recomeca_do_zero(servidor, tmp_path):
+    handler, base_url = servidor
+    metadados = MetadadosDownload(os.path.join(tmp_path, ARQUIVO_METADADOS))
+    metadados.registrar_parcial("b.tsv.gz", None, LAST_MODIFIED)
+    (tmp_path / ("b.tsv.gz" + SUFIXO_PARCIAL)).write_bytes(b"lixo" * 1000)
+
+    handler.atraso_faixa = 3
+
+    # O .part é descartado assim que chega a resposta 206, sem esperar o resto do arquivo
+    inicio = time.monotonic()
+    progresso = baixar_um(base_url, "b.tsv.gz", str(tmp_path))
+    assert time.monotonic() - inicio < handler.atraso_faixa
+
+    assert progresso.status == "baixado"
+    assert ler(tmp_path / "b.tsv.gz") == handler.arquivos["b.tsv.gz"]
+    (_, retomada), (_, do_zero) = handler.requisicoes
+    assert retomada["Range"] == "bytes=4000-"
+    assert "Range" not in do_zero
+
+
+def test_404_e_falha(servidor, tmp_path):
+    handler, base_url = servidor
+
+    with pytest.raises(RuntimeError, match="inexistente.tsv.gz"):
+        baixar_arquivos(base_url, ["a.tsv.gz", "inexistente.tsv.gz"], str(tmp_path))
+
+    assert ler(tmp_path / "a.tsv.gz") == handler.arquivos["a.tsv.gz"]
+    assert not (tmp_path / "inexistente.tsv.gz").exists()
+
+
+def test_erro_inesperado_nao_interrompe_os_outros_downloads(servidor, tmp_path, monkeypatch):
+    handler, base_url = servidor
+    original = imdb_extracao.baixar_arquivo
+
+    def baixar_arquivo(sessao, base_url, arquivo, *args):
+        if arquivo == "b.tsv.gz":
+            raise ValueError("erro inesperado")
+        return original(sessao, base_url, arquivo, *args)
+
+    monkeypatch.setattr(imdb_extracao, "baixar_arquivo", baixar_arquivo)
+    with pytest.raises(RuntimeError, match="b.tsv.gz"):
+        baixar_arquivos(base_url, sorted(handler.arquivos), str(tmp_path), max_downloads=3)
+
+    for arquivo in ("a.tsv.gz", "c.tsv.gz"):
+        assert ler(tmp_path / arquivo) == handler.arquivos[arquivo]
+
+
+def test_content_length_invalido(servidor, tmp_path):
+    handler, base_url = servidor
+    handler.content_length = "desconhecido"
+
+    progresso = baixar_um(base_url, "a.tsv.gz", str(tmp_path))
+
+    assert progresso.status == "baixado"
+    assert progresso.bytes_totais is None
+    assert ler(tmp_path / "a.tsv.gz") == handler.arquivos["a.tsv.gz"]
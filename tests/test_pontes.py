@@ -0,0 +1,65 @@
+# Tabelas-ponte geradas no tratamento (imdb_transformacao.com_pontes) e carregadas no SQLite
+
+# IMPORTS
+import os
+import sys
+import sqlite3
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from imdb_esquema import pontes
+from imdb_carga import carregar_arquivo, criar_indices, nome_tabela
+from imdb_transformacao import FORMATO_PARQUET, FORMATO_TSV, caminho_tratado, tratar
+from dump_imdb import CABECALHOS, NULO, escrever_dump, gerar_dump
+
+
+def chave(valor, chaves_inteiras):
+    return int(valor[2:]) if chaves_inteiras else valor
+
+
+def esperado(dump, arquivo, coluna, chaves_inteiras=False, item_chave=False):
+    # Uma linha (tconst, item) por item da lista da coluna, direto das linhas do dump
+    posicao = CABECALHOS[arquivo].index(coluna)
+    linhas = set()
+    for linhas_titulo in dump[arquivo].values():
+        for linha in linhas_titulo:
+            valor = linha[posicao]
+            if valor == NULO:
+                continue
+            for item in valor.split(","):
+                linhas.add((chave(linha[0], chaves_inteiras),
+                            chave(item, chaves_inteiras) if item_chave else item))
+    return sorted(linhas)
+
+
+@pytest.mark.parametrize("formato", [FORMATO_TSV, FORMATO_PARQUET])
+@pytest.mark.parametrize("chaves_inteiras", [False, True])
+def test_pontes_de_generos_e_diretores(tmp_path, formato, chaves_inteiras):
+    dump = gerar_dump()
+    caminhos = escrever_dump(dump, str(tmp_path / "dados"))
+    diretorio_tratados = str(tmp_path / "tratados")
+    os.makedirs(diretorio_tratados)
+    conexao = sqlite3.connect(":memory:")
+
+    for arquivo in ("title.basics.tsv.gz", "title.crew.tsv.gz"):
+        # Blocos pequenos: as pontes são gravadas bloco a bloco junto com o arquivo tratado
+        tratar(caminhos[arquivo], caminho_tratado(diretorio_tratados, arquivo, formato), linhas_por_bloco=70,
+               formato=formato, chaves_inteiras=chaves_inteiras, gerar_pontes=True)
+        for ponte in pontes(arquivo):
+            carregar_arquivo(caminho_tratado(diretorio_tratados, ponte, formato), conexao, nome_tabela(ponte),
+                             chaves_inteiras=chaves_inteiras, em_massa=True)
+
+    assert conexao.execute("SELECT tconst, genre FROM title_genre ORDER BY 1, 2").fetchall() == \
+        esperado(dump, "title.basics.tsv.gz", "genres", chaves_inteiras)
+    assert conexao.execute("SELECT tconst, nconst FROM title_director ORDER BY 1, 2").fetchall() == \
+        esperado(dump, "title.crew.tsv.gz", "directors", chaves_inteiras, item_chave=True)
+    assert conexao.execute("SELECT tconst, nconst FROM title_writer ORDER BY 1, 2").fetchall() == \
+        esperado(dump, "title.crew.tsv.gz", "writers", chaves_inteiras, item_chave=True)
+
+    # As consultas por gênero e por pessoa usam os índices das pontes, sem ler a tabela inteira
+    criar_indices(conexao, ["title_genre", "title_director"])
+    for consulta in ("SELECT tconst FROM title_genre WHERE genre = 'Drama'",
+                     "SELECT tconst FROM title_director WHERE nconst = ?"):
+        parametros = (chave("nm0000001", chaves_inteiras),) if "?" in consulta else ()
+        plano = " ".join(linha[-1] for linha in conexao.execute("EXPLAIN QUERY PLAN " + consulta, parametros))
+        assert "USING COVERING INDEX" in plano, plano
@@ -0,0 +1,53 @@
+# Escrita dos arquivos tratados do imdb_transformacao
+
+# IMPORTS
+import os
+import sys
+import pandas as pd
+import pyarrow.dataset as ds
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from imdb_esquema import esquema
+from imdb_transformacao import escrever_parquet, tamanho_tratado
+
+
+def bloco_basics(tipos, anos):
+    linhas = len(anos)
+    return pd.DataFrame({
+        "tconst": [f"tt{i:07d}" for i in range(linhas)],
+        "titleType": tipos,
+        "primaryTitle": "Título",
+        "originalTitle": "Título",
+        "isAdult": False,
+        "startYear": anos,
+        "endYear": None,
+        "runtimeMinutes": 90,
+        "genres": "Drama",
+    }).astype(esquema("title.basics"))
+
+
+def test_parquet_com_mais_de_1024_particoes(tmp_path):
+    # titleType x startYear do title.basics real passa do limite padrão de partições do Arrow (1024 por bloco)
+    anos = list(range(1300, 1900))
+    blocos = [bloco_basics(["movie"] * len(anos) + ["short"] * len(anos), anos * 2)]
+    caminho_destino = str(tmp_path / "title.basics.parquet")
+
+    linhas = escrever_parquet(iter(blocos), caminho_destino, particoes=["titleType", "startYear"])
+
+    assert linhas == 1200
+    particoes = {(tipo, ano) for tipo in os.listdir(caminho_destino)
+                 for ano in os.listdir(os.path.join(caminho_destino, tipo))}
+    assert len(particoes) == 1200
+    tabela = ds.dataset(caminho_destino, format="parquet", partitioning="hive").to_table()
+    assert sorted(tabela.column("tconst").to_pylist()) == [f"tt{i:07d}" for i in range(1200)]
+
+
+def test_tamanho_de_parquet_particionado(tmp_path):
+    # O diretório Parquet conta pelos arquivos das partições, não pelo tamanho do próprio diretório
+    caminho_destino = str(tmp_path / "title.basics.parquet")
+    escrever_parquet(iter([bloco_basics(["movie", "short"] * 50, list(range(1900, 2000)))]), caminho_destino,
+                     particoes=["titleType", "startYear"])
+
+    arquivos = [os.path.join(raiz, nome) for raiz, _, nomes in os.walk(caminho_destino) for nome in nomes]
+    assert len(arquivos) == 100
+    assert tamanho_tratado(caminho_destino) == sum(os.path.getsize(arquivo) for arquivo in arquivos)
@@ -0,0 +1,43 @@
+# O motor vetorizado (imdb_vetorizado) tem que gerar as mesmas tabelas analíticas que o CREATE TABLE ... AS
+
+# IMPORTS
+import os
+import sys
+import sqlite3
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from imdb_carga import carregar_arquivo, nome_tabela
+from imdb_analitico import TABELAS_ANALITICAS, materializar_analiticas
+from imdb_transformacao import AgregadorParticipantes
+from imdb_vetorizado import MOTOR_SQL, MOTOR_VETORIZADO
+from dump_imdb import escrever_dump, gerar_dump
+
+
+def linhas(conexao, tabela):
+    # Linhas em uma ordem fixa, com os nulos comparáveis aos outros valores
+    return sorted(conexao.execute(f'SELECT * FROM "{tabela}"').fetchall(),
+                  key=lambda linha: [(valor is None, str(valor)) for valor in linha])
+
+
+def construir(caminhos, banco, motor, chaves_inteiras, agregado):
+    conexao = sqlite3.connect(banco)
+    for arquivo, caminho_arquivo in caminhos.items():
+        carregar_arquivo(caminho_arquivo, conexao, nome_tabela(arquivo), chaves_inteiras=chaves_inteiras,
+                         em_massa=True)
+    if not agregado:
+        conexao.execute(f"DROP TABLE {AgregadorParticipantes.tabela}")
+    materializar_analiticas(conexao, TABELAS_ANALITICAS, completa=True, motor=motor)
+    return conexao
+
+
+@pytest.mark.parametrize("chaves_inteiras", [False, True])
+@pytest.mark.parametrize("agregado", [True, False])
+def test_motor_vetorizado_igual_ao_sql(tmp_path, chaves_inteiras, agregado):
+    caminhos = escrever_dump(gerar_dump(), str(tmp_path / "dados"))
+    sql = construir(caminhos, str(tmp_path / "sql.db"), MOTOR_SQL, chaves_inteiras, agregado)
+    vetorizado = construir(caminhos, str(tmp_path / "vetorizado.db"), MOTOR_VETORIZADO, chaves_inteiras, agregado)
+
+    for tabela in TABELAS_ANALITICAS:
+        assert linhas(vetorizado, tabela) == linhas(sql, tabela), tabela
+        assert len(linhas(sql, tabela)) > 0